@@ -0,0 +1,55 @@
+"""
+Unindexed searches by a sequential scan of the records against a scan of
+the dictionary-encoded columns
+
+    python -m benchmarks.columnar --records 200000 --queries 20
+"""
+import argparse
+import time
+
+from zendesk import columnar
+from zendesk.db import Table
+
+from .synthetic import PRIORITIES, STATUSES, TYPES, tickets
+
+SEARCHES = [("status", STATUSES), ("priority", PRIORITIES), ("type", TYPES), ("has_incidents", ["true"])]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--records", type=int, default=200_000)
+    parser.add_argument("--queries", type=int, default=20)
+    args = parser.parse_args()
+
+    table = Table(
+        "tickets",
+        primary_key="_id",
+        columnar_key=[field for field, _ in SEARCHES],
+        records=list(tickets(args.records)),
+    )
+    started = time.perf_counter()
+    table.build_index()
+    print(f"records: {args.records:,} indexes built in {time.perf_counter() - started:.2f}s")
+    print(f"numpy: {'yes' if columnar.np is not None else 'no, itertools fallback'}")
+
+    for field, values in SEARCHES:
+        timings = {}
+        for mode in ("sequential", "columnar"):
+            search = table._sequential_search if mode == "sequential" else table._columnar_search
+            started = time.perf_counter()
+            for n in range(args.queries):
+                found = sum(1 for _ in search(field, values[n % len(values)]))
+            timings[mode] = (time.perf_counter() - started) / args.queries
+        print(
+            "{:<16}|{:>18}|{:>18}|{:>10}".format(
+                field,
+                f"scan {timings['sequential'] * 1000:,.1f} ms",
+                f"column {timings['columnar'] * 1000:,.1f} ms",
+                f"x{timings['sequential'] / timings['columnar']:,.1f}",
+            )
+        )
+        assert found == len(table.search(field, values[(args.queries - 1) % len(values)]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Load time and memory of records per JSON backend, as dicts and typed records
+
+    python -m benchmarks.decode --records 1000000
+"""
+import argparse
+import gc
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+from typing import Optional, Tuple
+
+from zendesk.codec import Decoder, available
+
+from .synthetic import tickets
+
+
+def measure(path: str, name: str, model: Optional[str]) -> Tuple[float, int]:
+    decoder = Decoder(name, model)
+    started = time.perf_counter()
+    with open(path, "rb") as f:
+        records = list(decoder.iter_file(f))
+    elapsed = time.perf_counter() - started
+    del records
+
+    # measured apart, tracing allocations slows decoding down
+    gc.collect()
+    tracemalloc.start()
+    with open(path, "rb") as f:
+        records = list(decoder.iter_file(f))
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del records
+    return elapsed, size
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--records", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "tickets.json")
+        with open(path, "w") as f:
+            json.dump(list(tickets(args.records)), f)
+        print(f"records: {args.records:,} file: {os.path.getsize(path) / 2**20:,.1f} MiB")
+
+        for name in available():
+            for model in (None, "Tickets"):
+                elapsed, size = measure(path, name, model)
+                print(
+                    "{:<10}|{:<10}|{:>12}|{:>16}".format(
+                        name, model or "dict", f"{elapsed:.2f} s", f"{size / 2**20:,.1f} MiB"
+                    )
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""
+Build time of the full-text index and latency of ranked queries
+
+    python -m benchmarks.fulltext --records 1000000
+"""
+import argparse
+import time
+
+from zendesk.db import Table
+
+from .synthetic import tickets
+
+QUERIES = ["printer", "printer crash", '"login password"', "refund invoice nostrud"]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--records", type=int, default=1_000_000)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--stemming", action="store_true")
+    args = parser.parse_args()
+
+    records = list(tickets(args.records))
+    table = Table(
+        "tickets", text_key=["subject", "description"], stemming=args.stemming, records=records
+    )
+    started = time.perf_counter()
+    table.build_index()
+    print(f"records: {args.records:,} built in {time.perf_counter() - started:.1f}s")
+
+    for query in QUERIES:
+        started = time.perf_counter()
+        res = table.find(query, args.top)
+        elapsed = time.perf_counter() - started
+        print("{:<30}|{:>12}|{:>20}".format(query, len(res), f"{elapsed * 1000:,.1f} ms"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Compare memory of dict-of-list indexes against compact posting maps
+
+    python -m benchmarks.index_memory --records 1000000
+"""
+import argparse
+import gc
+import tracemalloc
+
+from zendesk.db import Table
+
+from .synthetic import tickets
+
+FIELDS = ["_id", "submitter_id", "organization_id"]
+
+
+def measure(records, compact: bool) -> int:
+    gc.collect()
+    tracemalloc.start()
+    table = Table("tickets", primary_key="_id", index_key=FIELDS, records=records)
+    table.build_index()
+    if compact:
+        table.compact_index()
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--records", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    records = list(tickets(args.records))
+    baseline = measure(records, compact=False)
+    compact = measure(records, compact=True)
+
+    print(f"records: {args.records:,} fields: {', '.join(FIELDS)}")
+    print("{:<20}|{:>20}".format("dict of lists", f"{baseline / 2**20:,.1f} MiB"))
+    print("{:<20}|{:>20}".format("posting map", f"{compact / 2**20:,.1f} MiB"))
+    print("{:<20}|{:>20}".format("ratio", f"{compact / baseline:.2f}"))
+
+
+if __name__ == "__main__":
+    main()
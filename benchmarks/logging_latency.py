@@ -0,0 +1,62 @@
+"""
+Query latency with synchronous file logging against queued logging
+
+    python -m benchmarks.logging_latency --records 100000 --queries 20000 --threads 8
+"""
+import argparse
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from zendesk.db import Table
+from zendesk.utilties import configure_logging
+
+from .synthetic import tickets
+
+
+def run(table: Table, keys: List[int], threads: int) -> List[float]:
+    def query(key: int) -> float:
+        started = time.perf_counter()
+        table.search("submitter_id", str(key))
+        return time.perf_counter() - started
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        return sorted(pool.map(query, keys))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--records", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=20_000)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    users = max(args.records // 10, 1)
+    table = Table(
+        "tickets",
+        primary_key="_id",
+        index_key=["submitter_id"],
+        records=list(tickets(args.records, users=users)),
+    )
+    table.build_index()
+    rng = random.Random(0)
+    keys = [rng.randrange(users) for _ in range(args.queries)]
+
+    print(f"records: {args.records:,} queries: {args.queries:,} threads: {args.threads}")
+    for mode, queued in (("sync", False), ("queue", True)):
+        configure_logging({"queue": queued})
+        started = time.perf_counter()
+        latency = run(table, keys, args.threads)
+        elapsed = time.perf_counter() - started
+        p50 = latency[len(latency) // 2] * 1e6
+        p99 = latency[int(len(latency) * 0.99)] * 1e6
+        print(
+            "{:<10}|{:>14}|{:>14}|{:>16}".format(
+                mode, f"p50 {p50:,.0f} us", f"p99 {p99:,.0f} us", f"{len(keys) / elapsed:,.0f} q/s"
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Private memory of prefork workers as the worker count grows (Linux only)
+
+Queries hit the submitter_id index. A sequential scan touches the refcount of
+every record and copies all pages holding them into the worker, unless the
+table is stored with mmap.
+
+    python -m benchmarks.prefork_memory --records 200000 --storage mmap
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from zendesk.db import Database
+from zendesk.server import PreforkServer
+
+from .synthetic import tickets
+
+SCHEMA = {
+    "tables": {
+        "tickets": {
+            "primary_key": "_id",
+            "index": ["submitter_id", "organization_id"],
+        }
+    }
+}
+
+
+def private_kib(pid: int) -> int:
+    total = 0
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            if line.startswith(("Private_Clean", "Private_Dirty")):
+                total += int(line.split()[1])
+    return total
+
+
+CLIENT = """
+import sys, urllib.request
+port = int(sys.argv[1])
+for value in sys.argv[2:]:
+    url = f"http://127.0.0.1:{port}/search?entity=tickets&field=submitter_id&value={value}"
+    urllib.request.urlopen(url).read()
+"""
+
+
+def query(port: int, values) -> None:
+    # run the client in a fresh interpreter, a client forked from the parent
+    # would copy the shared pages and make them look private to the workers
+    subprocess.run([sys.executable, "-c", CLIENT, str(port), *values], check=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--records", type=int, default=200_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--storage", default="memory", choices=["memory", "mmap"])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        records = list(tickets(args.records))
+        values = [str(r["submitter_id"]) for r in records[: args.queries]]
+        with open(os.path.join(tmp, "tickets.json"), "w") as f:
+            json.dump(records, f)
+        del records
+        database = Database(resource_dir=tmp)
+        database.load(SCHEMA, storage=args.storage)
+        print(f"parent private memory {private_kib(os.getpid()) / 1024:,.1f} MiB")
+
+        for workers in (1, 2, 4, 8):
+            prefork = PreforkServer(database, workers)
+            port = prefork.start("127.0.0.1", 0)
+            query(port, values)
+            sizes = [private_kib(pid) for pid in prefork.pids]
+            prefork.stop()
+            print(
+                "{:<20}|{:>20}".format(
+                    f"{workers} workers", f"{sum(sizes) / len(sizes) / 1024:,.1f} MiB"
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
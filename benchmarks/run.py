@@ -0,0 +1,258 @@
+"""
+Benchmark suite over a synthetic dataset, compared against a stored baseline
+
+Measures Database.load, Table.build_index, indexed and sequential
+Table.search and join-heavy Database.search, reporting throughput, latency
+percentiles and the peak memory allocated by each step. Memory is traced in
+a separate run of every step, tracing slows allocations down.
+
+    python -m benchmarks.run --tickets 100000
+    python -m benchmarks.run --tickets 100000 --save     # store a new baseline
+    python -m benchmarks.run --tickets 100000 --check    # exit 1 on a regression
+"""
+import argparse
+import copy
+import gc
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Sequence
+
+from zendesk.db import Database, Table
+from zendesk.utilties import read_yaml
+
+from .synthetic import generate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+BASELINE = os.path.join(os.path.dirname(os.path.realpath(__file__)), "baseline.json")
+
+# metrics where a larger value is better, every other one is better smaller
+HIGHER_IS_BETTER = {"records_per_s", "qps"}
+# queries run again with allocations traced
+TRACED_QUERIES = 10
+
+
+def peak_mib(run: Callable[[], Any]) -> float:
+    """
+    Peak of the memory allocated by run, whatever it returns included
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return peak / 2**20
+
+
+def percentile(latency: Sequence[float], q: float) -> float:
+    return latency[min(int(len(latency) * q), len(latency) - 1)]
+
+
+def timed_queries(queries: List[Any], run: Callable[[Any], Any]) -> Dict[str, float]:
+    """
+    Throughput and latency of the queries, then the peak memory allocated by
+    a traced run of the first of them
+    """
+    latency = []
+    started = time.perf_counter()
+    for query in queries:
+        start = time.perf_counter()
+        run(query)
+        latency.append(time.perf_counter() - start)
+    elapsed = time.perf_counter() - started
+    latency.sort()
+    return {
+        "qps": len(queries) / elapsed,
+        "p50_ms": percentile(latency, 0.5) * 1000,
+        "p95_ms": percentile(latency, 0.95) * 1000,
+        "p99_ms": percentile(latency, 0.99) * 1000,
+        "peak_mib": peak_mib(lambda: [run(query) for query in queries[:TRACED_QUERIES]]),
+    }
+
+
+def schema_of(config: str) -> Dict[str, Any]:
+    """
+    Schema of config.yaml without the cache and background services, which
+    would hide or disturb the measured work
+    """
+    schemadef = copy.deepcopy(read_yaml(config))
+    for key in ("cache", "changelog", "watch", "parallel", "metrics"):
+        schemadef.pop(key, None)
+    return schemadef
+
+
+def bench(args: argparse.Namespace, data_dir: str, store_dir: str) -> Dict[str, Dict[str, float]]:
+    schemadef = schema_of(args.config)
+    rng = random.Random(args.seed)
+    results: Dict[str, Dict[str, float]] = {}
+
+    def load() -> Database:
+        database = Database(resource_dir=data_dir, store_dir=store_dir)
+        database.load(copy.deepcopy(schemadef))
+        return database
+
+    started = time.perf_counter()
+    database = load()
+    elapsed = time.perf_counter() - started
+    loaded = sum(len(table.records) for table in database.collections.values())
+    results["load"] = {
+        "seconds": elapsed,
+        "records_per_s": loaded / elapsed,
+        "peak_mib": peak_mib(load),
+    }
+
+    loaded_tickets = database.collections["tickets"]
+    schema = schemadef["tables"]["tickets"]
+
+    def build_index() -> Table:
+        table = Table(
+            name="tickets",
+            primary_key=schema.get("primary_key"),
+            index_key=schema.get("index"),
+            keyword_key=schema.get("keyword_index"),
+            range_key=schema.get("range_index"),
+            text_key=schema.get("text_index"),
+            columnar_key=schema.get("columnar"),
+            stemming=schema.get("stemming", False),
+            records=loaded_tickets.records,
+        )
+        table.build_index()
+        return table
+
+    started = time.perf_counter()
+    build_index()
+    elapsed = time.perf_counter() - started
+    results["build_index"] = {
+        "seconds": elapsed,
+        "records_per_s": len(loaded_tickets.records) / elapsed,
+        "peak_mib": peak_mib(build_index),
+    }
+
+    users = len(database.collections["users"].records)
+    organizations = len(database.collections["organizations"].records)
+    records = loaded_tickets.records
+    results["indexed_search"] = timed_queries(
+        [str(rng.randrange(users)) for _ in range(args.queries)],
+        lambda key: loaded_tickets.search("submitter_id", key),
+    )
+    # external_id is not indexed, every query scans the whole table
+    results["sequential_search"] = timed_queries(
+        [records[rng.randrange(len(records))]["external_id"] for _ in range(args.scans)],
+        lambda key: loaded_tickets.search("external_id", key),
+    )
+    # every ticket of an organization joined with its submitter and organization
+    results["join_search"] = timed_queries(
+        [str(rng.randrange(organizations)) for _ in range(args.joins)],
+        lambda key: database.search("tickets", "organization_id", key),
+    )
+    return results
+
+
+def compare(
+    results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]], tolerance: float
+) -> List[str]:
+    """
+    Print every metric next to its baseline
+    :return: the metrics worse than the baseline by more than tolerance
+    """
+    regressions = []
+    print("{:<20}|{:<14}|{:>14}|{:>14}|{:>8}".format("step", "metric", "value", "baseline", "ratio"))
+    for step, metrics in results.items():
+        for metric, value in metrics.items():
+            base = baseline.get(step, {}).get(metric)
+            if not base:
+                print("{:<20}|{:<14}|{:>14,.2f}|{:>14}|{:>8}".format(step, metric, value, "-", "-"))
+                continue
+            ratio = value / base
+            worse = ratio < 1 - tolerance if metric in HIGHER_IS_BETTER else ratio > 1 + tolerance
+            flag = "  <- regression" if worse else ""
+            print(
+                "{:<20}|{:<14}|{:>14,.2f}|{:>14,.2f}|{:>8.2f}{}".format(
+                    step, metric, value, base, ratio, flag
+                )
+            )
+            if worse:
+                regressions.append(f"{step}.{metric}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--tickets", type=int, default=100_000)
+    parser.add_argument("--users", type=int, help="defaults to a tenth of the tickets")
+    parser.add_argument("--organizations", type=int, help="defaults to a hundredth of the tickets")
+    parser.add_argument("--skew", type=float, default=0.0)
+    parser.add_argument("--tags", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--queries", type=int, default=2000, help="indexed searches")
+    parser.add_argument("--scans", type=int, default=10, help="sequential searches")
+    parser.add_argument("--joins", type=int, default=200, help="join-heavy searches")
+    parser.add_argument("--config", default=os.path.join(ROOT, "config.yaml"))
+    parser.add_argument("--data", help="directory of the dataset, generated when missing")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--save", action="store_true", help="store the results as the baseline")
+    parser.add_argument("--check", action="store_true", help="exit 1 on a regression")
+    args = parser.parse_args()
+
+    params = {
+        "tickets": args.tickets,
+        "users": args.users or max(args.tickets // 10, 1),
+        "organizations": args.organizations or max(args.tickets // 100, 1),
+        "skew": args.skew,
+        "tags": args.tags,
+        "seed": args.seed,
+        "queries": args.queries,
+        "scans": args.scans,
+        "joins": args.joins,
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = args.data or os.path.join(tmp, "data")
+        if not os.path.exists(os.path.join(data_dir, "tickets.json")):
+            started = time.perf_counter()
+            generate(
+                data_dir,
+                params["tickets"],
+                params["users"],
+                params["organizations"],
+                args.skew,
+                args.tags,
+                args.seed,
+            )
+            print(f"Generated dataset in {time.perf_counter() - started:.1f}s")
+        store_dir = os.path.join(tmp, "store")
+        os.makedirs(store_dir)
+        results = bench(args, data_dir, store_dir)
+
+    baseline: Dict[str, Any] = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    if baseline and baseline.get("params") != params:
+        print(f"Baseline {args.baseline} was measured with other parameters: {baseline.get('params')}")
+        baseline = {}
+
+    print()
+    regressions = compare(results, baseline.get("results", {}), args.tolerance)
+
+    if args.save:
+        with open(args.baseline, "w") as f:
+            json.dump({"params": params, "results": results}, f, indent=2)
+            f.write("\n")
+        print(f"Baseline saved to {args.baseline}")
+    if regressions:
+        print(f"Regressions: {', '.join(regressions)}")
+        if args.check:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""
+Synthetic datasets shaped like zendesk/resources for benchmarking at scale
+
+Records carry every field of zendesk/model.py. Foreign keys are drawn with a
+configurable skew, 0 spreads them uniformly and larger values concentrate
+them on the lowest ids, and tags come from a vocabulary of configurable size.
+
+    python -m benchmarks.synthetic --tickets 1000000 --skew 1.0 --tags 50 --out data/
+"""
+import argparse
+import json
+import os
+import random
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, Iterator, List
+
+STATUSES = ["open", "pending", "hold", "solved", "closed"]
+PRIORITIES = ["low", "normal", "high", "urgent"]
+TYPES = ["incident", "problem", "question", "task"]
+VIAS = ["web", "chat", "voice"]
+ROLES = ["admin", "agent", "end-user"]
+LOCALES = ["en-AU", "zh-CN", "de-CH"]
+TIMEZONES = ["Sri Lanka", "Tokelau", "Armenia", "Ghana", "Monaco"]
+DETAILS = ["MegaCorp", "Non profit", "Artisân"]
+WORDS = (
+    "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor "
+    "incididunt ut labore et dolore magna aliqua enim ad minim veniam quis nostrud "
+    "exercitation ullamco laboris nisi aliquip ex ea commodo consequat duis aute "
+    "irure in reprehenderit voluptate velit esse cillum fugiat nulla pariatur "
+    "excepteur sint occaecat cupidatat non proident sunt culpa qui officia deserunt "
+    "mollit anim id est laborum printer network login password invoice refund crash"
+).split()
+
+EPOCH = datetime(2013, 1, 1, tzinfo=timezone(timedelta(hours=-10)))
+SPAN = 4 * 365 * 24 * 3600
+
+
+def skewed(rng: random.Random, n: int, skew: float = 0.0) -> int:
+    """
+    Id in [0, n), uniform with skew 0 and increasingly biased towards 0 as
+    skew grows, e.g. with skew 1 the lowest 1% of ids get 10% of the draws
+    """
+    return min(int(n * rng.random() ** (1 + skew)), n - 1)
+
+
+def tag_vocabulary(tags: int) -> List[str]:
+    return [f"Tag{n:05d}" for n in range(tags)]
+
+
+def _timestamp(rng: random.Random) -> str:
+    return (EPOCH + timedelta(seconds=rng.randrange(SPAN))).strftime("%Y-%m-%dT%H:%M:%S -10:00")
+
+
+def _uuid(rng: random.Random) -> str:
+    return str(uuid.UUID(int=rng.getrandbits(128)))
+
+
+def _words(rng: random.Random, lo: int, hi: int) -> str:
+    return " ".join(rng.choices(WORDS, k=rng.randint(lo, hi)))
+
+
+def organizations(n: int, tags: int = 50, seed: int = 0) -> Iterator[Dict[str, Any]]:
+    rng = random.Random(seed)
+    vocabulary = tag_vocabulary(tags)
+    for _id in range(n):
+        name = _words(rng, 1, 2).title()
+        yield {
+            "_id": _id,
+            "url": f"http://initech.zendesk.com/api/v2/organizations/{_id}.json",
+            "external_id": _uuid(rng),
+            "name": name,
+            "domain_names": [f"{rng.choice(WORDS)}{rng.randrange(1000)}.com" for _ in range(3)],
+            "created_at": _timestamp(rng),
+            "details": rng.choice(DETAILS),
+            "shared_tickets": rng.random() < 0.5,
+            "tags": rng.sample(vocabulary, min(4, tags)),
+        }
+
+
+def users(
+    n: int, organizations: int = 10_000, skew: float = 0.0, tags: int = 50, seed: int = 0
+) -> Iterator[Dict[str, Any]]:
+    rng = random.Random(seed)
+    vocabulary = tag_vocabulary(tags)
+    for _id in range(n):
+        first, last = rng.choice(WORDS).title(), rng.choice(WORDS).title()
+        yield {
+            "_id": _id,
+            "url": f"http://initech.zendesk.com/api/v2/users/{_id}.json",
+            "external_id": _uuid(rng),
+            "name": f"{first} {last}",
+            "alias": f"Mx {last}",
+            "created_at": _timestamp(rng),
+            "active": rng.random() < 0.5,
+            "verified": rng.random() < 0.5,
+            "shared": rng.random() < 0.5,
+            "locale": rng.choice(LOCALES),
+            "timezone": rng.choice(TIMEZONES),
+            "last_login_at": _timestamp(rng),
+            "email": f"{first.lower()}{_id}@example.com",
+            "phone": f"{rng.randrange(10000):04d}-{rng.randrange(1000):03d}-{rng.randrange(1000):03d}",
+            "signature": "Don't Worry Be Happy!",
+            "organization_id": skewed(rng, organizations, skew),
+            "tags": rng.sample(vocabulary, min(4, tags)),
+            "suspended": rng.random() < 0.5,
+            "role": rng.choice(ROLES),
+        }
+
+
+def tickets(
+    n: int,
+    users: int = 100_000,
+    organizations: int = 10_000,
+    seed: int = 0,
+    skew: float = 0.0,
+    tags: int = 50,
+) -> Iterator[Dict[str, Any]]:
+    rng = random.Random(seed)
+    vocabulary = tag_vocabulary(tags)
+    for _ in range(n):
+        _id = _uuid(rng)
+        yield {
+            "_id": _id,
+            "url": f"http://initech.zendesk.com/api/v2/tickets/{_id}.json",
+            "external_id": _uuid(rng),
+            "created_at": _timestamp(rng),
+            "type": rng.choice(TYPES),
+            "subject": _words(rng, 3, 6).capitalize(),
+            "description": _words(rng, 15, 40),
+            "priority": rng.choice(PRIORITIES),
+            "status": rng.choice(STATUSES),
+            "submitter_id": skewed(rng, users, skew),
+            "assignee_id": skewed(rng, users, skew),
+            "organization_id": skewed(rng, organizations, skew),
+            "tags": rng.sample(vocabulary, min(4, tags)),
+            "has_incidents": rng.random() < 0.5,
+            "due_at": _timestamp(rng),
+            "via": rng.choice(VIAS),
+        }
+
+
+def write_json(path: str, records: Iterable[Dict[str, Any]]) -> int:
+    """
+    Stream records into a JSON array file without holding them in memory
+    :return: number of records written
+    """
+    count = 0
+    with open(path + ".tmp", "w") as f:
+        f.write("[")
+        for record in records:
+            f.write(",\n" if count else "\n")
+            json.dump(record, f)
+            count += 1
+        f.write("\n]\n")
+    os.replace(path + ".tmp", path)
+    return count
+
+
+def generate(
+    out: str,
+    tickets_count: int,
+    users_count: int,
+    organizations_count: int,
+    skew: float = 0.0,
+    tags: int = 50,
+    seed: int = 0,
+) -> Dict[str, int]:
+    """
+    Write organizations.json, users.json and tickets.json under out
+    :return: number of records written per table
+    """
+    os.makedirs(out, exist_ok=True)
+    return {
+        "organizations": write_json(
+            os.path.join(out, "organizations.json"),
+            organizations(organizations_count, tags, seed),
+        ),
+        "users": write_json(
+            os.path.join(out, "users.json"),
+            users(users_count, organizations_count, skew, tags, seed + 1),
+        ),
+        "tickets": write_json(
+            os.path.join(out, "tickets.json"),
+            tickets(tickets_count, users_count, organizations_count, seed + 2, skew, tags),
+        ),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tickets", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, help="defaults to a tenth of the tickets")
+    parser.add_argument("--organizations", type=int, help="defaults to a hundredth of the tickets")
+    parser.add_argument("--skew", type=float, default=0.0)
+    parser.add_argument("--tags", type=int, default=50, help="distinct tags")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="data")
+    args = parser.parse_args()
+
+    counts = generate(
+        args.out,
+        args.tickets,
+        args.users or max(args.tickets // 10, 1),
+        args.organizations or max(args.tickets // 100, 1),
+        args.skew,
+        args.tags,
+        args.seed,
+    )
+    for table, count in counts.items():
+        path = os.path.join(args.out, table + ".json")
+        print("{:<16}|{:>12,}|{:>12}".format(table, count, f"{os.path.getsize(path) / 2**20:,.1f} MiB"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+import os
+
+import pytest
+
+from zendesk import utilties
+from zendesk.db import Database
+from zendesk.utilties import read_yaml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+
+@pytest.fixture(scope="session", autouse=True)
+def log_files(tmp_path_factory):
+    """
+    Write the log files of the tests under a temporary directory instead of
+    the logs directory of the repo
+    """
+    fpath = utilties.fpath
+    utilties.fpath = str(tmp_path_factory.mktemp('logs'))
+    yield
+    utilties._stop_listener()
+    utilties.fpath = fpath
+
+
+@pytest.fixture(scope="session")
+def config_path():
+    return os.path.join(ROOT, 'config.yaml')
+
+
+@pytest.fixture(scope="session")
+def resources():
+    """
+    Directory of the resource files loaded by default
+    """
+    return os.path.join(ROOT, 'zendesk', 'resources')
+
+
+@pytest.fixture()
+def schemadef(config_path):
+    return read_yaml(config_path)
+
+
+@pytest.fixture(scope="module")
+def db(config_path):
+    """
+    Database loaded from config.yaml, shared by the tests of a module which
+    do not change it
+    """
+    db = Database()
+    db.load(read_yaml(config_path))
+    return db
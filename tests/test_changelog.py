@@ -0,0 +1,107 @@
+import json
+
+import pytest
+
+from zendesk.changelog import ChangelogTailer, follow
+from zendesk.db import Database
+
+
+@pytest.fixture()
+def db(schemadef):
+    db = Database()
+    db.load(schemadef)
+    return db
+
+
+def write(path, *changes, partial=''):
+    with open(path, 'a') as f:
+        for change in changes:
+            f.write(json.dumps(change) + '\n')
+        f.write(partial)
+
+
+class TestChangelogTailer:
+
+    def test_poll(self, db, tmp_path):
+        path = tmp_path / 'changes.jsonl'
+        tailer = ChangelogTailer(db, str(path))
+        assert tailer.poll() == 0
+
+        write(path,
+              {'op': 'upsert', 'table': 'users', 'record': {'_id': 71, 'name': 'Renamed'}},
+              {'op': 'delete', 'table': 'tickets', 'key': '436bf9b0-1147-4c0a-8439-6f79833bff5b'},
+              partial='{"op": "delete", "table": "users", ')
+        assert tailer.poll() == 2
+        assert [u['name'] for u in db.search('users', '_id', '71')] == ['Renamed']
+        assert db.search('tickets', '_id', '436bf9b0-1147-4c0a-8439-6f79833bff5b') == []
+
+        write(path, partial='"key": 71}\n')
+        assert tailer.poll() == 1
+        assert db.search('users', '_id', '71') == []
+        assert tailer.applied == 3
+
+    def test_skips_bad_lines(self, db, tmp_path):
+        path = tmp_path / 'changes.jsonl'
+        write(path, {'op': 'upsert', 'table': 'missing', 'record': {}}, partial='not json\n')
+        write(path, {'op': 'insert', 'table': 'users', 'record': {'_id': 999, 'name': 'New'}})
+        tailer = ChangelogTailer(db, str(path))
+        assert tailer.poll() == 1
+        assert db.search('users', '_id', '999')[0]['name'] == 'New'
+
+    def test_skips_bad_shapes(self, db, tmp_path):
+        path = tmp_path / 'changes.jsonl'
+        write(path,
+              {'op': 'upsert', 'table': ['users'], 'record': {'_id': 998}},
+              ['delete', 'users', 71],
+              'delete',
+              {'op': 'insert', 'table': 'users', 'record': {'_id': 999, 'name': 'New'}})
+        tailer = ChangelogTailer(db, str(path))
+        assert tailer.poll() == 1
+        assert tailer.offset == path.stat().st_size
+        assert db.search('users', '_id', '71')
+        assert db.search('users', '_id', '999')[0]['name'] == 'New'
+
+    def test_run_survives_errors(self, db, tmp_path, monkeypatch):
+        path = tmp_path / 'changes.jsonl'
+        write(path, {'op': 'delete', 'table': 'users', 'key': 71})
+        tailer = ChangelogTailer(db, str(path), interval=0.01)
+        polls = []
+
+        def poll():
+            polls.append(1)
+            if len(polls) == 1:
+                raise RuntimeError('boom')
+            return ChangelogTailer.poll(tailer)
+
+        monkeypatch.setattr(tailer, 'poll', poll)
+        tailer.start()
+        try:
+            tailer._thread.join(0.5)
+            assert len(polls) > 1
+            assert db.search('users', '_id', '71') == []
+        finally:
+            tailer.stop()
+
+    def test_truncated(self, db, tmp_path):
+        path = tmp_path / 'changes.jsonl'
+        write(path, {'op': 'delete', 'table': 'users', 'key': 71}, {'op': 'delete', 'table': 'users', 'key': 72})
+        tailer = ChangelogTailer(db, str(path))
+        tailer.poll()
+        path.write_text(json.dumps({'op': 'delete', 'table': 'users', 'key': 73}) + '\n')
+        assert tailer.poll() == 1
+        assert db.search('users', '_id', '73') == []
+
+    def test_follow(self, schemadef, tmp_path):
+        path = tmp_path / 'changes.jsonl'
+        write(path, {'op': 'delete', 'table': 'users', 'key': 71})
+        db = Database()
+        db.load(schemadef)
+        assert follow(db, schemadef) is None
+
+        tailer = follow(db, dict(schemadef, changelog={'path': str(path), 'interval': 0.01}))
+        try:
+            tailer._thread.join(0.5)
+            assert tailer.applied == 1
+        finally:
+            tailer.stop()
+        assert db.search('users', '_id', '71') == []
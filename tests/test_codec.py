@@ -0,0 +1,126 @@
+import io
+import pickle
+
+import pytest
+
+from zendesk import codec
+from zendesk.codec import Decoder, TicketsRecord, UsersRecord
+from zendesk.db import Database
+from zendesk.utilties import read_yaml
+
+
+@pytest.fixture()
+def schemadef(schemadef):
+    schemadef.pop('cache', None)
+    for table_name, model in [('users', 'Users'), ('tickets', 'Tickets'), ('organizations', 'Organizations')]:
+        schemadef['tables'][table_name]['model'] = model
+    return schemadef
+
+
+class TestRecord:
+
+    def test_mapping(self):
+        record = UsersRecord({'_id': 1, 'name': 'Francisca', 'nickname': 'Fran'})
+        assert record['_id'] == 1
+        assert record.get('email') is None
+        assert 'email' not in record
+        assert record['nickname'] == 'Fran'
+        assert list(record) == ['_id', 'name', 'nickname']
+        assert len(record) == 3
+        assert record == {'_id': 1, 'name': 'Francisca', 'nickname': 'Fran'}
+        with pytest.raises(KeyError):
+            record['email']
+
+    def test_slots(self):
+        record = TicketsRecord({'_id': 'a1'})
+        assert not hasattr(record, '__dict__')
+        with pytest.raises(AttributeError):
+            record.other = 1
+
+    @pytest.mark.parametrize('name', codec.available())
+    def test_interned(self, name):
+        f = io.BytesIO(
+            b'[{"_id": "a1", "status": "pending", "tags": ["Ohio"], "subject": "Printer jam"},'
+            b' {"_id": "a2", "status": "pending", "tags": ["Ohio", 1], "subject": "Printer jam"}]'
+        )
+        first, second = Decoder(name, 'Tickets').iter_file(f)
+        assert first['status'] is second['status']
+        assert first['tags'][0] is second['tags'][0]
+        assert second['tags'] == ['Ohio', 1]
+        # unique fields are left alone
+        assert first['subject'] == second['subject']
+        assert TicketsRecord._interned == {'type', 'priority', 'status', 'tags', 'via'}
+
+    def test_pickle(self):
+        record = UsersRecord({'_id': 1, 'name': 'Francisca', 'nickname': 'Fran'})
+        copy = pickle.loads(pickle.dumps(record))
+        assert type(copy) is UsersRecord
+        assert copy == record
+
+
+class TestDecoder:
+
+    @pytest.mark.parametrize('name', codec.available())
+    def test_iter_file(self, name):
+        f = io.BytesIO(b'[{"_id": 1, "name": "a"}, {"_id": 2, "tags": ["x"]}]')
+        records = list(Decoder(name, 'Users').iter_file(f))
+        assert [type(r) for r in records] == [UsersRecord, UsersRecord]
+        assert records == [{'_id': 1, 'name': 'a'}, {'_id': 2, 'tags': ['x']}]
+
+    @pytest.mark.parametrize('name', codec.available())
+    def test_invalid(self, name):
+        with pytest.raises(ValueError):
+            list(Decoder(name).iter_file(io.BytesIO(b'[{"_id": 1, ')))
+        with pytest.raises(ValueError):
+            list(Decoder(name).iter_file(io.BytesIO(b'{"_id": 1}')))
+
+    def test_auto(self):
+        assert Decoder('auto').name == codec.available()[0]
+
+    def test_streaming_default(self, monkeypatch):
+        # the whole file is only read by the opt-in backends
+        monkeypatch.setattr(codec, 'iter_records', lambda f: iter([(0, 0, {'_id': 1})]))
+        assert Decoder().name == 'json'
+        assert Decoder.of({}).name == 'json'
+        assert list(Decoder.of({}).iter_file(io.BytesIO(b''))) == [{'_id': 1}]
+
+    def test_fallback(self, monkeypatch):
+        monkeypatch.setitem(codec.BACKENDS, 'orjson', None)
+        assert Decoder('orjson').name == 'json'
+
+    def test_unknown(self):
+        with pytest.raises(ValueError):
+            Decoder('yaml')
+        with pytest.raises(ValueError):
+            Decoder('json', 'Groups')
+
+    def test_pickle(self):
+        decoder = pickle.loads(pickle.dumps(Decoder('json', 'Tickets')))
+        assert decoder.record_type is TicketsRecord
+
+
+class TestLoad:
+
+    @pytest.mark.parametrize('storage', ['memory', 'lazy', 'mmap'])
+    def test_typed_tables(self, schemadef, config_path, resources, storage, tmp_path):
+        plain = Database(resource_dir=resources)
+        plain.load(read_yaml(config_path))
+        db = Database(resource_dir=resources, store_dir=str(tmp_path))
+        db.load(schemadef, storage=storage)
+
+        for table_name, table in db.collections.items():
+            assert list(table.records) == list(plain.collections[table_name].records)
+        assert isinstance(db.collections['tickets'].records[0], TicketsRecord)
+
+        res = db.search('users', '_id', '71')
+        assert res[0]['name'] == 'Prince Hinton'
+        assert res[0] == plain.search('users', '_id', '71')[0]
+        assert db.find('tickets', 'korea') == plain.find('tickets', 'korea')
+
+    @pytest.mark.parametrize('name', codec.available())
+    def test_decoder_key(self, schemadef, name):
+        schemadef['decoder'] = name
+        db = Database()
+        db.load(schemadef)
+        assert len(db.collections['users'].records) == 75
+        assert db.search('organizations', '_id', '101')[0]['name'] == 'Enthaze'
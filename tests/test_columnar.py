@@ -0,0 +1,119 @@
+import pickle
+
+import pytest
+
+from zendesk import columnar
+from zendesk.columnar import Column
+from zendesk.db import Table
+from zendesk.query import parse, plan
+
+RECORDS = [
+    {'_id': 0, 'status': 'open', 'active': True},
+    {'_id': 1, 'status': 'Pending', 'active': False},
+    {'_id': 2},
+    {'_id': 3, 'status': 'OPEN', 'active': True},
+    {'_id': 4, 'status': ['open', 'Hold'], 'active': 'true'},
+    {'_id': 5, 'status': '', 'active': None},
+]
+
+
+@pytest.fixture(params=['numpy', 'itertools'])
+def table(request, monkeypatch):
+    if request.param == 'itertools':
+        monkeypatch.setattr(columnar, 'np', None)
+    elif columnar.np is None:
+        pytest.skip('numpy is not installed')
+    table = Table('t', primary_key='_id', columnar_key=['status', 'active'], records=list(RECORDS))
+    table.build_index()
+    return table
+
+
+def sequential(table, field, value):
+    return list(table._sequential_search(field, value))
+
+
+class TestColumn:
+
+    def test_encoding(self):
+        column = Column('status')
+        for i, record in enumerate(RECORDS):
+            column.add(record.get('status'), i)
+        assert column.keys[2:] == ['open', 'pending']
+        assert list(column.codes) == [2, 3, 0, 2, 1, 0]
+        assert column.lists == 1
+        assert column.cardinality() == 2
+
+    @pytest.mark.parametrize('field,value', [
+        ('status', 'open'),
+        ('status', 'Open'),
+        ('status', 'hold'),
+        ('status', 'pending'),
+        ('status', 'closed'),
+        ('status', ''),
+        ('active', 'true'),
+        ('active', 'TRUE'),
+        ('active', 'false'),
+    ])
+    def test_same_as_sequential(self, table, field, value):
+        assert table.search(field, value) == sequential(table, field, value)
+
+    def test_rows_in(self, table):
+        found = table.columns['status'].rows_in(['open', 'Hold', 'pending', 'none'], table.records)
+        assert found == {'open': [0, 3, 4], 'hold': [4], 'pending': [1], 'none': []}
+        assert table.lookup('status', ['OPEN', 'open', 'hold']) == {
+            'OPEN': [0, 3, 4], 'open': [0, 3, 4], 'hold': [4],
+        }
+
+    def test_maintained(self, table):
+        table.insert({'_id': 6, 'status': 'Hold'})
+        assert [r['_id'] for r in table.search('status', 'hold')] == [4, 6]
+        table.delete(3)
+        assert [r['_id'] for r in table.search('status', 'open')] == [0, 4]
+        table.upsert({'_id': 0, 'status': 'closed'})
+        assert [r['_id'] for r in table.search('status', 'open')] == [4]
+        assert [r['_id'] for r in table.search('status', 'closed')] == [0]
+
+    def test_pickle_and_merge(self):
+        left, right = Column('status'), Column('status')
+        left.add('open', 0)
+        right.add('hold', 1)
+        right.add('Open', 2)
+        restored = pickle.loads(pickle.dumps(right))
+        assert restored.rows('open', [None] * 3) == [2]
+        left.merge(restored)
+        assert left.keys[2:] == ['open', 'hold']
+        assert list(left.codes) == [2, 3, 2]
+
+
+class TestColumnarTables:
+
+    @pytest.mark.parametrize('entity,field,value', [
+        ('tickets', 'status', 'pending'),
+        ('tickets', 'type', 'INCIDENT'),
+        ('tickets', 'has_incidents', 'true'),
+        ('users', 'verified', 'TRUE'),
+        ('users', 'role', 'admin'),
+        ('users', 'timezone', 'sri lanka'),
+    ])
+    def test_same_as_sequential(self, db, entity, field, value):
+        table = db.collections[entity]
+        assert field in table.columns
+        res = table.search(field, value)
+        assert res and res == sequential(table, field, value)
+
+    def test_plan_column_scan(self, db):
+        tickets = db.collections['tickets']
+        query = parse('search tickets status=pending and priority=high')
+        group = plan(tickets, query).groups[0]
+        assert {p.field for p, _ in group.lookups} == {'status', 'priority'}
+        assert group.columnar and not group.filters
+        assert 'column scan' in db.explain('search tickets status=pending and priority=high')
+        rows = plan(tickets, query).execute(tickets)
+        assert [tickets.records[i] for i in rows] == [
+            r for r in tickets.records if r['status'] == 'pending' and r['priority'] == 'high'
+        ]
+
+    def test_plan_prefers_index(self, db):
+        text = db.explain('search tickets status=pending and organization_id=116')
+        assert 'index lookup  organization_id = 116' in text
+        assert 'filter        status = pending' in text
@@ -0,0 +1,99 @@
+import pytest
+
+from zendesk.db import ColumnNotExistsException, Database
+from zendesk.fulltext import TextIndex, parse_terms, search, stem, tokenize
+from zendesk.storage import MmapRecords
+
+
+def build(values, stemming=False):
+    idx = TextIndex('subject', stemming)
+    for i, value in enumerate(values):
+        idx.add(value, i)
+    return idx
+
+
+class TestTokenize:
+
+    def test_tokenize(self):
+        assert tokenize('A Catastrophe in Korea (North)') == ['a', 'catastrophe', 'in', 'korea', 'north']
+        assert tokenize(['Ohio', 'New York']) == ['ohio', 'new', 'york']
+        assert tokenize(None) == []
+
+    def test_stem(self):
+        assert {stem(w) for w in ['crash', 'crashes', 'crashed', 'crashing']} == {'crash'}
+        assert stem('catastrophes') == stem('catastrophe')
+        assert stem('status') == 'status'
+
+    def test_parse_terms(self):
+        assert parse_terms('korea "North Korea" crash') == [['korea'], ['north', 'korea'], ['crash']]
+
+
+class TestTextIndex:
+
+    def test_phrase(self):
+        idx = build(['A Catastrophe in Korea (North)', 'North of Korea', None, 'korea north'])
+        assert list(idx.rows(['korea'])) == [0, 1, 3]
+        assert list(idx.rows(['korea', 'north'])) == [0, 3]
+        assert list(idx.rows(['north', 'korea'])) == []
+        assert list(idx.rows(['japan'])) == []
+
+    def test_ranking(self):
+        idx = build(['printer on fire', 'printer printer jam', 'coffee machine', 'printer'])
+        ranked = search([idx], 'printer', k=2)
+        assert [i for i, _ in ranked] == [3, 1]
+        assert len(search([idx], 'printer', k=None)) == 3
+        assert search([idx], 'printer coffee') == []
+
+    def test_stemming(self):
+        idx = build(['Printers crashed', 'printer crashing'], stemming=True)
+        assert {i for i, _ in search([idx], 'printer crashes')} == {0, 1}
+        assert list(build(['Printers crashed']).rows(['printer'])) == []
+
+    def test_remove(self):
+        values = ['printer on fire', 'printer printer jam', 'coffee machine', 'printer']
+        idx = build(values)
+        idx.remove(values[1], 1)
+        idx.add('printer jam', 4)
+        assert search([idx], 'printer', k=None) == search([build(values[:1] + [None] + values[2:] + ['printer jam'])], 'printer', k=None)
+        assert list(idx.rows(['printer', 'jam'])) == [4]
+        idx.remove('coffee machine', 2)
+        assert 'coffee' not in idx.terms
+
+    def test_merge(self):
+        values = ['printer on fire', 'printer jam', 'coffee machine', 'printer']
+        whole = build(values)
+        head, tail = TextIndex('subject'), TextIndex('subject')
+        for i, value in enumerate(values):
+            (head if i < 2 else tail).add(value, i)
+        head.merge(tail)
+        assert search([head], 'printer', k=None) == search([whole], 'printer', k=None)
+
+
+class TestFind:
+
+    def test_find(self, db):
+        res = db.find('tickets', '"korea (north)"')
+        assert [ticket['subject'] for ticket in res] == ['A Catastrophe in Korea (North)']
+        assert 'organizations' in res[0]
+
+    def test_top_k(self, db):
+        ranked = db.collections['tickets'].find('nostrud', k=5)
+        assert len(ranked) == 5
+        scores = [score for _, score in ranked]
+        assert scores == sorted(scores, reverse=True)
+
+    def test_description(self, db):
+        tickets = db.collections['tickets']
+        rows = [i for i, _ in tickets.find('exercitation', k=None)]
+        assert rows and all('exercitation' in tickets.records[i]['description'].lower() for i in rows)
+
+    def test_no_text_index(self, db):
+        with pytest.raises(ColumnNotExistsException):
+            db.find('users', 'anything')
+
+    def test_parallel_chunks(self, db, schemadef, tmp_path):
+        parallel = Database(store_dir=str(tmp_path))
+        parallel.load(schemadef, storage='mmap', workers=2, chunk_size=16)
+        assert isinstance(parallel.collections['tickets'].records, MmapRecords)
+        assert parallel.collections['tickets'].find('nostrud ipsum', k=None) == \
+            db.collections['tickets'].find('nostrud ipsum', k=None)
@@ -0,0 +1,49 @@
+import logging
+
+import pytest
+
+from zendesk import utilties
+from zendesk.utilties import configure_logging, get_logger
+
+
+@pytest.fixture()
+def log_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(utilties, 'fpath', str(tmp_path))
+    yield tmp_path
+    configure_logging()
+
+
+def zendesk_handlers(logger):
+    return [
+        h for h in logger.handlers
+        if h is utilties._queue_handler or h in utilties._file_handlers.values()
+    ]
+
+
+class TestLogging:
+
+    def test_handlers_deduplicated(self, log_dir):
+        logger = get_logger('zendesk.test_dedupe')
+        assert get_logger('zendesk.test_dedupe') is logger
+        assert len(zendesk_handlers(logger)) == 1
+        assert zendesk_handlers(logger) == zendesk_handlers(get_logger('zendesk.test_dedupe_other'))
+
+    def test_queue(self, log_dir):
+        logger = get_logger('zendesk.test_queue')
+        logger.info("searching %s=%s", "_id", 71)
+        utilties._stop_listener()
+        assert "searching _id=71" in (log_dir / 'zendesk.test_queue.log').read_text()
+
+    def test_sync(self, log_dir):
+        configure_logging({'queue': False})
+        logger = get_logger('zendesk.test_sync')
+        assert zendesk_handlers(logger) == [utilties._file_handlers['zendesk.test_sync']]
+        logger.info("searching %s=%s", "_id", 71)
+        assert "searching _id=71" in (log_dir / 'zendesk.test_sync.log').read_text()
+
+    def test_level(self, log_dir):
+        configure_logging({'level': 'WARNING'})
+        logger = get_logger('zendesk.test_level')
+        assert not logger.isEnabledFor(logging.INFO)
+        configure_logging()
+        assert logger.isEnabledFor(logging.INFO)
@@ -0,0 +1,114 @@
+import json
+
+import pytest
+
+from zendesk.db import Database
+from zendesk.metrics import Histogram, Metrics
+
+
+@pytest.fixture()
+def schemadef(schemadef):
+    schemadef.pop('cache', None)
+    return schemadef
+
+
+@pytest.fixture()
+def db(schemadef):
+    db = Database()
+    db.load(schemadef)
+    return db
+
+
+class TestHistogram:
+
+    def test_percentiles(self):
+        histogram = Histogram()
+        for ms in [1] * 90 + [100] * 10:
+            histogram.observe(ms / 1000)
+        stats = histogram.stats()
+        assert stats['count'] == 100
+        assert stats['max_ms'] == pytest.approx(100)
+        assert 1 <= stats['p50_ms'] < 2
+        assert 100 <= stats['p99_ms'] <= 100.0001
+        assert sum(stats['buckets'].values()) == 100
+
+    def test_empty(self):
+        assert Histogram().percentile(0.5) == 0.0
+
+
+class TestMetrics:
+
+    def test_index_hit_and_scan(self, db):
+        db.search('organizations', '_id', '101')
+        queries = db.metrics.stats()['queries']
+        assert queries['organizations._id']['index_hits'] == 1
+        assert queries['organizations._id']['rows_returned'] == 1
+        assert queries['organizations._id']['latency']['count'] == 1
+
+        list(db.iter_search('tickets', 'status', 'pending'))
+        queries = db.metrics.stats()['queries']
+        assert queries['tickets.status']['index_misses'] == 1
+        assert queries['tickets.status']['rows_scanned'] == len(db.collections['tickets'].records)
+        assert queries['tickets.status']['rows_returned'] < queries['tickets.status']['rows_scanned']
+
+    def test_stops_with_the_caller(self, db):
+        # organizations have no joins, which would read a whole batch ahead
+        res = db.iter_search('organizations', 'details', 'MegaCorp')
+        next(res)
+        res.close()
+        queries = db.metrics.stats()['queries']
+        assert queries['organizations.(unindexed)']['rows_returned'] == 1
+        assert queries['organizations.(unindexed)']['rows_scanned'] < len(db.collections['organizations'].records)
+
+    def test_unindexed_fields_share_a_label(self, db):
+        for field in ('details', 'no_such_field', 'another'):
+            db.search('organizations', field, 'x')
+        queries = db.metrics.stats()['queries']
+        assert set(queries) == {'organizations.(unindexed)'}
+        assert queries['organizations.(unindexed)']['latency']['count'] == 3
+
+    def test_lookup_without_index(self, db):
+        db.collections['tickets'].lookup('external_id', ['x'])
+        counters = db.metrics.stats()['queries']['tickets.(unindexed)']
+        assert (counters['index_hits'], counters['index_misses']) == (0, 1)
+
+    def test_query_and_find(self, db):
+        list(db.iter_query('search tickets submitter_id=38 and status=pending'))
+        db.find('tickets', 'korea')
+        queries = db.metrics.stats()['queries']
+        assert queries['tickets.query']['index_hits'] == 1
+        assert queries['tickets.query']['latency']['count'] == 1
+        assert queries['tickets.find']['rows_returned'] == 2
+
+    def test_join_fanout(self, db):
+        db.search('users', '_id', '71')
+        joins = db.metrics.stats()['joins']
+        assert joins['users->tickets'] == {
+            'records': 1, 'foreign_rows': 3, 'fanout': 3.0, 'max_fanout': 3
+        }
+
+    def test_load_times(self, db):
+        tables = db.metrics.stats()['tables']
+        assert set(tables) == {'users', 'tickets', 'organizations'}
+        assert all(0 <= t['index_s'] <= t['load_s'] for t in tables.values())
+
+    def test_json_export(self, db):
+        db.search('users', '_id', '71')
+        stats = json.loads(db.metrics.to_json())
+        assert stats['queries']['users._id']['rows_returned'] == 1
+        db.metrics.reset()
+        assert db.metrics.stats()['queries'] == {}
+
+    def test_profile_slow_queries(self, schemadef):
+        schemadef['metrics'] = {'profile_threshold': 0, 'profile_keep': 2}
+        db = Database()
+        db.load(schemadef)
+        for _id in ('71', '72', '73'):
+            db.search('users', '_id', _id)
+        profiles = db.metrics.stats()['profiles']
+        assert len(profiles) == 2
+        assert profiles[0]['query'] == 'users._id'
+        assert 'cumulative' in profiles[0]['profile']
+
+    def test_disabled_profiler(self):
+        assert Metrics().timer('users', '_id').profiler is None
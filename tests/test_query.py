@@ -0,0 +1,162 @@
+import pytest
+
+from zendesk.postings import intersect, union
+from zendesk.query import Predicate, QuerySyntaxException, is_compound, parse, plan
+from zendesk.ranges import SortedIndex, parse_timestamp
+
+
+def naive(table, groups):
+    return [
+        record for record in table.records
+        if any(all(p.test(record) for p in group) for group in groups)
+    ]
+
+
+class TestParse:
+
+    def test_parse(self):
+        query = parse('search tickets status=pending and priority=high or subject="A Catastrophe in Korea"')
+        assert query.entity == 'tickets'
+        assert query.groups == [
+            [Predicate('status', '=', 'pending'), Predicate('priority', '=', 'high')],
+            [Predicate('subject', '=', 'A Catastrophe in Korea')],
+        ]
+
+    def test_parse_operators_and_clauses(self):
+        query = parse('search tickets due_at>="2016-08-01" and subject^=A order by due_at desc limit 5 offset 10')
+        assert query.groups == [[Predicate('due_at', '>=', '2016-08-01'), Predicate('subject', '^=', 'A')]]
+        assert (query.order_by, query.descending, query.limit, query.offset) == ('due_at', True, 5, 10)
+
+    def test_is_compound(self):
+        assert is_compound('search tickets status=pending')
+        assert is_compound('explain search tickets status=pending')
+        assert not is_compound('search users organization_id value could contain = too')
+
+    @pytest.mark.parametrize('text', [
+        'search tickets',
+        'search tickets status=pending and',
+        'search tickets status=pending priority=high',
+        'search tickets status=pending and priority',
+        'search tickets status=pending order due_at',
+        'search tickets status=pending limit ten',
+    ])
+    def test_syntax_error(self, text):
+        with pytest.raises(QuerySyntaxException):
+            parse(text)
+
+
+class TestPlan:
+
+    def test_most_selective_first(self, db):
+        tickets = db.collections['tickets']
+        query = parse('search tickets organization_id=116 and status=pending and submitter_id=38')
+        res = plan(tickets, query)
+        lookups = [predicate.field for predicate, _ in res.groups[0].lookups]
+        assert set(lookups) == {'organization_id', 'submitter_id'}
+        sizes = [len(postings) for _, postings in res.groups[0].lookups]
+        assert sizes == sorted(sizes)
+        assert [predicate.field for predicate in res.groups[0].filters] == ['status']
+
+    @pytest.mark.parametrize('text', [
+        'search tickets organization_id=116 and status=pending',
+        'search tickets status=pending and priority=high or tags=ohio',
+        'search tickets type=incident and via=web',
+        'search users organization_id=119 and active=true or _id=71',
+        'search tickets due_at>=2016-08-01 and due_at<2016-08-03 and status=pending',
+        'search tickets created_at>2016-06-01 and created_at<=2016-05-01',
+        'search tickets due_at>2016-07-31T12:00:00 or subject^=A',
+        'search users last_login_at^=2016-04 or created_at<2016-04-20',
+        'search users _id>70 and _id<=72',
+        'search tickets due_at>soon',
+    ])
+    def test_execute(self, db, text):
+        query = parse(text)
+        table = db.collections[query.entity]
+        rows = plan(table, query).execute(table)
+        assert rows == sorted(set(rows))
+        assert [table.records[i] for i in rows] == naive(table, query.groups)
+
+    def test_explain(self, db):
+        text = db.explain('search tickets status=pending and organization_id=116 or tags=ohio')
+        assert text.splitlines()[0] == 'Plan for tickets'
+        assert 'index lookup  organization_id = 116' in text
+        assert 'filter        status = pending' in text
+        assert 'branch 2 (union)' in text
+
+    def test_range_scan(self, db):
+        text = db.explain('search tickets due_at>=2016-08-01 and due_at<2016-08-03 and status=pending')
+        assert 'range scan    due_at >= 2016-08-01 and due_at < 2016-08-03  (18 rows)' in text
+        assert 'filter        status = pending' in text
+
+    @pytest.mark.parametrize('field', ['due_at', 'subject'])
+    def test_order_limit_offset(self, db, field):
+        query = parse(f'search tickets status=pending order by {field} desc')
+        table = db.collections['tickets']
+        ordered = plan(table, query).execute(table)
+        keys = [parse_timestamp(table.records[i].get(field)) for i in ordered]
+        present = [k for k in keys if k is not None]
+        assert present == sorted(present, reverse=True)
+        assert keys[len(present):] == [None] * (len(keys) - len(present))
+
+        query.limit, query.offset = 3, 2
+        assert plan(table, query).execute(table) == ordered[2:5]
+
+    def test_query_joins(self, db):
+        res = db.query('search tickets submitter_id=38 and status=pending')
+        assert res and all('organizations' in ticket or 'users' in ticket for ticket in res)
+
+
+class TestSortedIndex:
+
+    def test_parse_timestamp(self):
+        assert parse_timestamp('2016-04-28T11:19:34 -10:00') == parse_timestamp('2016-04-28T21:19:34')
+        assert parse_timestamp(3) == 3.0
+        assert parse_timestamp('pending') is None
+        assert parse_timestamp(True) is None
+
+    def test_range_prefix(self):
+        idx = SortedIndex('due_at')
+        for i, value in enumerate(['2016-07-31', None, '2016-04-01', '2016-04-15', ['2016-04-02']]):
+            idx.add(value, i)
+        assert list(idx.range('2016-04-01', '2016-05-01')) == [2, 3]
+        assert list(idx.range('2016-04-01', '2016-05-01', lo_inclusive=False)) == [3]
+        assert list(idx.range(hi='2016-04-15', hi_inclusive=False)) == [2]
+        assert sorted(idx.prefix('2016-04')) == [2, 3]
+        assert list(idx.ordered(descending=True)) == [0, 3, 2]
+
+    def test_prefix_ignores_case(self, db):
+        idx = SortedIndex('subject')
+        for i, value in enumerate(['Apple', 'apricot', 'Banana']):
+            idx.add(value, i)
+        assert list(idx.prefix('AP')) == [0, 1]
+        idx.remove('Apple', 0)
+        assert list(idx.prefix('ap')) == [1]
+        # the REPL lowercases queries
+        assert db.query('search tickets subject^=a') == db.query('search tickets subject^=A') != []
+
+    def test_remove_and_insert(self):
+        idx = SortedIndex('due_at')
+        for i, value in enumerate(['2016-07-31', '2016-04-01', '2016-04-01', '2016-04-15']):
+            idx.add(value, i)
+        idx.remove('2016-04-01', 2)
+        assert list(idx.ordered()) == [1, 3, 0]
+        idx.add('2016-04-01', 4)
+        idx.add('2016-01-01', 5)
+        assert list(idx.ordered()) == [5, 1, 4, 3, 0]
+        assert list(idx.prefix('2016-04-01')) == [1, 4]
+
+    def test_merge(self):
+        a, b = SortedIndex('due_at'), SortedIndex('due_at')
+        a.add('2016-07-31', 0)
+        b.add('2016-04-01', 1)
+        a.merge(b)
+        assert list(a.ordered()) == [1, 0]
+        assert list(a.prefix('2016')) == [1, 0]
+
+
+class TestPostings:
+
+    def test_intersect_union(self):
+        assert intersect([1, 3, 5, 7, 9], [0, 3, 4, 9, 10, 11]) == [3, 9]
+        assert intersect([], [1, 2]) == []
+        assert union([1, 3, 5], [2, 3, 6]) == [1, 2, 3, 5, 6]
@@ -0,0 +1,121 @@
+import json
+import shutil
+import threading
+
+import pytest
+
+from zendesk.changelog import ChangelogTailer
+from zendesk.db import Database
+from zendesk.reload import ResourceWatcher, watch
+
+
+@pytest.fixture()
+def resource_dir(resources, tmp_path):
+    return shutil.copytree(resources, tmp_path / 'resources')
+
+
+@pytest.fixture()
+def db(resource_dir, schemadef):
+    db = Database(resource_dir=str(resource_dir))
+    db.load(schemadef)
+    return db
+
+
+def rename_user(resource_dir, _id, name):
+    path = resource_dir / 'users.json'
+    users = json.loads(path.read_text())
+    for user in users:
+        if user['_id'] == _id:
+            user['name'] = name
+    path.write_text(json.dumps(users))
+
+
+class TestReload:
+
+    def test_reload_swaps_tables(self, db, resource_dir, schemadef):
+        old_users, old_tickets = db.collections['users'], db.collections['tickets']
+        assert db.search('users', '_id', '71')[0]['name'] == 'Prince Hinton'
+
+        rename_user(resource_dir, 71, 'Renamed')
+        timings = db.reload(schemadef, ['users'])
+        assert list(timings) == ['users']
+        assert db.collections['users'] is not old_users
+        assert db.collections['tickets'] is old_tickets
+        assert db.search('users', '_id', '71')[0]['name'] == 'Renamed'
+        # joins from other tables see the new version too
+        assert db.join_plans['tickets'][1].foreign_table is db.collections['users']
+        # the old version is left untouched for searches in flight
+        assert old_users.search('_id', '71')[0]['name'] == 'Prince Hinton'
+
+    def test_reload_keeps_broken_table(self, db, resource_dir, schemadef):
+        users = db.collections['users']
+        (resource_dir / 'users.json').write_text('[{"_id": 1, ')
+        assert db.reload(schemadef).keys() == {'tickets', 'organizations'}
+        assert db.collections['users'] is users
+
+    def test_searches_during_reload(self, db, schemadef):
+        errors = []
+        done = threading.Event()
+
+        def search():
+            while not done.is_set():
+                try:
+                    assert len(db.search('users', '_id', '71')) == 1
+                except Exception as e:
+                    errors.append(e)
+
+        thread = threading.Thread(target=search)
+        thread.start()
+        for _ in range(3):
+            db.reload(schemadef)
+        done.set()
+        thread.join()
+        assert errors == []
+
+
+class TestResourceWatcher:
+
+    def test_poll(self, db, resource_dir, schemadef):
+        watcher = ResourceWatcher(db, schemadef)
+        assert watcher.poll() == {}
+
+        rename_user(resource_dir, 71, 'Renamed')
+        assert list(watcher.poll()) == ['users']
+        assert db.search('users', '_id', '71')[0]['name'] == 'Renamed'
+        assert watcher.poll() == {}
+
+    def test_replays_changelog(self, db, resource_dir, schemadef, tmp_path):
+        path = tmp_path / 'changes.jsonl'
+        path.write_text(
+            json.dumps({'op': 'upsert', 'table': 'users', 'record': {'_id': 9999, 'name': 'New'}}) + '\n'
+            + json.dumps({'op': 'insert', 'table': 'tickets', 'record': {'_id': 'x1'}}) + '\n'
+        )
+        tailer = ChangelogTailer(db, str(path))
+        assert tailer.poll() == 2
+        offset = tailer.offset
+
+        watcher = ResourceWatcher(db, schemadef)
+        rename_user(resource_dir, 71, 'Renamed')
+        assert list(watcher.poll()) == ['users']
+        assert db.search('users', '_id', '71')[0]['name'] == 'Renamed'
+        assert db.search('users', '_id', '9999')[0]['name'] == 'New'
+        # tables which were not reloaded keep their changes, applied once
+        assert len(db.search('tickets', '_id', 'x1')) == 1
+        assert tailer.offset == offset
+        assert tailer.poll() == 0
+
+        tailer.stop()
+        assert db.changelog is None
+
+    def test_retries_broken_file(self, db, resource_dir, schemadef):
+        watcher = ResourceWatcher(db, schemadef)
+        (resource_dir / 'users.json').write_text('[{"_id": 1, ')
+        assert watcher.poll() == {}
+        (resource_dir / 'users.json').write_text(json.dumps([{'_id': 1, 'name': 'Only'}]))
+        assert list(watcher.poll()) == ['users']
+        assert db.search('users', '_id', '1')[0]['name'] == 'Only'
+
+    def test_watch(self, db, schemadef):
+        assert watch(db, schemadef) is None
+        watcher = watch(db, dict(schemadef, watch={'interval': 0.01}))
+        watcher.stop()
@@ -0,0 +1,115 @@
+import asyncio
+import gc
+import json
+
+from zendesk.server import PreforkServer, QueryServer
+
+
+async def get(port: int, target: str):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(f"GET {target} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, body = response.split(b"\r\n\r\n", 1)
+    return int(head.split()[1]), json.loads(body)
+
+
+def query(db, *targets):
+    async def main():
+        server = await QueryServer(db).start('127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            return await asyncio.gather(*(get(port, target) for target in targets))
+
+    return asyncio.run(main())
+
+
+class TestQueryServer:
+
+    def test_search(self, db):
+        (status, body), = query(db, '/search?entity=users&field=_id&value=71')
+        assert status == 200
+        assert body[0]['name'] == 'Prince Hinton'
+        assert len(body[0]['tickets']) == 3
+
+    def test_concurrent_queries(self, db):
+        responses = query(db, '/health', '/tables', '/search?entity=tickets&field=tags&value=Ohio')
+        assert [status for status, _ in responses] == [200, 200, 200]
+        assert responses[1][1] == ['users', 'tickets', 'organizations']
+        assert all('Ohio' in ticket['tags'] for ticket in responses[2][1])
+
+    def test_stats(self, db):
+        query(db, '/search?entity=organizations&field=_id&value=101')
+        (status, body), = query(db, '/stats')
+        assert status == 200
+        assert body['queries']['organizations._id']['rows_returned'] >= 1
+
+    def test_errors(self, db):
+        responses = query(db, '/search?entity=missing&field=_id&value=1', '/search?entity=users', '/nowhere')
+        assert [status for status, _ in responses] == [404, 400, 404]
+
+    def test_internal_error(self, db, monkeypatch, caplog):
+        def fail(*args):
+            raise RuntimeError('boom')
+
+        monkeypatch.setattr(db, 'search', fail)
+        (status, body), (health, _) = query(db, '/search?entity=users&field=_id&value=71', '/health')
+        assert (status, body) == (500, {'error': 'internal error'})
+        assert health == 200
+        assert 'Failed to answer a request' in caplog.text
+
+    def test_line_too_long(self, db, caplog):
+        long_header = '/health HTTP/1.1\r\nX-Padding: ' + 'a' * 70000
+        responses = query(db, '/search?entity=users&field=name&value=' + 'a' * 70000, long_header)
+        assert [status for status, _ in responses] == [400, 400]
+        assert responses[0][1] == {'error': 'request line or header too long'}
+        assert not [r for r in caplog.records if r.name == 'asyncio']
+
+    def test_pagination(self, db):
+        (_, full), (_, page), (status, _) = query(
+            db,
+            '/search?entity=tickets&field=status&value=pending',
+            '/search?entity=tickets&field=status&value=pending&limit=5&offset=3',
+            '/search?entity=tickets&field=status&value=pending&limit=five',
+        )
+        assert page == full[3:8]
+        assert status == 400
+
+    def test_negative_pagination(self, db, caplog):
+        responses = query(
+            db,
+            '/search?entity=tickets&field=status&value=pending&offset=-1',
+            '/search?entity=tickets&field=status&value=pending&limit=-2',
+        )
+        assert [status for status, _ in responses] == [400, 400]
+        assert responses[0][1] == {'error': 'limit and offset must be non-negative integers'}
+        assert not [r for r in caplog.records if r.name == 'asyncio']
+
+    def test_fields(self, db):
+        (status, body), = query(db, '/search?entity=users&field=_id&value=71&fields=name,organizations')
+        assert status == 200
+        assert body == [{'name': 'Prince Hinton', 'organizations': [{'organization_name': 'Hotcâkes'}]}]
+
+
+class TestPreforkServer:
+
+    def test_workers_share_database(self, db):
+        prefork = PreforkServer(db, workers=2)
+        port = prefork.start('127.0.0.1', 0)
+        assert gc.get_freeze_count() > 0
+        try:
+            async def main():
+                return await asyncio.gather(
+                    *(get(port, '/health') for _ in range(8)),
+                    get(port, '/search?entity=users&field=_id&value=71'),
+                )
+
+            *health, (status, body) = asyncio.run(main())
+            assert {pid for _, res in health for pid in [res['pid']]} <= set(prefork.pids)
+            assert status == 200 and body[0]['name'] == 'Prince Hinton'
+        finally:
+            prefork.stop()
+        assert prefork.pids == []
+        # the parent is unfrozen once its workers are gone
+        assert gc.get_freeze_count() == 0
@@ -1,18 +1,22 @@
-import os
+import shutil
+import threading
 
 import pytest
+import yaml
 from zendesk.processor import Processor
-from zendesk.db import Database, Table, Index, TableNotExistsException, ForeignKeys
+from zendesk.db import Database, Table, Index, TableNotExistsException, ForeignKeys, ScanIndex, InvalidChangeException
+from zendesk.adaptive import AutoIndexer
+from zendesk.cache import QueryCache
+from zendesk.postings import PostingMap
+from zendesk.storage import FileRecords, MmapRecords, StoreWriter, iter_records
 from zendesk.utilties import read_yaml
 
 from typing import Dict
 
-fpath = os.path.dirname(os.path.dirname(__file__))
 
 @pytest.fixture()
-def db():
+def db(schemadef):
     db = Database()
-    schemadef = read_yaml(os.path.join(fpath, 'config.yaml'))
     db.load(schemadef)
     return db
 
@@ -73,6 +77,67 @@ class TestProcessor:
 
         processor.present(res)
 
+    def test_present_pages(self, processor, capsys, monkeypatch):
+        answers = iter([True, False])
+        monkeypatch.setattr('click.confirm', lambda *args, **kwargs: next(answers))
+        processor.present(({'_id': i} for i in range(100)), page_size=10)
+        out = capsys.readouterr().out
+        assert out.count('_id') == 20
+        processor.present([])
+        assert 'No matching records' in capsys.readouterr().out
+
+    def test_handle_compound(self, processor, capsys):
+        processor.load_db()
+        processor.handle("search tickets submitter_id=38 and status=pending")
+        processor.explain("explain search tickets submitter_id 38")
+        processor.handle("search tickets submitter_id=38 and")
+        out = capsys.readouterr().out
+        assert "pending" in out
+        assert "index lookup  submitter_id = 38" in out
+        assert "Invalid query" in out
+        processor.drop_db()
+
+    def test_show_db_cache_stats(self, processor, capsys):
+        processor.load_db()
+        processor.handle("search users _id 71")
+        processor.handle("search users _id 71")
+        processor.show_db()
+        out = capsys.readouterr().out
+        assert "Query cache" in out
+        assert "{:<20}|{:>20}".format("hits", "1") in out
+        processor.drop_db()
+
+    def test_load_twice_stops_background(self, processor, schemadef, tmp_path):
+        schemadef['changelog'] = {'path': str(tmp_path / 'changes.jsonl'), 'interval': 0.01}
+        schemadef['watch'] = {'interval': 0.01}
+        path = tmp_path / 'config.yaml'
+        path.write_text(yaml.dump(schemadef))
+
+        processor.load_db(str(path))
+        tailer, watcher = processor.tailer, processor.watcher
+        processor.load_db(str(path))
+        assert tailer._thread is None and tailer._stop.is_set()
+        assert watcher._thread is None and watcher._stop.is_set()
+        assert processor.tailer is not tailer and processor.watcher is not watcher
+        processor.drop_db()
+        assert processor.tailer is None and processor.watcher is None
+
+    def test_stats(self, processor, capsys, tmp_path):
+        processor.load_db()
+        processor.handle("search users _id 71")
+        processor.stats("stats")
+        out = capsys.readouterr().out
+        assert "users._id" in out
+        assert "users->tickets" in out
+
+        path = tmp_path / "metrics.json"
+        processor.stats(f"stats json {path}")
+        assert '"users._id"' in path.read_text()
+        processor.stats("stats reset")
+        processor.stats("stats json")
+        assert '"users._id"' not in capsys.readouterr().out
+        processor.drop_db()
+
 
 class TestDatabase:
 
@@ -88,10 +153,227 @@ class TestDatabase:
         assert len(res[0].get('organizations')) >= 1
         assert len(res[0].get('tickets')) >= 1
 
+    def test_iter_search_pushdown(self, db, monkeypatch):
+        full = db.search('tickets', 'status', 'pending')
+        db.cache.clear()
+        tickets = db.collections['tickets']
+        read = []
+        original = tickets._columnar_search
+
+        def counting(*args):
+            for record in original(*args):
+                read.append(record)
+                yield record
+
+        monkeypatch.setattr(tickets, '_columnar_search', counting)
+        page = list(db.iter_search('tickets', 'status', 'pending', limit=3, offset=2))
+        assert [r['_id'] for r in page] == [r['_id'] for r in full[2:5]]
+        assert len(read) == 5
+        assert 'users' in page[0]
+
+    def test_join_leaves_records_untouched(self, db):
+        users = db.collections['users']
+        first = db.search('users', '_id', '71')
+        db.cache.clear()
+        second = db.search('users', '_id', '71')
+        assert first == second
+        assert 'tickets' not in users.records[users.indexes['_id'].search('71')[0]]
+        assert all('tickets' not in ticket for ticket in second[0]['tickets'])
+
+    def test_search_fields(self, db):
+        res = db.search('users', '_id', '71', fields=['name', 'tickets', 'missing'])
+        assert list(res[0]) == ['name', 'tickets']
+        assert len(res[0]['tickets']) == 3
+        assert db.search('users', '_id', '71', fields=['name']) == [{'name': 'Prince Hinton'}]
+        assert [dict(r) for r in db.query('search users _id=71', fields=['alias'])] == [{'alias': 'Miss Dana'}]
+
+    def test_iter_query(self, db):
+        text = 'search tickets status=pending order by due_at limit 4'
+        assert list(db.iter_query(text)) == db.query(text)
+        assert len(db.query(text)) == 4
+
+    def test_join_plans(self, db):
+        plan = db.join_plans['users']
+        assert [(fk.field, fk.foreign_key, fk.foreign_table.name) for fk in plan] == [
+            ('organization_id', '_id', 'organizations'),
+            ('_id', 'submitter_id', 'tickets'),
+        ]
+        assert plan[0].projection({'name': 'Enthaze', 'details': 'MegaCorp'}) == {'organization_name': 'Enthaze'}
+        assert db.join_plans['organizations'] == []
+
+    def test_join_plan_indexes_join_column(self, db):
+        users = db.collections['users']
+        users.foreign_key = [{
+            'external_table_name': 'tickets',
+            'external_table_key': 'assignee_id',
+            'local_table_key': '_id',
+            'required_fields': [{'field': 'subject', 'alias': 'assigned_subject'}],
+        }]
+        db.compile_join_plans()
+        assert isinstance(db.collections['tickets'].indexes['assignee_id'], ScanIndex)
+        res = db.search('users', '_id', '38')
+        assert len(res[0]['tickets']) == len(db.collections['tickets'].search('assignee_id', '38'))
+
+    def test_search_cache(self, db, config_path):
+        res = db.search('users', '_id', '71')
+        cached = db.search('users', '_id', '71')
+        assert cached == res and cached is not res
+        assert db.cache.hits == 1 and db.cache.misses == 1
+        # callers own the list they get, changing it leaves the cache alone
+        res.clear()
+        cached.append(None)
+        assert len(db.search('users', '_id', '71')) == 1
+        assert len(db.find('tickets', 'korea')) == 2
+        db.find('tickets', 'korea').clear()
+        assert len(db.find('tickets', 'korea')) == 2
+
+        db.load(read_yaml(config_path))
+        assert len(db.cache) == 0
+        db.search('users', '_id', '71')
+        assert db.cache.hits == 0 and db.cache.misses == 1
+
+        db.drop()
+        assert len(db.cache) == 0
+        with pytest.raises(TableNotExistsException):
+            db.search('users', '_id', '71')
+
     def test__exception(self, db):
         with pytest.raises(TableNotExistsException):
             db.search('table_not_exists', 'field', 'value')
 
+    def test_load_lazy(self, config_path):
+        db = Database()
+        db.load(read_yaml(config_path), storage='lazy')
+        users = db.collections.get('users')
+        assert isinstance(users.records, FileRecords)
+        res = db.search('users', "name", "Francisca Rasmussen")
+        assert res[0].get('_id') == 1
+        assert len(users.search('organization_id', "104")) == 4
+
+    def test_load_mmap(self, config_path, tmp_path):
+        db = Database(store_dir=str(tmp_path))
+        db.load(read_yaml(config_path), storage='mmap')
+        tickets = db.collections.get('tickets')
+        assert isinstance(tickets.records, MmapRecords)
+        assert (tmp_path / 'tickets.jsonl').exists()
+        assert len(tickets.search('submitter_id', '71')) == 3
+
+        reopened = Database(store_dir=str(tmp_path))
+        reopened.load(read_yaml(config_path), storage='mmap')
+        assert len(reopened.collections['tickets'].records) == len(tickets.records)
+
+    def test_load_parallel(self, db, config_path):
+        parallel = Database()
+        parallel.load(read_yaml(config_path), workers=2)
+        assert set(parallel.load_timings) == {'users', 'tickets', 'organizations'}
+        assert parallel.search('users', '_id', '71') == db.search('users', '_id', '71')
+
+    def test_load_parallel_chunks(self, db, config_path, tmp_path):
+        parallel = Database(store_dir=str(tmp_path))
+        parallel.load(read_yaml(config_path), storage='mmap', workers=2, chunk_size=16)
+        for name, table in db.collections.items():
+            chunked = parallel.collections[name]
+            assert isinstance(chunked.records, MmapRecords)
+            for k, idx in table.indexes.items():
+                assert dict(chunked.indexes[k].references) == dict(idx.references)
+            for k, idx in table.range_indexes.items():
+                assert list(chunked.range_indexes[k].ordered()) == list(idx.ordered())
+
+    def test_load_parallel_mixed(self, db, config_path, tmp_path):
+        schemadef = read_yaml(config_path)
+        schemadef['tables']['tickets']['storage'] = 'mmap'
+        parallel = Database(store_dir=str(tmp_path))
+        parallel.load(schemadef, workers=3, chunk_size=50)
+        assert isinstance(parallel.collections['tickets'].records, MmapRecords)
+        assert not isinstance(parallel.collections['users'].records, MmapRecords)
+        assert set(parallel.index_timings) == {'users', 'tickets', 'organizations'}
+        assert parallel.search('tickets', 'submitter_id', '71') == db.search('tickets', 'submitter_id', '71')
+        assert parallel.search('users', '_id', '71') == db.search('users', '_id', '71')
+
+    def test_load_snapshot(self, config_path, resources, tmp_path):
+        resource_dir = shutil.copytree(resources, tmp_path / 'resources')
+        schemadef = read_yaml(config_path)
+
+        db = Database(resource_dir=str(resource_dir))
+        db.load(schemadef, snapshot=True)
+        assert db.snapshot_status == {'users': 'rebuilt', 'tickets': 'rebuilt', 'organizations': 'rebuilt'}
+
+        db = Database(resource_dir=str(resource_dir))
+        db.load(schemadef, snapshot=True)
+        assert db.snapshot_status['tickets'] == 'hit'
+        assert len(db.collections['tickets'].search('submitter_id', '71')) == 3
+        assert len(db.collections['tickets'].range_indexes['due_at'].range('2016-08-01', '2016-08-03')) == 18
+
+        with open(resource_dir / 'organizations.json', 'a') as f:
+            f.write('\n')
+        schemadef['tables']['users']['index'].append('organization_id')
+        db = Database(resource_dir=str(resource_dir))
+        db.load(schemadef, snapshot=True)
+        assert db.snapshot_status == {'users': 'rebuilt', 'tickets': 'hit', 'organizations': 'rebuilt'}
+        assert 'organization_id' in db.collections['users'].indexes
+
+
+class TestQueryCache:
+
+    def test_lru(self):
+        cache = QueryCache(size=2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        assert cache.get('a') == 1
+        cache.put('c', 3)
+        assert cache.get('b') is None
+        assert cache.get('a') == 1
+        assert cache.stats()['evictions'] == 1
+
+    def test_ttl(self):
+        now = [0.0]
+        cache = QueryCache(size=2, ttl=10, clock=lambda: now[0])
+        cache.put('a', 1)
+        now[0] = 5
+        assert cache.get('a') == 1
+        now[0] = 11
+        assert cache.get('a') is None
+        assert cache.stats() == {'size': 0, 'capacity': 2, 'ttl': 10, 'hits': 1, 'misses': 1, 'evictions': 1}
+
+
+class TestStorage:
+
+    def test_iter_records(self, tmp_path):
+        source = tmp_path / 'records.json'
+        source.write_text(' [{"_id": 1, "name": "Zoë"},\n {"_id": 2, "tags": ["a", "b"]} ]', encoding='utf-8')
+        with open(source, 'rb') as f:
+            records = list(iter_records(f, chunk_size=4))
+        assert [r for _, _, r in records] == [{"_id": 1, "name": "Zoë"}, {"_id": 2, "tags": ["a", "b"]}]
+
+        raw = source.read_bytes()
+        for offset, length, record in records:
+            assert raw[offset:offset + length].decode('utf-8').startswith('{"_id": %d' % record['_id'])
+
+    def test_file_records(self, tmp_path):
+        source = tmp_path / 'records.json'
+        source.write_text('[{"_id": 1}, {"_id": 2}]')
+        records = FileRecords(str(source))
+        with open(source, 'rb') as f:
+            for offset, length, _ in iter_records(f):
+                records.track(offset, length)
+        assert len(records) == 2
+        assert records[1] == {"_id": 2}
+        assert list(records) == [{"_id": 1}, {"_id": 2}]
+
+    def test_mmap_records(self, tmp_path):
+        data, offsets = str(tmp_path / 't.jsonl'), str(tmp_path / 't.offsets')
+        writer = StoreWriter(data, offsets)
+        writer.append({"_id": 1, "tags": ["a"]})
+        writer.append({"_id": 2})
+        writer.close()
+        records = MmapRecords(data, offsets)
+        assert len(records) == 2
+        assert records[0] == {"_id": 1, "tags": ["a"]}
+        assert records[-1] == {"_id": 2}
+        with pytest.raises(IndexError):
+            records[2]
+
+
 class TestTable:
 
     def test_build_index(self, users):
@@ -108,6 +390,57 @@ class TestTable:
         res = users.search('tags', 'hartsville/hartley')
         assert len(res) == 1
 
+    def test_search_keyword_index(self, tickets, organizations):
+        assert 'tags' in tickets.indexes
+        ohio = tickets.search('tags', 'ohio')
+        assert len(ohio) == len([t for t in tickets.records if 'Ohio' in t['tags']])
+        assert tickets.search('tags', 'a') == []
+        assert len(organizations.search('domain_names', 'KAGE.com')) == 1
+
+    def test_sequential_search_in_list(self, users):
+        assert len(list(users._sequential_search('tags', 'Hartsville/Hartley'))) == 1
+        assert list(users._sequential_search('tags', 'hartsville')) == []
+
+    def test_auto_index(self, tickets):
+        tickets.auto_index = AutoIndexer(threshold=2, max_indexes=1, background=False)
+        expected = tickets.search('status', 'Pending')
+        assert 'status' not in tickets.indexes
+        tickets.search('status', 'pending')
+        assert isinstance(tickets.indexes.get('status'), ScanIndex)
+        assert tickets.search('status', 'PENDING') == expected
+
+        tickets.search('type', 'incident')
+        tickets.search('type', 'incident')
+        assert 'type' in tickets.indexes
+        assert 'status' not in tickets.indexes
+        assert 'submitter_id' in tickets.indexes
+
+    def test_auto_index_concurrent_writes(self, tickets):
+        class Writing(dict):
+            # writes into the table while the build scans this record
+            def get(self, key, default=None):
+                if key == 'subject' and not written:
+                    written.append(tickets.insert({'_id': 'new', 'subject': 'Printer on fire'}))
+                    tickets.upsert({**tickets.records[1], 'subject': 'Renamed'})
+                return super().get(key, default)
+
+        written = []
+        tickets.records[0] = Writing(tickets.records[0])
+        AutoIndexer(background=False).build(tickets, 'subject')
+        assert written
+        assert [t['_id'] for t in tickets.search('subject', 'printer on fire')] == ['new']
+        assert len(tickets.search('subject', 'renamed')) == 1
+
+        # the index is swapped in only once writers are held off
+        build = threading.Thread(target=AutoIndexer().build, args=(tickets, 'type'))
+        with tickets.write_lock:
+            build.start()
+            build.join(0.2)
+            assert build.is_alive() and 'type' not in tickets.indexes
+            tickets.insert({'_id': 'late', 'type': 'Chore'})
+        build.join()
+        assert [t['_id'] for t in tickets.search('type', 'chore')] == ['late']
+
     def test_join(self, users, organizations, tickets):
         res = users.search('_id', '71')
         fks = [
@@ -119,6 +452,25 @@ class TestTable:
         assert len(enriched[0].get('organizations')) == 1
         assert len(enriched[0].get('tickets')) == 3
 
+    def test_join_matches_search(self, users, organizations, tickets):
+        res = tickets.search('status', 'pending')
+        alias = [{'field': 'name', 'alias': 'user_name'}]
+        fks = [
+            ForeignKeys('submitter_id', '_id', users, alias=alias),
+            ForeignKeys('organization_id', 'name', organizations, alias=alias),
+        ]
+        enriched = tickets.join(res, fks)
+        for record in enriched:
+            assert record['users'] == users.search('_id', record['submitter_id'], alias=alias)
+            assert record.get('organizations', []) == []
+
+    def test_lookup(self, tickets):
+        rows = tickets.lookup('tags', ['ohio', 'Ohio'])
+        assert rows['ohio'] == rows['Ohio']
+        assert [tickets.records[i] for i in rows['ohio']] == list(tickets._sequential_search('tags', 'ohio'))
+        rows = tickets.lookup('status', ['Pending', 'closed'])
+        assert [tickets.records[i] for i in rows['Pending']] == list(tickets._sequential_search('status', 'pending'))
+
     def test_join_2(self, users, organizations, tickets):
         res = users.search('_id', '71')
         enriched = users.join(res, [])
@@ -131,6 +483,133 @@ class TestIndex:
         index = Index('_id')
         assert index.references == {}
 
+    def test_compact(self):
+        index = Index('_id')
+        for i, value in enumerate([71, 52, 52]):
+            index.add(value, i)
+        index.compact()
+        assert isinstance(index.references, PostingMap)
+        assert list(index.search('52')) == [1, 2]
+        assert index.search('1') is None
+
+        index.add(1, 3)
+        index.add(52, 4)
+        # changes go to a delta next to the arrays instead of thawing them
+        assert isinstance(index.references, PostingMap)
+        assert index.references.changes == 2
+        assert list(index.search('1')) == [3]
+        assert list(index.search('52')) == [1, 2, 4]
+        assert sorted(index.references) == ['1', '52', '71']
+
+        index.compact()
+        assert index.references.changes == 0
+        assert list(index.references.postings) == [3, 1, 2, 4, 0]
+        assert list(index.search('52')) == [1, 2, 4]
+
+    def test_compact_recompacts(self, monkeypatch):
+        monkeypatch.setattr('zendesk.postings.MIN_CHANGES', 4)
+        index = Index('_id')
+        index.add(0, 0)
+        index.compact()
+        for i in range(1, 6):
+            index.add(i % 2, i)
+        assert index.references.changes == 0
+        assert list(index.search('0')) == [0, 2, 4]
+        assert list(index.search('1')) == [1, 3, 5]
+
+    def test_compact_table(self, users):
+        expected = users.search('organization_id', '104')
+        users.index_key.append('organization_id')
+        users.build_index()
+        users.compact_index()
+        assert users.search('organization_id', '104') == expected
+
+    def test_remove(self):
+        index = Index('_id')
+        for i, value in enumerate([71, 52, 52]):
+            index.add(value, i)
+        index.compact()
+        index.remove(52, 1)
+        index.remove(71, 0)
+        assert isinstance(index.references, PostingMap)
+        assert list(index.search('52')) == [2]
+        assert index.search('71') is None
+        assert list(index.references) == ['52']
+
+        keywords = ScanIndex('tags')
+        keywords.add(['Ohio', 'Idaho'], 0)
+        keywords.add(['ohio'], 1)
+        keywords.remove(['Ohio', 'Idaho'], 0)
+        assert keywords.search('ohio') == [1]
+        assert keywords.search('idaho') == []
+
+
+class TestMutation:
+
+    def test_insert(self, db, tickets):
+        row = db.insert('tickets', {'_id': 'new', 'submitter_id': 71, 'status': 'pending',
+                                    'tags': ['Ohio'], 'due_at': '2030-01-01T00:00:00 -10:00',
+                                    'subject': 'Printer on fire'})
+        assert row == len(tickets.records) - 1
+        assert [t['_id'] for t in db.search('tickets', 'submitter_id', '71')][-1] == 'new'
+        assert db.search('tickets', 'tags', 'ohio')[-1]['_id'] == 'new'
+        assert db.query('search tickets due_at>2029-01-01')[0]['_id'] == 'new'
+        assert db.find('tickets', 'printer fire')[0]['_id'] == 'new'
+        assert db.search('users', '_id', '71')[0]['tickets'][-1]['ticket_subject'] == 'Printer on fire'
+
+    def test_upsert(self, db, tickets):
+        before = len(db.search('tickets', 'submitter_id', '38'))
+        ticket = dict(db.search('tickets', '_id', '436bf9b0-1147-4c0a-8439-6f79833bff5b')[0])
+        ticket.pop('users', None)
+        ticket.pop('organizations', None)
+        ticket['submitter_id'] = 71
+        ticket['status'] = 'solved'
+        db.upsert('tickets', ticket)
+
+        res = db.search('tickets', '_id', ticket['_id'])
+        assert len(res) == 1 and res[0]['status'] == 'solved'
+        assert len(db.search('tickets', 'submitter_id', '38')) == before - 1
+        assert ticket['_id'] in [t['_id'] for t in db.search('tickets', 'submitter_id', '71')]
+        assert db.query('search tickets _id=436bf9b0-1147-4c0a-8439-6f79833bff5b and status=pending') == []
+
+    def test_delete(self, db, tickets):
+        count = len(db.search('tickets', 'status', 'pending'))
+        assert db.delete('tickets', '436bf9b0-1147-4c0a-8439-6f79833bff5b') == 1
+        assert db.search('tickets', '_id', '436bf9b0-1147-4c0a-8439-6f79833bff5b') == []
+        assert len(db.search('tickets', 'status', 'pending')) == count - 1
+        assert db.find('tickets', '"korea (north)"') == []
+        assert db.delete('tickets', '436bf9b0-1147-4c0a-8439-6f79833bff5b') == 0
+
+    def test_deleted_after_lookup(self, db, tickets):
+        # a concurrent delete tombstones the record after its postings were read
+        rows = tickets.indexes['submitter_id'].search('71')
+        for i in rows[:2]:
+            tickets.records[i] = None
+        alias = [{'field': 'subject', 'alias': 'ticket_subject'}]
+        assert len(list(tickets._indexed_search('submitter_id', rows, alias))) == len(rows) - 2
+        res = db.query('search tickets submitter_id=71 and type=incident order by priority')
+        assert all(t['submitter_id'] == 71 and t['type'] == 'incident' for t in res)
+        assert len(db.search('users', '_id', '71')[0]['tickets']) == len(rows) - 2
+
+    def test_mutate_mmap(self, config_path, tmp_path):
+        db = Database(store_dir=str(tmp_path))
+        db.load(read_yaml(config_path), storage='mmap')
+        db.delete('users', 71)
+        db.upsert('users', {'_id': 1, 'name': 'Renamed'})
+        users = db.collections['users']
+        assert isinstance(users.records.base, MmapRecords)
+        assert db.search('users', '_id', '71') == []
+        assert [u['name'] for u in db.search('users', '_id', '1')] == ['Renamed']
+        assert sum(1 for _ in users.live()) == len(users.records.base) - 1
+
+    def test_apply(self, db):
+        db.apply({'op': 'delete', 'table': 'users', 'key': 71})
+        assert db.search('users', '_id', '71') == []
+        for change in [{'op': 'drop', 'table': 'users'}, {'op': 'upsert', 'table': 'users'}, []]:
+            with pytest.raises(InvalidChangeException):
+                db.apply(change)
+
+
 class TestForeignKey:
 
     def test_initialize_foreign_key(self):
@@ -0,0 +1,101 @@
+from __future__ import annotations
+import threading
+from collections import Counter, OrderedDict
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+from .db import ScanIndex
+from .utilties import get_logger
+
+if TYPE_CHECKING:
+    from .db import Table
+
+logger = get_logger(__name__)
+
+
+class AutoIndexer:
+    """
+    Build indexes on demand for fields which keep being scanned
+
+    Once a field has been scanned `threshold` times an index is built for it,
+    in a background thread unless background is False. Auto-built indexes are
+    evicted least recently used first to stay within `max_indexes` indexes and
+    `max_postings` postings in total.
+    """
+
+    def __init__(
+        self,
+        threshold: int = 3,
+        max_indexes: int = 4,
+        max_postings: Optional[int] = None,
+        background: bool = True,
+    ):
+        self.threshold = threshold
+        self.max_indexes = max_indexes
+        self.max_postings = max_postings
+        self.background = background
+        self.scans: Counter = Counter()
+        # field -> number of postings, least recently used first
+        self.built: OrderedDict[str, int] = OrderedDict()
+        self.pending: set = set()
+        self._lock = threading.Lock()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def record_scan(self, table: Table, field: str) -> None:
+        with self._lock:
+            self.scans[field] += 1
+            if self.scans[field] < self.threshold or field in self.pending:
+                return
+            self.pending.add(field)
+
+        if self.background:
+            threading.Thread(target=self.build, args=(table, field), daemon=True).start()
+        else:
+            self.build(table, field)
+
+    def touch(self, field: str) -> None:
+        with self._lock:
+            if field in self.built:
+                self.built.move_to_end(field)
+
+    def build(self, table: Table, field: str) -> None:
+        logger.info(f"Auto indexing {table.name}.{field}")
+        idx = ScanIndex(field)
+        records = table.records
+        end = len(records)
+        for i in range(end):
+            if (record := records[i]) is not None:
+                idx.add(record.get(field), i)
+
+        # misses of a ScanIndex are final, so the rows written during the
+        # scan are added before writers see the index
+        with table.write_lock:
+            for i in range(end, len(table.records)):
+                if (record := table.records[i]) is not None:
+                    idx.add(record.get(field), i)
+            with self._lock:
+                self.pending.discard(field)
+                self.built[field] = idx.size()
+                table.indexes[field] = idx
+                self._evict(table)
+
+    def _evict(self, table: Table) -> None:
+        def over() -> bool:
+            if len(self.built) > self.max_indexes:
+                return True
+            if self.max_postings is not None:
+                return sum(self.built.values()) > self.max_postings
+            return False
+
+        while self.built and over():
+            field, _ = self.built.popitem(last=False)
+            table.indexes.pop(field, None)
+            self.scans[field] = 0
+            logger.info(f"Evicted auto index {table.name}.{field}")
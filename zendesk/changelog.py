@@ -0,0 +1,147 @@
+import json
+import os
+import threading
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+from .db import (
+    ColumnNotExistsException,
+    Database,
+    InvalidChangeException,
+    TableNotExistsException,
+)
+from .utilties import get_logger
+
+logger = get_logger(__name__)
+
+
+class ChangelogTailer:
+    """
+    Follow a JSONL changelog and apply every new line to a database
+
+    One change per line, see Database.apply. The file is polled every
+    `interval` seconds from the last byte read, a line still being written is
+    left for the next poll, and a truncated file is read again from the start.
+    The tailer attaches itself to the database, whose reload applies the
+    changes read so far again to the tables it reloads.
+    """
+
+    def __init__(self, database: Database, path: str, interval: float = 1.0):
+        self.database = database
+        self.path = path
+        self.interval = interval
+        self.offset = 0
+        self.applied = 0
+        # held while changes are applied, and by reload while it swaps tables
+        self.lock = threading.RLock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        database.changelog = self
+
+    def _lines(self, start: int, end: Optional[int] = None) -> Iterator[bytes]:
+        """
+        Complete lines of the file from byte start up to byte end, the offset
+        is advanced past every line yielded
+        """
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            read = start
+            for line in f:
+                if not line.endswith(b"\n") or (end is not None and read + len(line) > end):
+                    break
+                read += len(line)
+                if end is None:
+                    self.offset = read
+                if line.strip():
+                    yield line
+
+    def _apply(self, line: bytes, tables: Optional[Iterable[str]] = None) -> bool:
+        try:
+            change = json.loads(line)
+            if tables is not None and (not isinstance(change, dict) or change.get("table") not in tables):
+                return False
+            self.database.apply(change)
+            return True
+        except (
+            ValueError,
+            InvalidChangeException,
+            TableNotExistsException,
+            ColumnNotExistsException,
+        ) as e:
+            if tables is None:
+                logger.warning(f"Skipping change of {self.path}: {e}")
+            return False
+
+    def poll(self) -> int:
+        """
+        Apply the changes appended since the last poll
+        :return: number of changes applied
+        """
+        with self.lock:
+            try:
+                size = os.path.getsize(self.path)
+            except FileNotFoundError:
+                return 0
+            if size < self.offset:
+                logger.warning(f"Changelog {self.path} was truncated, reading it again")
+                self.offset = 0
+            if size == self.offset:
+                return 0
+
+            applied = sum(self._apply(line) for line in self._lines(self.offset))
+            if applied:
+                logger.info(f"Applied {applied} changes from {self.path}")
+            self.applied += applied
+            return applied
+
+    def replay(self, tables: Iterable[str]) -> int:
+        """
+        Apply again the changes read so far to the given tables, e.g. once
+        they have been reloaded from their resource files
+        :return: number of changes applied
+        """
+        tables = set(tables)
+        with self.lock:
+            try:
+                replayed = sum(self._apply(line, tables) for line in self._lines(0, self.offset))
+            except FileNotFoundError:
+                return 0
+        if replayed:
+            logger.info(f"Replayed {replayed} changes of {sorted(tables)} from {self.path}")
+        return replayed
+
+    def run(self) -> None:
+        while True:
+            try:
+                self.poll()
+            except Exception:
+                logger.exception(f"Cannot apply the changes of {self.path}")
+            if self._stop.wait(self.interval):
+                break
+
+    def start(self) -> "ChangelogTailer":
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self.database.changelog is self:
+            self.database.changelog = None
+
+
+def follow(database: Database, schemadef: Dict[str, Any]) -> Optional[ChangelogTailer]:
+    """
+    Start tailing the changelog configured in the schema, if any e.g.
+    changelog:
+      path: changes.jsonl
+      interval: 1.0
+    A relative path is resolved against the resource directory.
+    """
+    options = schemadef.get("changelog")
+    if not options:
+        return None
+    path = os.path.join(database.resource_dir, options["path"])
+    return ChangelogTailer(database, path, options.get("interval", 1.0)).start()
@@ -0,0 +1,229 @@
+import dataclasses
+import json
+import sys
+from collections.abc import Mapping
+from typing import Any, BinaryIO, Callable, Dict, FrozenSet, Iterator, List, Optional, Tuple, Type
+
+from .model import Organizations, Tickets, Users
+from .storage import iter_records
+from .utilties import get_logger
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+logger = get_logger(__name__)
+
+
+def _msgspec_loads(data: Any) -> Any:
+    try:
+        return msgspec.json.decode(data)
+    except msgspec.DecodeError as e:
+        raise ValueError(str(e)) from e
+
+
+# fastest first, json of the standard library is always available
+BACKENDS: Dict[str, Optional[Callable[[Any], Any]]] = {
+    "orjson": orjson.loads if orjson is not None else None,
+    "msgspec": _msgspec_loads if msgspec is not None else None,
+    "json": json.loads,
+}
+
+
+def available() -> List[str]:
+    return [name for name, loads in BACKENDS.items() if loads is not None]
+
+
+def backend(name: Optional[str] = None) -> str:
+    """
+    Resolve a decoder name, None is the streaming json module, "auto" picks
+    the fastest one installed and a backend which is not installed falls back
+    to json
+    """
+    if name is None:
+        return "json"
+    if name == "auto":
+        return available()[0]
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown decoder {name!r}, expecting one of {list(BACKENDS)}")
+    if BACKENDS[name] is None:
+        logger.warning(f"Decoder {name} is not installed, falling back to json")
+        return "json"
+    return name
+
+
+def intern_value(value: Any) -> Any:
+    """
+    Shared copy of a string, or of the strings of a list, so that records
+    holding equal values point to one object instead of a copy each
+    """
+    if type(value) is str:
+        return sys.intern(value)
+    if type(value) is list:
+        return [sys.intern(ele) if type(ele) is str else ele for ele in value]
+    return value
+
+
+class Record(Mapping):
+    """
+    Read-only record holding the fields of a model in slots instead of a
+    dict, subclassed for every model by record_type
+
+    Fields missing from the data are left unset and are missing from the
+    mapping too, fields outside of the model are kept in a dict of their own.
+    Values of the fields marked INTERNED by the model are interned.
+    """
+
+    __slots__ = ("_extra",)
+    _slot_of: Dict[str, str] = {}
+    _interned: FrozenSet[str] = frozenset()
+
+    def __init__(self, data: Mapping):
+        slot_of = self._slot_of
+        interned = self._interned
+        extra = None
+        for k, v in data.items():
+            slot = slot_of.get(k)
+            if slot is not None:
+                if k in interned:
+                    v = intern_value(v)
+                setattr(self, slot, v)
+            elif extra is None:
+                extra = {k: v}
+            else:
+                extra[k] = v
+        self._extra = extra
+
+    def __getitem__(self, key: str) -> Any:
+        slot = self._slot_of.get(key)
+        if slot is not None:
+            try:
+                return getattr(self, slot)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self._extra is not None:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        slot = self._slot_of.get(key)
+        if slot is not None:
+            return getattr(self, slot, default)
+        if self._extra is not None:
+            return self._extra.get(key, default)
+        return default
+
+    def __iter__(self) -> Iterator[str]:
+        for k, slot in self._slot_of.items():
+            if hasattr(self, slot):
+                yield k
+        if self._extra is not None:
+            yield from self._extra
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+
+def record_type(model: type) -> Type[Record]:
+    """
+    Record class with a slot for every field of a dataclass of model.py
+    """
+    fields = dataclasses.fields(model)
+    # prefixed so that fields never shadow the methods of the class
+    slot_of = {f.name: "f_" + f.name for f in fields}
+    interned = frozenset(f.name for f in fields if f.metadata.get("interned"))
+    name = model.__name__ + "Record"
+    return type(
+        name,
+        (Record,),
+        {
+            "__slots__": tuple(slot_of.values()),
+            "_slot_of": slot_of,
+            "_interned": interned,
+            "__module__": __name__,
+        },
+    )
+
+
+# module level so that records pickle by reference to their class
+OrganizationsRecord = record_type(Organizations)
+TicketsRecord = record_type(Tickets)
+UsersRecord = record_type(Users)
+
+MODELS: Dict[str, Type[Record]] = {
+    "Organizations": OrganizationsRecord,
+    "Tickets": TicketsRecord,
+    "Users": UsersRecord,
+}
+
+
+class Decoder:
+    """
+    Decode records with a JSON backend, optionally into the typed records of
+    a model
+
+    Example
+    Decoder("orjson", "Tickets").decode(b'{"_id": "a1"}')  -> TicketsRecord
+    Decoder("json").decode(b'{"_id": "a1"}')  -> {"_id": "a1"}
+    """
+
+    def __init__(self, name: Optional[str] = None, model: Optional[str] = None):
+        self.name = backend(name)
+        self.loads = BACKENDS[self.name]
+        if model is not None and model not in MODELS:
+            raise ValueError(f"Unknown model {model!r}, expecting one of {list(MODELS)}")
+        self.model = model
+        self.record_type = MODELS.get(model)
+
+    @classmethod
+    def of(cls, schema: Dict[str, Any], typed: bool = True) -> "Decoder":
+        """
+        Decoder declared by the decoder and model keys of a table schema
+        :param typed: whether to decode into the model, plain dicts otherwise
+        """
+        return cls(schema.get("decoder"), schema.get("model") if typed else None)
+
+    def record(self, obj: Any) -> Any:
+        if self.record_type is None or not isinstance(obj, dict):
+            return obj
+        return self.record_type(obj)
+
+    def decode(self, data: bytes) -> Any:
+        return self.record(self.loads(data))
+
+    def iter_file(self, f: BinaryIO) -> Iterator[Any]:
+        """
+        Decode the records of a file holding a top-level JSON array. The json
+        backend streams it chunk by chunk in bounded memory, faster backends
+        decode it at once and hold the whole file while doing so.
+        """
+        if self.name == "json":
+            for _, _, record in iter_records(f):
+                yield self.record(record)
+            return
+
+        records = self.loads(f.read())
+        if not isinstance(records, list):
+            raise ValueError("Expecting a JSON array")
+        for i, record in enumerate(records):
+            # drop the generic record as soon as it has been typed
+            records[i] = None
+            yield self.record(record)
+
+    def __getstate__(self) -> Tuple[str, Optional[str]]:
+        return self.name, self.model
+
+    def __setstate__(self, state: Tuple[str, Optional[str]]) -> None:
+        self.__init__(*state)
+
+    def __repr__(self) -> str:
+        return f"Decoder({self.name!r}, {self.model!r})"
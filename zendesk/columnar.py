@@ -0,0 +1,181 @@
+from __future__ import annotations
+import threading
+from array import array
+from itertools import compress
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# codes of values which are not dictionary encoded
+NO_MATCH = 0  # missing, None, empty or false values never match a search
+LIST = 1  # list values, matched element by element in Python
+
+
+def scan_key(value: Any) -> str:
+    """
+    Key of a scalar value under the match semantics of a scan
+    """
+    return str(value).lower()
+
+
+class Column:
+    """
+    Dictionary-encoded column of a table: one code per row, standing for the
+    case-folded value of the field. An equality or IN filter is then a
+    comparison of the codes, vectorized with numpy when it is installed and
+    run by itertools in C otherwise.
+
+    Example
+    data: [{"status": "open"}, {"status": "Pending"}, {}, {"status": "OPEN"}]
+    keys: ["", "", "open", "pending"]
+    codes: [2, 3, 0, 2]
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        # code -> key, the first two codes are reserved
+        self.keys: List[str] = ["", ""]
+        self.codes = array("I")
+        # rows holding a list value
+        self.lists = 0
+        self._code_of: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = self.__dict__.copy()
+        del state["_lock"]
+        del state["_code_of"]
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._code_of = {key: code for code, key in enumerate(self.keys) if code > LIST}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def _encode(self, value: Any) -> int:
+        if not value:
+            return NO_MATCH
+        if isinstance(value, list):
+            return LIST
+        key = scan_key(value)
+        code = self._code_of.get(key)
+        if code is None:
+            code = self._code_of[key] = len(self.keys)
+            self.keys.append(key)
+        return code
+
+    def add(self, value: Any, i: int) -> None:
+        code = self._encode(value)
+        with self._lock:
+            if len(self.codes) <= i:
+                self.codes.extend([NO_MATCH] * (i + 1 - len(self.codes)))
+            self.lists += (code == LIST) - (self.codes[i] == LIST)
+            self.codes[i] = code
+
+    def extend(self, rows: Iterable[Tuple[int, Any]]) -> None:
+        """
+        Encode the values of many rows at once, e.g. when building the column
+        :param rows: row id, value pairs in ascending row order
+        """
+        encode = self._encode
+        codes = array("I")
+        for i, value in rows:
+            if len(codes) < i:
+                codes.extend([NO_MATCH] * (i - len(codes)))
+            codes.append(encode(value))
+        with self._lock:
+            if len(self.codes) > len(codes):
+                codes.extend(self.codes[len(codes) :])
+            self.codes = codes
+            self.lists = codes.count(LIST)
+
+    def remove(self, i: int) -> None:
+        with self._lock:
+            if i < len(self.codes):
+                self.lists -= self.codes[i] == LIST
+                self.codes[i] = NO_MATCH
+
+    def merge(self, other: Column) -> None:
+        """
+        Take the rows encoded by other, e.g. a chunk of the records indexed
+        by another process, re-encoding its codes into this dictionary
+        """
+        remap = [NO_MATCH, LIST] + [self._encode(key) for key in other.keys[2:]]
+        with self._lock:
+            if len(self.codes) < len(other.codes):
+                self.codes.extend([NO_MATCH] * (len(other.codes) - len(self.codes)))
+            for i, code in enumerate(other.codes):
+                if code != NO_MATCH:
+                    self.codes[i] = remap[code]
+            self.lists = self.codes.count(LIST)
+
+    def _matching(self, codes: Sequence[int]) -> List[int]:
+        """
+        Rows whose code is one of codes, in row order
+        """
+        with self._lock:
+            if np is not None:
+                view = np.frombuffer(self.codes, dtype=np.uint32)
+                if len(codes) == 1:
+                    mask = view == codes[0]
+                else:
+                    mask = np.isin(view, np.array(codes, dtype=np.uint32))
+                rows = np.flatnonzero(mask).tolist()
+                # release the buffer, the array cannot grow while it is exported
+                del view, mask
+                return rows
+            if len(codes) == 1:
+                selectors = map(codes[0].__eq__, self.codes)
+            else:
+                selectors = map(frozenset(codes).__contains__, self.codes)
+            return list(compress(range(len(self.codes)), selectors))
+
+    def rows(self, value: Any, records: Sequence[Optional[Dict[Any, Any]]]) -> List[int]:
+        """
+        Rows matching value as a sequential scan would
+        """
+        return self.rows_in([value], records)[scan_key(value)]
+
+    def rows_in(
+        self, values: Iterable[Any], records: Sequence[Optional[Dict[Any, Any]]]
+    ) -> Dict[str, List[int]]:
+        """
+        Rows matching each of the values as a sequential scan would, in a
+        single pass over the codes
+        :return: scan key of every value -> rows, in row order
+        """
+        from .db import match
+
+        wanted = {scan_key(value): value for value in values}
+        res: Dict[str, List[int]] = {key: [] for key in wanted}
+        by_code = {
+            code: key for key in wanted if (code := self._code_of.get(key)) is not None
+        }
+        if len(by_code) == 1:
+            code, key = next(iter(by_code.items()))
+            res[key] = self._matching([code])
+        elif by_code:
+            codes = self.codes
+            for i in self._matching(list(by_code)):
+                res[by_code[codes[i]]].append(i)
+
+        if self.lists:
+            # list values are rare in a scalar column, check them in Python
+            for i in self._matching([LIST]):
+                record = records[i]
+                value = None if record is None else record.get(self.name)
+                for key, query in wanted.items():
+                    if match(value, query):
+                        res[key].append(i)
+            for rows in res.values():
+                rows.sort()
+        return res
+
+    def cardinality(self) -> int:
+        return len(self.keys) - 2
@@ -1,16 +1,45 @@
 from __future__ import annotations
-import json
 import os.path
-from typing import Dict, List, Any, Optional, Tuple
+import threading
+import time
+from bisect import bisect_left
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, Iterator, List, Mapping, MutableSequence, Any, Optional, Sequence, Tuple, Union
 from collections import defaultdict
+from contextlib import nullcontext
 from dataclasses import dataclass, field
 
+from .cache import QueryCache
+from .codec import Decoder
+from .columnar import Column
+from .fulltext import TextIndex, search as text_search
+from .metrics import UNINDEXED, Metrics
+from .postings import PostingMap
+from .ranges import SortedIndex
+from .snapshot import load_snapshot, save_snapshot
+from .storage import (
+    FileRecords,
+    MmapRecords,
+    OverlayRecords,
+    StoreWriter,
+    is_fresh,
+    iter_records,
+)
 from .utilties import get_logger
+from .views import RecordView
+
+if TYPE_CHECKING:
+    from .adaptive import AutoIndexer
+    from .changelog import ChangelogTailer
 
 logger = get_logger(__name__)
 
 resources = os.path.join(os.path.dirname(os.path.realpath(__file__)), "resources")
 
+# records joined at a time when streaming results
+JOIN_BATCH = 256
+
 
 class TableNotExistsException(Exception):
     pass
@@ -20,12 +49,31 @@ class ColumnNotExistsException(Exception):
     pass
 
 
+class InvalidChangeException(Exception):
+    pass
+
+
 @dataclass
 class ForeignKeys:
+    """
+    A compiled step of a join plan
+
+    field: local field holding the join key
+    foreign_key: field of the foreign table matched against it
+    alias: required fields of the foreign table, "all" keeps every field
+    projection: selects and renames the required fields of a foreign record
+    """
+
     field: str
     foreign_key: str
     foreign_table: Table
-    alias: Dict[str, str] = field(default_factory=lambda: defaultdict)
+    alias: Union[str, List[Dict[str, str]]] = "all"
+    projection: Callable[[Dict[Any, Any]], Optional[Mapping[Any, Any]]] = field(
+        init=False, repr=False
+    )
+
+    def __post_init__(self):
+        self.projection = compile_projection(self.alias)
 
 
 @dataclass
@@ -46,89 +94,572 @@ class Index:
     name: str
     references: Dict[str, List[Any]] = field(default_factory=lambda: defaultdict(list))
 
-    def search(self, key: str) -> Optional[List[Any]]:
+    def keys_of(self, value: Any) -> Iterable[str]:
+        """
+        Keys a value is indexed under
+        """
+        return (str(value),)
+
+    def add(self, value: Any, i: int) -> None:
+        if isinstance(self.references, PostingMap):
+            for key in self.keys_of(value):
+                self.references.add(key, i)
+            return
+        for key in self.keys_of(value):
+            self.references[key].append(i)
+
+    def remove(self, value: Any, i: int) -> None:
+        """
+        Drop row i from the postings of a value, the row must have been
+        added with that value
+        """
+        if isinstance(self.references, PostingMap):
+            for key in self.keys_of(value):
+                self.references.remove(key, i)
+            return
+        for key in self.keys_of(value):
+            rows = self.references.get(key)
+            if not rows:
+                continue
+            n = bisect_left(rows, i)
+            if n < len(rows) and rows[n] == i:
+                del rows[n]
+            if not rows:
+                del self.references[key]
+
+    def merge(self, other: Index) -> None:
+        """
+        Append the postings of an index built over later records
+        """
+        if isinstance(self.references, PostingMap):
+            for key, rows in other.references.items():
+                for i in rows:
+                    self.references.add(key, i)
+            return
+        for key, rows in other.references.items():
+            self.references[key].extend(rows)
+
+    def compact(self) -> None:
+        """
+        Freeze posting lists into sorted, array backed storage. Later changes
+        are kept in a delta next to the arrays, see PostingMap.
+        """
+        if isinstance(self.references, PostingMap):
+            self.references.compact()
+        else:
+            self.references = PostingMap(self.references)
+
+    def search(self, key: str) -> Optional[Sequence[int]]:
         return self.references.get(key)
 
 
+@dataclass
+class KeywordIndex(Index):
+    """
+    Multi-valued inverted index over list fields e.g. tags
+
+    Every element of the list is indexed on its own with case-folded keys, so
+    a lookup returns exact element matches only.
+
+    Example
+    data: [{"tags": ["Ohio", "Idaho"]}, {"tags": ["ohio"]}]
+    index: {"ohio": [0, 1], "idaho": [0]}
+    """
+
+    def keys_of(self, value: Any) -> Iterable[str]:
+        if not isinstance(value, list):
+            value = [] if value is None else [value]
+        return dict.fromkeys(str(ele).casefold() for ele in value)
+
+    def search(self, key: str) -> Optional[Sequence[int]]:
+        # an index miss is authoritative, no need to fall back to a scan
+        return self.references.get(key.casefold(), [])
+
+
+@dataclass
+class ScanIndex(KeywordIndex):
+    """
+    Index answering exactly like a sequential scan of the field
+
+    Falsy values are skipped, scalars are keyed lower-cased and list elements
+    case-folded, see db.match
+    """
+
+    def keys_of(self, value: Any) -> Iterable[str]:
+        if not value:
+            return ()
+        if isinstance(value, list):
+            return dict.fromkeys(str(ele).casefold() for ele in value)
+        return (str(value).lower(),)
+
+    def search(self, key: str) -> Optional[Sequence[int]]:
+        lower, folded = key.lower(), key.casefold()
+        if lower == folded:
+            return self.references.get(lower, [])
+        return sorted(
+            set(self.references.get(lower, [])) | set(self.references.get(folded, []))
+        )
+
+    def size(self) -> int:
+        return sum(len(v) for v in self.references.values())
+
+
+def match(find: Any, value: str) -> bool:
+    """
+    Match semantics of a scan: case-insensitive equality, or for list fields
+    case-insensitive equality with any of the elements
+    """
+    if not find:
+        return False
+    if isinstance(find, list):
+        key = str(value).casefold()
+        return any(str(ele).casefold() == key for ele in find)
+    return str(find).lower() == str(value).lower()
+
+
+def project(record: Dict[Any, Any], alias: Any) -> Optional[Mapping[Any, Any]]:
+    """
+    Select fields of a record and rename them by alias, "all" keeps the record.
+    Selected fields are a view over the record, nothing is copied.
+    """
+    if alias == "all":
+        return record
+    elif isinstance(alias, list):
+        return RecordView(record, {ele.get("alias"): ele.get("field") for ele in alias})
+    return None
+
+
+def compile_projection(
+    alias: Any,
+) -> Callable[[Dict[Any, Any]], Optional[Mapping[Any, Any]]]:
+    """
+    Turn an alias list into a function with the same result as project
+    """
+    if alias == "all":
+        return lambda record: record
+    elif isinstance(alias, list):
+        columns = {ele.get("alias"): ele.get("field") for ele in alias}
+        return lambda record: RecordView(record, columns)
+    return lambda record: None
+
+
 @dataclass
 class Table:
     name: str
     primary_key: str = ""
-    foreign_key: List[Dict[str, Tuple[str, str]]] = field(
-        default_factory=defaultdict(list)
-    )
+    foreign_key: List[Dict[str, Tuple[str, str]]] = field(default_factory=list)
     index_key: List[str] = field(default_factory=list)
-    records: List[Dict[Any, Any]] = field(default_factory=list)
+    keyword_key: List[str] = field(default_factory=list)
+    range_key: List[str] = field(default_factory=list)
+    text_key: List[str] = field(default_factory=list)
+    stemming: bool = False
+    columnar_key: List[str] = field(default_factory=list)
+    records: Sequence[Dict[Any, Any]] = field(default_factory=list)
     indexes: Dict[str, Index] = field(default_factory=lambda: defaultdict(Index))
+    range_indexes: Dict[str, SortedIndex] = field(default_factory=dict)
+    text_indexes: Dict[str, TextIndex] = field(default_factory=dict)
+    columns: Dict[str, Column] = field(default_factory=dict)
+    auto_index: Optional[AutoIndexer] = None
+    # counters of index hits, scans and joins, attached once the table is loaded
+    metrics: Optional[Metrics] = None
+    # held by writers, and by index builds while they catch up and swap in
+    write_lock: threading.RLock = field(
+        default_factory=threading.RLock, repr=False, compare=False
+    )
 
-    def _build_index(self, k: str) -> None:
-        idx = Index(k)
+    def __getstate__(self) -> Dict[str, Any]:
+        state = self.__dict__.copy()
+        del state["write_lock"]
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self.write_lock = threading.RLock()
+
+    def live(self) -> Iterator[Tuple[int, Dict[Any, Any]]]:
+        """
+        Row ids and records, skipping deleted records
+        """
         for i, record in enumerate(self.records):
-            key = str(record.get(k))
-            idx.references[key].append(i)
+            if record is not None:
+                yield i, record
+
+    def _new_index(self, k: str) -> Index:
+        if k in (self.keyword_key or []):
+            return KeywordIndex(k)
+        return Index(k)
+
+    def _build_index(self, k: str) -> None:
+        idx = self._new_index(k)
+        for i, record in self.live():
+            idx.add(record.get(k), i)
         self.indexes[k] = idx
 
+    def _index_keys(self) -> List[str]:
+        keys = [self.primary_key] if self.primary_key else []
+        keys += [k for k in self.index_key or [] if k not in keys]
+        keys += [k for k in self.keyword_key or [] if k not in keys]
+        return keys
+
     def build_index(self) -> None:
         """
         Construct index data structure
         """
         logger.info(f"Building primary index...{self.name}")
-        pk = self.primary_key
-        if pk != "":
-            self._build_index(pk)
+        for k in self._index_keys():
+            self._build_index(k)
+        for k in self.range_key or []:
+            idx = SortedIndex(k)
+            for i, record in self.live():
+                idx.add(record.get(k), i)
+            self.range_indexes[k] = idx
+        for k in self.text_key or []:
+            text_idx = TextIndex(k, self.stemming)
+            for i, record in self.live():
+                text_idx.add(record.get(k), i)
+            self.text_indexes[k] = text_idx
+        for k in self.columnar_key or []:
+            column = Column(k)
+            column.extend((i, record.get(k)) for i, record in self.live())
+            self.columns[k] = column
+
+    def create_index(self) -> None:
+        """
+        Create empty indexes to be filled record by record with index_record
+        """
+        for k in self._index_keys():
+            self.indexes[k] = self._new_index(k)
+        for k in self.range_key or []:
+            self.range_indexes[k] = SortedIndex(k)
+        for k in self.text_key or []:
+            self.text_indexes[k] = TextIndex(k, self.stemming)
+        for k in self.columnar_key or []:
+            self.columns[k] = Column(k)
+
+    def index_record(self, i: int, record: Dict[Any, Any]) -> None:
+        for k, idx in list(self.indexes.items()):
+            idx.add(record.get(k), i)
+        for k, idx in self.range_indexes.items():
+            idx.add(record.get(k), i)
+        for k, text_idx in self.text_indexes.items():
+            text_idx.add(record.get(k), i)
+        for k, column in self.columns.items():
+            column.add(record.get(k), i)
+
+    def unindex_record(self, i: int, record: Dict[Any, Any]) -> None:
+        for k, idx in list(self.indexes.items()):
+            idx.remove(record.get(k), i)
+        for k, idx in self.range_indexes.items():
+            idx.remove(record.get(k), i)
+        for k, text_idx in self.text_indexes.items():
+            text_idx.remove(record.get(k), i)
+        for column in self.columns.values():
+            column.remove(i)
+
+    def _writable(self) -> MutableSequence:
+        if not isinstance(self.records, MutableSequence):
+            self.records = OverlayRecords(self.records)
+        return self.records
+
+    def rows_of(self, key: Any) -> List[int]:
+        """
+        Rows of the live records with the given primary key
+        """
+        if not self.primary_key:
+            raise ColumnNotExistsException(f"{self.name} has no primary_key")
+        idx = self.indexes.get(self.primary_key)
+        if idx is not None:
+            rows = idx.search(str(key)) or []
+        else:
+            rows = [i for i, record in self.live() if str(record.get(self.primary_key)) == str(key)]
+        return [i for i in rows if self.records[i] is not None]
+
+    def insert(self, record: Dict[Any, Any]) -> int:
+        """
+        Append a record and index it
+        :return: its row id
+        """
+        with self.write_lock:
+            records = self._writable()
+            i = len(records)
+            records.append(record)
+            self.index_record(i, record)
+            return i
+
+    def delete(self, key: Any) -> int:
+        """
+        Delete the records with the given primary key. Their rows are left as
+        None tombstones so that row ids held by the indexes stay valid.
+        :return: number of records deleted
+        """
+        with self.write_lock:
+            records = self._writable()
+            rows = self.rows_of(key)
+            for i in rows:
+                self.unindex_record(i, records[i])
+                records[i] = None
+            return len(rows)
+
+    def upsert(self, record: Dict[Any, Any]) -> int:
+        """
+        Replace the record with the same primary key, or insert it. The new
+        version is appended so posting lists stay sorted by row id.
+        :return: its row id
+        """
+        if self.primary_key not in record:
+            raise ColumnNotExistsException(f"record has no {self.primary_key}")
+        with self.write_lock:
+            self.delete(record[self.primary_key])
+            return self.insert(record)
+
+    def index_state(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Every index of the table, as persisted by snapshots
+        """
+        return {
+            "indexes": dict(self.indexes),
+            "range_indexes": self.range_indexes,
+            "text_indexes": self.text_indexes,
+            "columns": self.columns,
+        }
 
-        if len(self.index_key) > 0:
-            for k in self.index_key:
-                if k != self.primary_key:
-                    self._build_index(k)
+    def restore_index_state(self, state: Dict[str, Dict[str, Any]]) -> None:
+        self.indexes = state["indexes"]
+        self.range_indexes = state["range_indexes"]
+        self.text_indexes = state["text_indexes"]
+        self.columns = state["columns"]
 
-    def _index_search(self, field: str, value: str) -> Optional[List[int]]:
+    def merge_index_state(self, state: Dict[str, Dict[str, Any]]) -> None:
+        """
+        Merge the indexes built over a later chunk of records
+        """
+        for kind, indexes in state.items():
+            for k, idx in indexes.items():
+                getattr(self, kind)[k].merge(idx)
+
+    def compact_index(self) -> None:
+        for idx in self.indexes.values():
+            idx.compact()
+
+    def metric_field(self, field: str) -> str:
+        """
+        Label the metrics of a search by field are recorded under, fields
+        without any index share one
+        """
+        if (
+            field in self.indexes
+            or field in self.range_indexes
+            or field in self.text_indexes
+            or field in self.columns
+        ):
+            return field
+        return UNINDEXED
+
+    def _index_search(self, field: str, value: str) -> Optional[Sequence[int]]:
         """
         Search by field value and return the index of occurrence
         """
-        logger.info(f"indexing search...{self.name}: {field} {value}")
+        logger.debug("indexing search...%s: %s %s", self.name, field, value)
         if index_record := self.indexes.get(field):
             reference = index_record.search(str(value))
             return reference
 
     def _sequential_search(
         self, field: str, value: str, alias: List[Dict[str, str]] = "all"
-    ) -> List[Any]:
-        logger.info(f"Seq scan {self.name} {field} {value} {alias}")
-        res = []
-        for record in self.records:
+    ) -> Iterator[Any]:
+        logger.info("Seq scan %s %s %s %s", self.name, field, value, alias)
+        scanned = 0
+        try:
+            for scanned, (_, record) in enumerate(self.live(), 1):
+                if find := record.get(field):
+                    if match(find, value):
+                        if (projected := project(record, alias)) is not None:
+                            yield projected
+        finally:
+            if self.metrics:
+                self.metrics.scanned(self.name, self.metric_field(field), scanned, index=False)
+
+    def _columnar_search(
+        self, field: str, value: str, alias: List[Dict[str, str]] = "all"
+    ) -> Iterator[Any]:
+        """
+        Scan the encoded column of the field instead of the records, only the
+        matching records are then read
+        """
+        rows = self.columns[field].rows(value, self.records)
+        if self.metrics:
+            self.metrics.scanned(self.name, field, len(self.records), index=False)
+        for i in rows:
+            if (record := self.records[i]) is None:
+                continue
+            if (projected := project(record, alias)) is not None:
+                yield projected
+
+    def _indexed_search(
+        self, field: str, rows: Sequence[int], alias: List[Dict[str, str]] = "all"
+    ) -> Iterator[Any]:
+        scanned = 0
+        try:
+            for scanned, i in enumerate(rows, 1):
+                # the record may have been deleted since its postings were read
+                if (record := self.records[i]) is None:
+                    continue
+                if (projected := project(record, alias)) is not None:
+                    yield projected
+        finally:
+            if self.metrics:
+                self.metrics.scanned(self.name, field, scanned, index=True)
+
+    def lookup(self, field: str, values: Iterable[str]) -> Dict[str, Sequence[int]]:
+        """
+        Row ids matching each of the values, with the same semantics as search.
+        Values the index cannot answer are resolved together in a single
+        hash join pass over the records instead of a scan per value.
+        """
+        res: Dict[str, Sequence[int]] = {}
+        idx = self.indexes.get(field)
+        by_lower: Dict[str, List[str]] = defaultdict(list)
+        by_fold: Dict[str, List[str]] = defaultdict(list)
+        for value in values:
+            rows = idx.search(value) if idx else None
+            if rows is None:
+                res[value] = []
+                by_lower[value.lower()].append(value)
+                by_fold[value.casefold()].append(value)
+            else:
+                res[value] = rows
+
+        if self.metrics and idx is not None:
+            self.metrics.scanned(
+                self.name, field, sum(len(rows) for rows in res.values()), index=True
+            )
+        if not by_lower:
+            return res
+
+        if (column := self.columns.get(field)) is not None:
+            found = column.rows_in(by_lower, self.records)
+            for key, same in by_lower.items():
+                for value in same:
+                    res[value] = found[key]
+            if self.metrics:
+                self.metrics.scanned(self.name, field, len(self.records), index=False)
+            if self.auto_index:
+                self.auto_index.record_scan(self, field)
+            return res
+
+        logger.debug("Hash join scan %s %s for %d keys", self.name, field, len(by_lower))
+        label = self.metric_field(field)
+        for i, record in self.live():
             if find := record.get(field):
-                if (str(find).lower() == str(value).lower()) or (isinstance(find, list) & (str(value).lower() in str(find).lower())):
-                    if alias == "all":
-                        res.append(record)
-                    elif isinstance(alias, list):
-                        filtered = {}
-                        for ele in alias:
-                            k = ele.get("field")
-                            v = ele.get("alias")
-                            if k in record:
-                                filtered[v] = record.get(k)
-                        res.append(filtered)
-                    else:
-                        continue
+                if isinstance(find, list):
+                    matched = {
+                        value
+                        for ele in find
+                        for value in by_fold.get(str(ele).casefold(), ())
+                    }
+                else:
+                    matched = by_lower.get(str(find).lower(), ())
+                for value in matched:
+                    res[value].append(i)
+
+        if self.metrics:
+            self.metrics.scanned(self.name, label, len(self.records), index=False)
+        if self.auto_index:
+            self.auto_index.record_scan(self, field)
         return res
 
-    def join(self, records: List[Dict], fks: List[ForeignKeys]) -> List[Any]:
+    def join(
+        self,
+        records: List[Dict],
+        fks: List[ForeignKeys],
+        fields: Optional[List[str]] = None,
+    ) -> List[Any]:
         """
         Enrich table with external fields
+
+        Distinct join keys are collected first so every foreign table is
+        probed once per key, and each foreign record is projected once.
+        Joined records are returned as views layered over the stored ones,
+        which are left untouched.
+        :param fields: fields of the results, all of them when None
         """
-        for record in records:
-            for fk in fks:
-                field = fk.field
-                foreign_key = fk.foreign_key
-                foreign_table = fk.foreign_table
-                alias = fk.alias
+        columns = None if fields is None else {k: k for k in fields}
+        if not fks and columns is None:
+            return records
+
+        extras: List[Dict[str, Any]] = [{} for _ in records]
+        for fk in fks:
+            foreign_table = fk.foreign_table
+            keys = {
+                str(value): None for record in records if (value := record.get(fk.field))
+            }
+            if not keys:
+                continue
+
+            rows = foreign_table.lookup(fk.foreign_key, keys)
+            projected: Dict[int, Any] = {}
+            for i in {i for ids in rows.values() for i in ids}:
+                if (foreign := foreign_table.records[i]) is not None:
+                    projected[i] = fk.projection(foreign)
+
+            total = most = 0
+            for record, extra in zip(records, extras):
+                if value := record.get(fk.field):
+                    joined = extra[foreign_table.name] = [
+                        projected[i]
+                        for i in rows[str(value)]
+                        if projected.get(i) is not None
+                    ]
+                    total += len(joined)
+                    most = max(most, len(joined))
+
+            if self.metrics:
+                self.metrics.joined(self.name, foreign_table.name, len(records), total, most)
 
-                if value := record.get(field):
-                    res = foreign_table.search(foreign_key, value, alias=alias)
-                    record[foreign_table.name] = res
+        return [
+            RecordView(record, columns, extra or None)
+            for record, extra in zip(records, extras)
+        ]
 
-        return records
+    def find(self, text: str, k: Optional[int] = 10) -> List[Tuple[int, float]]:
+        """
+        Full-text search over the fields declared under text_index
+        :param text: words to find, quoted words are matched as a phrase
+        :param k: number of top ranked rows to return, all of them when None
+        :return: (row, score) pairs, best first
+        """
+        if not self.text_indexes:
+            raise ColumnNotExistsException(f"{self.name} has no text_index")
+        logger.info("%s: finding %s", self.name, text)
+        res = text_search(list(self.text_indexes.values()), text, k)
+        if self.metrics:
+            self.metrics.scanned(self.name, "find", len(res), index=True)
+        return res
+
+    def iter_search(
+        self, field: str, value: str, alias: List[Dict[str, str]] = "all"
+    ) -> Iterator[Any]:
+        """
+        Lazy search, records are looked up or scanned only as the caller
+        consumes them so a scan stops as soon as the caller does.
+        :param field: field name
+        :param value: value to search for
+        :param alias: selected fields
+        """
+
+        logger.info("%s: searching %s=%s", self.name, field, value)
+        indexes = self._index_search(field, value)
+
+        if indexes is not None:
+            if self.auto_index:
+                self.auto_index.touch(field)
+            return self._indexed_search(field, indexes, alias)
+        else:
+            if self.auto_index:
+                self.auto_index.record_scan(self, field)
+            if field in self.columns:
+                return self._columnar_search(field, value, alias)
+            return self._sequential_search(field, value, alias)
 
     def search(
         self, field: str, value: str, alias: List[Dict[str, str]] = "all"
@@ -142,71 +673,405 @@ class Table:
         example:
         alias =  [{'alias': 'organization_name', 'field': 'name'}]
         """
+        return list(self.iter_search(field, value, alias))
 
-        logger.info(f"{self.name}: searching {field}={value}")
-        indexes = self._index_search(field, value)
-
-        if indexes:
-            res = []
-            for i in indexes:
-                if alias == "all":
-                    record = self.records[i]
-                    res.append(record)
-                elif isinstance(alias, list):
-                    record = self.records[i]
-                    filtered = {}
-                    for ele in alias:
-                        k = ele.get("field")
-                        v = ele.get("alias")
-                        if k in record:
-                            filtered[v] = record.get(k)
-                    res.append(filtered)
-                else:
-                    continue
-
-            return res
-        else:
-            res = self._sequential_search(field, value, alias)
-            return res
+    def iter_join(
+        self,
+        records: Iterable[Dict],
+        fks: List[ForeignKeys],
+        fields: Optional[List[str]] = None,
+        batch_size: int = JOIN_BATCH,
+    ) -> Iterator[Any]:
+        """
+        Join records lazily, batch_size records at a time, so the foreign
+        tables are probed once per batch rather than once per record
+        """
+        it = iter(records)
+        while batch := list(islice(it, batch_size)):
+            yield from self.join(batch, fks, fields)
 
 
 class Database:
-    def __init__(self):
+    def __init__(self, resource_dir: str = resources, store_dir: Optional[str] = None):
         self.name: str = "zendesk"
+        self.resource_dir = resource_dir
+        self.store_dir = store_dir or resource_dir
         self.collections: Dict[str, Table] = {}
+        # optional query result cache, configured by the cache section of the schema
+        self.cache: Optional[QueryCache] = None
+        # table name -> compiled foreign keys, see compile_join_plans
+        self.join_plans: Dict[str, List[ForeignKeys]] = {}
+        # table name -> "hit" or "rebuilt" for tables loaded with a snapshot
+        self.snapshot_status: Dict[str, str] = {}
+        # table name -> seconds spent loading and indexing
+        self.load_timings: Dict[str, float] = {}
+        # table name -> seconds of load_timings spent indexing
+        self.index_timings: Dict[str, float] = {}
+        # latency and scan counters, configured by the metrics section of the schema
+        self.metrics = Metrics()
+        # tailer applying a changelog, its changes are replayed on reloaded tables
+        self.changelog: Optional[ChangelogTailer] = None
 
-    def load(self, schemadef: Dict[str, Any]) -> None:
+    def load(
+        self,
+        schemadef: Dict[str, Any],
+        storage: Optional[str] = None,
+        snapshot: Union[bool, str, None] = None,
+        workers: Optional[int] = None,
+        chunk_size: Optional[int] = None,
+    ) -> None:
         """
         Build database from the given schema object
+        :param storage: override the storage declared for each table, one of
+            "memory" (default), "lazy" which keeps byte offsets into the source
+            file only, or "mmap" which memory maps a compact store written once
+            under store_dir
+        :param snapshot: override the snapshot flag declared for each table.
+            Indexes are then restored from <table>.snapshot under store_dir
+            when it is still valid, and the snapshot is rebuilt otherwise.
+            "checksum" also compares a sha1 digest of the source file
+        :param workers: load tables in parallel with that many processes,
+            defaults to the workers of the parallel section of the schema
+        :param chunk_size: split tables stored with mmap into chunks of that
+            many records, indexed in parallel and merged
         """
-        tables = schemadef.get("tables")
-        for table_name, schema in tables.items():
+        if options := schemadef.get("cache"):
+            self.cache = QueryCache(**(options if isinstance(options, dict) else {}))
+        elif self.cache is not None:
+            self.cache.clear()
+        if options := schemadef.get("metrics"):
+            self.metrics = Metrics(**(options if isinstance(options, dict) else {}))
 
-            filename = os.path.join(resources, table_name + ".json")
-            logger.info(f"Loading {table_name} from {filename}")
+        jobs = self._jobs(schemadef, storage, snapshot)
 
-            index = schema.get("index")
-            primary_key = schema.get("primary_key")
-            external_fields = schema.get("external_fields")
+        parallel = schemadef.get("parallel") or {}
+        workers = workers or parallel.get("workers")
+        chunk_size = chunk_size or parallel.get("chunk_size")
+        if workers and workers > 1:
+            self._load_parallel(jobs, workers, chunk_size)
+        else:
+            for job in jobs:
+                table_name, filename = job[0], job[2]
+                logger.info(f"Loading {table_name} from {filename}")
+                start = time.perf_counter()
+                try:
+                    table = self._load_table(*job)
+                    self._loaded(table, time.perf_counter() - start)
+                except FileNotFoundError:
+                    self._failed(table_name, filename)
 
-            try:
-                table = Table(
-                    name=table_name,
-                    primary_key=primary_key,
-                    foreign_key=external_fields,
-                    index_key=index,
-                )
+        self.compile_join_plans()
+
+    def _jobs(
+        self,
+        schemadef: Dict[str, Any],
+        storage: Optional[str] = None,
+        snapshot: Union[bool, str, None] = None,
+    ) -> List[Tuple]:
+        """
+        Arguments of _load_table for every table of the schema
+        """
+        jobs = []
+        for table_name, schema in schemadef.get("tables").items():
+            if "decoder" in schemadef and "decoder" not in schema:
+                schema = {**schema, "decoder": schemadef["decoder"]}
+            filename = os.path.join(self.resource_dir, table_name + ".json")
+            if snapshot is None:
+                use_snapshot = schema.get("snapshot", False)
+            else:
+                use_snapshot = snapshot
+            jobs.append(
+                (table_name, schema, filename, storage or schema.get("storage"), use_snapshot)
+            )
+        return jobs
 
-                # TODO: lazy load bigfile
-                with open(filename, "r") as f:
-                    source = json.load(f)
-                    table.records = source
-                    self.collections[table_name] = table
-                    table.build_index()
-                    print(f"{table_name} loads successfully!")
+    def reload(
+        self,
+        schemadef: Dict[str, Any],
+        tables: Optional[Iterable[str]] = None,
+        storage: Optional[str] = None,
+        snapshot: Union[bool, str, None] = None,
+    ) -> Dict[str, float]:
+        """
+        Load tables again without downtime. New tables and their indexes are
+        built off to the side, then swapped in along with recompiled join
+        plans, so searches in flight finish on the old version. A table which
+        fails to load keeps its old version. Changes of the changelog applied
+        so far are replayed on the reloaded tables.
+        :param tables: names of the tables to reload, all of them when None
+        :return: seconds taken to reload each table
+        """
+        collections = dict(self.collections)
+        timings: Dict[str, float] = {}
+        for job in self._jobs(schemadef, storage, snapshot):
+            table_name, filename = job[0], job[2]
+            if tables is not None and table_name not in tables:
+                continue
+            logger.info(f"Reloading {table_name} from {filename}")
+            start = time.perf_counter()
+            try:
+                collections[table_name] = self._load_table(*job)
+                collections[table_name].metrics = self.metrics
             except FileNotFoundError:
-                logger.error(f"{filename} not exists")
-                print(f"{table_name} failed. {filename} not exists")
+                self._failed(table_name, filename)
+                continue
+            except ValueError as e:
+                logger.error(f"Cannot reload {table_name}, keeping the loaded one: {e}")
+                continue
+            timings[table_name] = time.perf_counter() - start
+
+        if timings:
+            join_plans = self._compile_join_plans(collections)
+            changelog = self.changelog
+            # no change is applied between the swap and the replay
+            with changelog.lock if changelog is not None else nullcontext():
+                self.collections = collections
+                self.join_plans = join_plans
+                if changelog is not None:
+                    changelog.replay(timings)
+            self.load_timings.update(timings)
+            self._changed()
+            for table_name, seconds in timings.items():
+                self.metrics.loaded(table_name, seconds, self.index_timings.get(table_name))
+                print(f"{table_name} reloads successfully! ({seconds:.2f}s)")
+        return timings
+
+    def _loaded(self, table: Table, seconds: float) -> None:
+        self.collections[table.name] = table
+        self.load_timings[table.name] = seconds
+        table.metrics = self.metrics
+        self.metrics.loaded(table.name, seconds, self.index_timings.get(table.name))
+        if status := self.snapshot_status.get(table.name):
+            print(f"{table.name} loads successfully! (index snapshot {status}, {seconds:.2f}s)")
+        else:
+            print(f"{table.name} loads successfully! ({seconds:.2f}s)")
+
+    def _failed(self, table_name: str, filename: str) -> None:
+        logger.error(f"{filename} not exists")
+        print(f"{table_name} failed. {filename} not exists")
+
+    def _load_parallel(
+        self, jobs: List[Tuple], workers: int, chunk_size: Optional[int] = None
+    ) -> None:
+        """
+        Load tables concurrently in a process pool. Tables stored with mmap
+        are further split into chunks of chunk_size records, indexed by
+        different workers and merged afterwards.
+        """
+        started: Dict[str, float] = {}
+        # table name -> when its chunks were submitted for indexing
+        indexing: Dict[str, float] = {}
+        # table name -> (table, indexes of finished chunks by position, chunks)
+        chunked: Dict[str, Tuple[Table, Dict[int, Dict[str, Any]], int]] = {}
+        context = (self.resource_dir, self.store_dir)
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # future -> (kind of task, job)
+            pending = {}
+            for job in jobs:
+                table_name, filename, storage = job[0], job[2], job[3]
+                logger.info(f"Loading {table_name} from {filename} in parallel")
+                started[table_name] = time.perf_counter()
+                if storage == "mmap" and chunk_size:
+                    future = pool.submit(
+                        _store_task,
+                        context,
+                        table_name,
+                        filename,
+                        Decoder.of(job[1], typed=False),
+                    )
+                    pending[future] = ("store", job)
+                else:
+                    future = pool.submit(_load_table_task, context, job)
+                    pending[future] = ("table", job)
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    kind, job = pending.pop(future)
+                    table_name, schema, filename, _, use_snapshot = job
+                    try:
+                        res = future.result()
+                    except FileNotFoundError:
+                        self._failed(table_name, filename)
+                        continue
+
+                    if kind == "table":
+                        table, status, seconds = res
+                        if status:
+                            self.snapshot_status[table_name] = status
+                        else:
+                            self.snapshot_status.pop(table_name, None)
+                        if seconds is not None:
+                            self.index_timings[table_name] = seconds
+                        self._loaded(table, time.perf_counter() - started[table_name])
+
+                    elif kind == "store":
+                        data_path, offsets_path = res
+                        table = self._new_table(table_name, schema)
+                        table.records = MmapRecords(data_path, offsets_path, Decoder.of(schema))
+                        if not self._restore_index(table, schema, filename, use_snapshot):
+                            self.index_timings.pop(table_name, None)
+                            self._loaded(table, time.perf_counter() - started[table_name])
+                            continue
+                        indexing[table_name] = time.perf_counter()
+                        bounds = range(0, max(len(table.records), 1), chunk_size)
+                        chunked[table_name] = (table, {}, len(bounds))
+                        for lo in bounds:
+                            future = pool.submit(
+                                _index_task, table_name, schema, res, lo, lo + chunk_size
+                            )
+                            pending[future] = ("chunk", job)
+
+                    else:
+                        table, parts, count = chunked[table_name]
+                        parts[res[0]] = res[1]
+                        if len(parts) < count:
+                            continue
+                        # chunks finish out of order, merge them by position
+                        # so that postings stay sorted
+                        for lo in sorted(parts):
+                            table.merge_index_state(parts[lo])
+                        self._finish_table(table, schema, filename, use_snapshot)
+                        self.index_timings[table_name] = (
+                            time.perf_counter() - indexing[table_name]
+                        )
+                        self._loaded(table, time.perf_counter() - started[table_name])
+
+    def _new_table(self, table_name: str, schema: Dict[str, Any]) -> Table:
+        table = Table(
+            name=table_name,
+            primary_key=schema.get("primary_key"),
+            foreign_key=schema.get("external_fields"),
+            index_key=schema.get("index"),
+            keyword_key=schema.get("keyword_index"),
+            range_key=schema.get("range_index"),
+            text_key=schema.get("text_index"),
+            stemming=schema.get("stemming", False),
+            columnar_key=schema.get("columnar"),
+        )
+        if options := schema.get("auto_index"):
+            from .adaptive import AutoIndexer
+
+            table.auto_index = AutoIndexer(**(options if isinstance(options, dict) else {}))
+        return table
+
+    def _restore_index(
+        self,
+        table: Table,
+        schema: Dict[str, Any],
+        filename: str,
+        snapshot: Union[bool, str] = False,
+    ) -> bool:
+        """
+        Restore indexes from the snapshot if enabled and valid, otherwise
+        create empty ones.
+        :return: whether the indexes still need to be built
+        """
+        snapshot_path = os.path.join(self.store_dir, table.name + ".snapshot")
+        state = None
+        if snapshot:
+            state = load_snapshot(snapshot_path, filename, schema, snapshot == "checksum")
+            self.snapshot_status[table.name] = "hit" if state else "rebuilt"
+        else:
+            self.snapshot_status.pop(table.name, None)
+
+        if state is None:
+            table.create_index()
+            return True
+        table.restore_index_state(state)
+        return False
+
+    def _finish_table(
+        self,
+        table: Table,
+        schema: Dict[str, Any],
+        filename: str,
+        snapshot: Union[bool, str] = False,
+    ) -> None:
+        """
+        Post-process freshly built indexes
+        """
+        if schema.get("compact_index"):
+            table.compact_index()
+        if snapshot:
+            snapshot_path = os.path.join(self.store_dir, table.name + ".snapshot")
+            save_snapshot(
+                snapshot_path, table.index_state(), filename, schema, snapshot == "checksum"
+            )
+
+    def _open_store(
+        self, table_name: str, filename: str, decoder: Optional[Decoder] = None
+    ) -> Tuple[str, str]:
+        """
+        Write the mmap store of a table unless it is newer than the source
+        :param decoder: decoder of the source file, stdlib json when None
+        :return: paths of the data and offsets files
+        """
+        data_path = os.path.join(self.store_dir, table_name + ".jsonl")
+        offsets_path = os.path.join(self.store_dir, table_name + ".offsets")
+        if not is_fresh(filename, data_path, offsets_path):
+            logger.info(f"Writing {table_name} store to {data_path}")
+            with open(filename, "rb") as f:
+                writer = StoreWriter(data_path, offsets_path)
+                for record in (decoder or Decoder("json")).iter_file(f):
+                    writer.append(record)
+            writer.close()
+        return data_path, offsets_path
+
+    def _load_table(
+        self,
+        table_name: str,
+        schema: Dict[str, Any],
+        filename: str,
+        storage: Optional[str] = None,
+        snapshot: Union[bool, str] = False,
+    ) -> Table:
+        """
+        Stream records from the resource file and build indexes in the same pass
+        """
+        table = self._new_table(table_name, schema)
+        decoder = Decoder.of(schema)
+        build = self._restore_index(table, schema, filename, snapshot)
+        indexing = 0.0
+
+        def index(i: int, record: Dict[Any, Any]) -> None:
+            nonlocal indexing
+            start = time.perf_counter()
+            table.index_record(i, record)
+            indexing += time.perf_counter() - start
+
+        if storage == "mmap":
+            store = self._open_store(table_name, filename, Decoder.of(schema, typed=False))
+            table.records = MmapRecords(*store, decoder)
+            if build:
+                for i, record in enumerate(table.records):
+                    index(i, record)
+        elif storage == "lazy":
+            # byte offsets are only known to the streaming decoder
+            records = FileRecords(filename, decoder)
+            with open(filename, "rb") as f:
+                for i, (offset, length, record) in enumerate(iter_records(f)):
+                    records.track(offset, length)
+                    if build:
+                        index(i, record)
+            table.records = records
+        else:
+            records = []
+            with open(filename, "rb") as f:
+                for i, record in enumerate(decoder.iter_file(f)):
+                    records.append(record)
+                    if build:
+                        index(i, record)
+            table.records = records
+
+        if build:
+            start = time.perf_counter()
+            self._finish_table(table, schema, filename, snapshot)
+            self.index_timings[table_name] = indexing + time.perf_counter() - start
+        else:
+            self.index_timings.pop(table_name, None)
+        return table
 
     def fetch_collection(self, entity: str) -> Table:
         table = self.collections.get(entity)
@@ -215,26 +1080,308 @@ class Database:
         else:
             raise TableNotExistsException
 
-    def search(self, entity: str, field: str, value: str) -> List:
-        logger.debug(f"searching {entity}: {field}={value}")
-
-        table = self.fetch_collection(entity)
-
-        res = table.search(field, value)
-        if foreign_keys := table.foreign_key:
+    def compile_join_plan(
+        self, table: Table, collections: Optional[Dict[str, Table]] = None
+    ) -> List[ForeignKeys]:
+        """
+        Resolve the external_fields of a table into a join plan. Join columns
+        of foreign tables which are not indexed get an index built.
+        :param collections: tables to join with, the loaded ones when None
+        """
+        collections = self.collections if collections is None else collections
+        plan = []
+        for foreign_key in table.foreign_key or []:
+            foreign_table = collections.get(foreign_key.get("external_table_name"))
+            if foreign_table is None:
+                raise TableNotExistsException
+            external_key = foreign_key.get("external_table_key")
+            if external_key not in foreign_table.indexes:
+                logger.warning(
+                    f"Join column {foreign_table.name}.{external_key} is not indexed, indexing it"
+                )
+                idx = ScanIndex(external_key)
+                for i, record in foreign_table.live():
+                    idx.add(record.get(external_key), i)
+                foreign_table.indexes[external_key] = idx
 
-            foreign_key_list = []
-            for foreign_key in foreign_keys:
-                query = ForeignKeys(
+            plan.append(
+                ForeignKeys(
                     foreign_key.get("local_table_key"),
-                    foreign_key.get("external_table_key"),
-                    self.fetch_collection(foreign_key.get("external_table_name")),
+                    external_key,
+                    foreign_table,
                     foreign_key.get("required_fields"),
                 )
+            )
+        return plan
+
+    def compile_join_plans(self) -> None:
+        self.join_plans = self._compile_join_plans(self.collections)
+
+    def _compile_join_plans(
+        self, collections: Dict[str, Table]
+    ) -> Dict[str, List[ForeignKeys]]:
+        plans = {}
+        for name, table in collections.items():
+            try:
+                plans[name] = self.compile_join_plan(table, collections)
+            except TableNotExistsException:
+                logger.warning(f"Cannot plan joins of {name}, a foreign table is missing")
+        return plans
+
+    def drop(self) -> None:
+        """
+        Drop all tables along with their cached results
+        """
+        self.collections = {}
+        self.join_plans = {}
+        if self.cache is not None:
+            self.cache.clear()
+
+    def insert(self, entity: str, record: Dict[Any, Any]) -> int:
+        row = self.fetch_collection(entity).insert(record)
+        self._changed()
+        return row
+
+    def upsert(self, entity: str, record: Dict[Any, Any]) -> int:
+        row = self.fetch_collection(entity).upsert(record)
+        self._changed()
+        return row
+
+    def delete(self, entity: str, key: Any) -> int:
+        deleted = self.fetch_collection(entity).delete(key)
+        self._changed()
+        return deleted
 
-                foreign_key_list.append(query)
+    def _changed(self) -> None:
+        # cached results may hold records of any table through joins
+        if self.cache is not None:
+            self.cache.clear()
 
-            enriched = table.join(res, foreign_key_list)
-            return enriched
+    def apply(self, change: Dict[str, Any]) -> None:
+        """
+        Apply a change of a changelog e.g.
+        {"op": "upsert", "table": "tickets", "record": {"_id": "436b...", ...}}
+        {"op": "delete", "table": "tickets", "key": "436b..."}
+        """
+        if not isinstance(change, dict):
+            raise InvalidChangeException(f"expecting an object, got {change!r}")
+        op, entity = change.get("op"), change.get("table")
+        if not isinstance(entity, str):
+            raise InvalidChangeException(f"expecting a table name, got {entity!r}")
+        if op in ("insert", "upsert"):
+            if not isinstance(change.get("record"), dict):
+                raise InvalidChangeException(f"{op} without a record")
+            getattr(self, op)(entity, change["record"])
+        elif op == "delete":
+            if "key" not in change:
+                raise InvalidChangeException("delete without a key")
+            self.delete(entity, change["key"])
         else:
-            return res
+            raise InvalidChangeException(f"unknown op {op!r}")
+
+    def search(
+        self, entity: str, field: str, value: str, fields: Optional[List[str]] = None
+    ) -> List:
+        """
+        :param fields: fields of the results, foreign tables included, all of
+            them when None. Joins to foreign tables left out are skipped.
+        """
+        logger.debug("searching %s: %s=%s", entity, field, value)
+
+        table = self.fetch_collection(entity)
+        timer = self.metrics.timer(entity, table.metric_field(field))
+        with timer:
+            res = None
+            if self.cache is not None:
+                key = self._cache_key(entity, field, value, fields)
+                if (cached := self.cache.get(key)) is not None:
+                    res = list(cached)
+
+            if res is None:
+                res = self._join(table, table.search(field, value), fields)
+                if self.cache is not None:
+                    # cached as a tuple, every caller gets a list of its own
+                    self.cache.put(key, tuple(res))
+        timer.finish(len(res))
+        return res
+
+    def iter_search(
+        self,
+        entity: str,
+        field: str,
+        value: str,
+        limit: Optional[int] = None,
+        offset: int = 0,
+        fields: Optional[List[str]] = None,
+    ) -> Iterator[Any]:
+        """
+        Stream the joined results of a search. Offset and limit are applied
+        before the join, and the scan stops once limit records are found.
+        """
+        key = self._cache_key(entity, field, value, fields)
+        end = None if limit is None else offset + limit
+        table = self.fetch_collection(entity)
+        timer = self.metrics.timer(entity, table.metric_field(field))
+        with timer:
+            if self.cache is not None:
+                if (cached := self.cache.get(key)) is not None:
+                    return self.metrics.timed(timer, iter(cached[offset:end]))
+
+            res = self._iter_join(
+                table, islice(table.iter_search(field, value), offset, end), fields
+            )
+        if self.cache is not None and end is None and not offset:
+            res = self._cache_when_exhausted(key, res)
+        return self.metrics.timed(timer, res)
+
+    @staticmethod
+    def _cache_key(
+        entity: str, field: str, value: str, fields: Optional[List[str]] = None
+    ) -> Tuple:
+        if fields is None:
+            return entity, field, str(value)
+        return entity, field, str(value), tuple(fields)
+
+    def _cache_when_exhausted(self, key: Tuple, res: Iterator) -> Iterator:
+        """
+        Pass results through, caching them once the caller consumed them all
+        """
+        seen = []
+        for record in res:
+            seen.append(record)
+            yield record
+        self.cache.put(key, tuple(seen))
+
+    def _join(self, table: Table, res: List, fields: Optional[List[str]] = None) -> List:
+        return table.join(res, self._join_plan(table, fields), fields)
+
+    def _iter_join(
+        self, table: Table, res: Iterable, fields: Optional[List[str]] = None
+    ) -> Iterator:
+        plan = self._join_plan(table, fields)
+        if not plan and fields is None:
+            return iter(res)
+        return table.iter_join(res, plan, fields)
+
+    def _join_plan(
+        self, table: Table, fields: Optional[List[str]] = None
+    ) -> List[ForeignKeys]:
+        """
+        Join plan of a table, restricted to the foreign tables among fields
+        """
+        if not table.foreign_key:
+            return []
+        plan = self.join_plans.get(table.name)
+        if plan is None:
+            plan = self.compile_join_plan(table)
+        if fields is not None:
+            plan = [fk for fk in plan if fk.foreign_table.name in fields]
+        return plan
+
+    def query(self, text: str, fields: Optional[List[str]] = None) -> List:
+        """
+        Run a compound query e.g.
+        search tickets status=pending and priority=high or organization_id=116
+        """
+        return list(self.iter_query(text, fields))
+
+    def iter_query(self, text: str, fields: Optional[List[str]] = None) -> Iterator[Any]:
+        """
+        Stream the joined results of a compound query
+        """
+        from .query import parse, plan
+
+        parsed = parse(text)
+        logger.debug("querying %s", parsed)
+        timer = self.metrics.timer(parsed.entity, "query")
+        with timer:
+            table = self.fetch_collection(parsed.entity)
+            rows = plan(table, parsed).execute(table)
+        records = (record for i in rows if (record := table.records[i]) is not None)
+        res = self._iter_join(table, records, fields)
+        return self.metrics.timed(timer, res)
+
+    def find(
+        self,
+        entity: str,
+        text: str,
+        k: Optional[int] = 10,
+        fields: Optional[List[str]] = None,
+    ) -> List:
+        """
+        Top k records of a table ranked by relevance to the words of text e.g.
+        find tickets "north korea" catastrophe
+        """
+        logger.debug("finding %s: %s", entity, text)
+
+        timer = self.metrics.timer(entity, "find")
+        with timer:
+            res = None
+            if self.cache is not None:
+                key = (entity, "find", text, k, None if fields is None else tuple(fields))
+                if (cached := self.cache.get(key)) is not None:
+                    res = list(cached)
+
+            if res is None:
+                table = self.fetch_collection(entity)
+                ranked = table.find(text, k)
+                records = [table.records[i] for i, _ in ranked]
+                res = self._join(table, [r for r in records if r is not None], fields)
+                if self.cache is not None:
+                    self.cache.put(key, tuple(res))
+        timer.finish(len(res))
+        return res
+
+    def explain(self, text: str) -> str:
+        """
+        Describe how a compound query would be executed
+        """
+        from .query import parse, plan
+
+        parsed = parse(text)
+        return plan(self.fetch_collection(parsed.entity), parsed).explain()
+
+
+def _load_table_task(
+    context: Tuple[str, str], job: Tuple
+) -> Tuple[Table, Optional[str], Optional[float]]:
+    database = Database(*context)
+    table = database._load_table(*job)
+    return (
+        table,
+        database.snapshot_status.get(table.name),
+        database.index_timings.get(table.name),
+    )
+
+
+def _store_task(
+    context: Tuple[str, str], table_name: str, filename: str, decoder: Decoder
+) -> Tuple[str, str]:
+    return Database(*context)._open_store(table_name, filename, decoder)
+
+
+def _index_task(
+    table_name: str,
+    schema: Dict[str, Any],
+    store: Tuple[str, str],
+    lo: int,
+    hi: int,
+) -> Tuple[int, Dict[str, Any]]:
+    """
+    Index records [lo, hi) of a store, row ids stay global
+    """
+    table = Table(
+        name=table_name,
+        primary_key=schema.get("primary_key"),
+        index_key=schema.get("index"),
+        keyword_key=schema.get("keyword_index"),
+        range_key=schema.get("range_index"),
+        text_key=schema.get("text_index"),
+        stemming=schema.get("stemming", False),
+        columnar_key=schema.get("columnar"),
+    )
+    table.create_index()
+    records = MmapRecords(*store, Decoder.of(schema, typed=False))
+    for i in range(lo, min(hi, len(records))):
+        table.index_record(i, records[i])
+    return lo, table.index_state()
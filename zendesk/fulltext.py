@@ -0,0 +1,288 @@
+from __future__ import annotations
+import heapq
+import math
+import re
+import shlex
+from array import array
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+TOKEN = re.compile(r"\w+")
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+
+def stem(token: str) -> str:
+    """
+    Light English suffix stripping, so that "crashes", "crashed" and
+    "crashing" share the key "crash", and "closes", "closed" and "close"
+    share "clos"
+    """
+    if len(token) <= 4 or token.isdigit():
+        return token
+    if token.endswith("ies"):
+        return token[:-3] + "y"
+    if token.endswith(("sses", "ches", "shes", "xes", "zes")):
+        token = token[:-2]
+    else:
+        for suffix in ("ingly", "edly", "ing", "ed", "ly"):
+            if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+                token = token[: -len(suffix)]
+                break
+        else:
+            if token.endswith("s") and not token.endswith(("ss", "us", "is")):
+                token = token[:-1]
+    if token.endswith("e") and len(token) > 4:
+        token = token[:-1]
+    return token
+
+
+def tokenize(text: Any, stemming: bool = False) -> List[str]:
+    """
+    Case-folded word tokens of a value, list values are tokenized element by
+    element
+    """
+    if isinstance(text, list):
+        return [token for ele in text for token in tokenize(ele, stemming)]
+    if text is None or isinstance(text, dict):
+        return []
+    tokens = TOKEN.findall(str(text).casefold())
+    return [stem(token) for token in tokens] if stemming else tokens
+
+
+def parse_terms(text: str) -> List[List[str]]:
+    """
+    Split a find query into phrases, quoted words form a single phrase and
+    every other word is a phrase of its own
+
+    Example
+    'korea "north korea" crash' -> [["korea"], ["north", "korea"], ["crash"]]
+    """
+    try:
+        words = shlex.split(text)
+    except ValueError:
+        words = text.split()
+    return [phrase for word in words if (phrase := TOKEN.findall(word.casefold()))]
+
+
+class TermPostings:
+    """
+    Postings of a term: the rows containing it, in row order, and the
+    positions of the term in each of them laid out back to back
+
+    Example
+    rows: [0, 4]  offsets: [0, 2]  positions: [3, 9, 1]
+    the term is at positions 3 and 9 of row 0 and at position 1 of row 4
+    """
+
+    __slots__ = ("rows", "offsets", "positions")
+
+    def __init__(self):
+        self.rows = array("I")
+        self.offsets = array("I")
+        self.positions = array("I")
+
+    def __getstate__(self):
+        return self.rows, self.offsets, self.positions
+
+    def __setstate__(self, state):
+        self.rows, self.offsets, self.positions = state
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def append(self, i: int, positions: Iterable[int]) -> None:
+        self.rows.append(i)
+        self.offsets.append(len(self.positions))
+        self.positions.extend(positions)
+
+    def extend(self, other: TermPostings) -> None:
+        base = len(self.positions)
+        self.rows.extend(other.rows)
+        self.offsets.extend(offset + base for offset in other.offsets)
+        self.positions.extend(other.positions)
+
+    def remove(self, i: int) -> None:
+        n = self.find(i)
+        if n < 0:
+            return
+        start, end = self.offsets[n], self.end(n)
+        del self.positions[start:end]
+        del self.rows[n]
+        del self.offsets[n]
+        self.offsets[n:] = array("I", (offset - (end - start) for offset in self.offsets[n:]))
+
+    def end(self, n: int) -> int:
+        return self.offsets[n + 1] if n + 1 < len(self.offsets) else len(self.positions)
+
+    def find(self, i: int) -> int:
+        n = bisect_left(self.rows, i)
+        return n if n < len(self.rows) and self.rows[n] == i else -1
+
+    def at(self, n: int) -> Sequence[int]:
+        """
+        Positions of the term in the n-th row of the postings
+        """
+        return self.positions[self.offsets[n] : self.end(n)]
+
+
+@dataclass
+class TextIndex:
+    """
+    Positional inverted index over a text field, ranked with BM25
+
+    Values are tokenized into case-folded words, optionally stemmed. Every
+    term keeps the rows containing it along with its positions, so phrases
+    are matched by checking that the words follow each other.
+
+    Example
+    data: [{"subject": "A Catastrophe in Korea"}, {"subject": "Korea"}]
+    terms: {"a": rows [0], "catastrophe": rows [0], "in": rows [0],
+            "korea": rows [0, 1] at positions [3] and [0]}
+    lengths: [4, 1]
+    """
+
+    name: str
+    stemming: bool = False
+    terms: Dict[str, TermPostings] = field(default_factory=dict)
+    lengths: array = field(default_factory=lambda: array("I"))
+    total_length: int = 0
+    documents: int = 0
+
+    def add(self, value: Any, i: int) -> None:
+        tokens = tokenize(value, self.stemming)
+        if len(self.lengths) <= i:
+            self.lengths.extend([0] * (i + 1 - len(self.lengths)))
+        if not tokens:
+            return
+
+        self.lengths[i] = len(tokens)
+        self.total_length += len(tokens)
+        self.documents += 1
+        positions: Dict[str, List[int]] = {}
+        for position, token in enumerate(tokens):
+            positions.setdefault(token, []).append(position)
+        for token, at in positions.items():
+            postings = self.terms.get(token)
+            if postings is None:
+                postings = self.terms[token] = TermPostings()
+            postings.append(i, at)
+
+    def remove(self, value: Any, i: int) -> None:
+        """
+        Drop row i, which must have been added with that value
+        """
+        tokens = tokenize(value, self.stemming)
+        if not tokens:
+            return
+        self.lengths[i] = 0
+        self.total_length -= len(tokens)
+        self.documents -= 1
+        for token in dict.fromkeys(tokens):
+            postings = self.terms.get(token)
+            if postings is not None:
+                postings.remove(i)
+                if not len(postings):
+                    del self.terms[token]
+
+    def merge(self, other: TextIndex) -> None:
+        """
+        Append an index built over later records
+        """
+        if len(self.lengths) < len(other.lengths):
+            self.lengths.extend([0] * (len(other.lengths) - len(self.lengths)))
+        for i, length in enumerate(other.lengths):
+            if length:
+                self.lengths[i] = length
+        self.total_length += other.total_length
+        self.documents += other.documents
+        for token, postings in other.terms.items():
+            if token in self.terms:
+                self.terms[token].extend(postings)
+            else:
+                self.terms[token] = postings
+
+    def _key(self, word: str) -> str:
+        return stem(word) if self.stemming else word
+
+    def rows(self, phrase: List[str]) -> Sequence[int]:
+        """
+        Rows containing every word of the phrase, in order and next to each other
+        """
+        postings = [self.terms.get(self._key(word)) for word in phrase]
+        if any(p is None for p in postings):
+            return []
+        if len(phrase) == 1:
+            return postings[0].rows
+
+        rows = set(postings[0].rows).intersection(*(p.rows for p in postings[1:]))
+        res = []
+        for i in sorted(rows):
+            starts = set(postings[0].at(postings[0].find(i)))
+            for offset, p in enumerate(postings[1:], 1):
+                starts &= {pos - offset for pos in p.at(p.find(i))}
+                if not starts:
+                    break
+            if starts:
+                res.append(i)
+        return res
+
+    def accumulate(
+        self, words: Iterable[str], candidates: Set[int], scores: Dict[int, float]
+    ) -> None:
+        """
+        Add the BM25 scores of the candidate rows for the words to scores,
+        term at a time so that every posting list is walked once
+        """
+        if not self.documents:
+            return
+        average = self.total_length / self.documents
+        lengths = self.lengths
+        for word in words:
+            postings = self.terms.get(self._key(word))
+            if postings is None:
+                continue
+            df = len(postings)
+            idf = math.log(1 + (self.documents - df + 0.5) / (df + 0.5))
+            offsets = postings.offsets
+            ends = offsets[1:]
+            ends.append(len(postings.positions))
+            for i, start, end in zip(postings.rows, offsets, ends):
+                if i in candidates:
+                    tf = end - start
+                    norm = K1 * (1 - B + B * lengths[i] / average)
+                    scores[i] = scores.get(i, 0.0) + idf * tf * (K1 + 1) / (tf + norm)
+
+
+def search(
+    indexes: Sequence[TextIndex], text: str, k: Optional[int] = 10
+) -> List[Tuple[int, float]]:
+    """
+    Rows matching every phrase of the query in any of the indexed fields,
+    ranked by the sum of their BM25 scores over the fields
+    :param k: number of top rows to return, all of them when None
+    :return: (row, score) pairs, best first
+    """
+    phrases = parse_terms(text)
+    if not phrases or not indexes:
+        return []
+
+    candidates: Optional[Set[int]] = None
+    for phrase in phrases:
+        found = set().union(*(idx.rows(phrase) for idx in indexes))
+        candidates = found if candidates is None else candidates & found
+        if not candidates:
+            return []
+
+    words = dict.fromkeys(word for phrase in phrases for word in phrase)
+    scores: Dict[int, float] = {}
+    for idx in indexes:
+        idx.accumulate(words, candidates, scores)
+
+    ranked = scores.items()
+    if k is None:
+        return sorted(ranked, key=lambda x: (-x[1], x[0]))
+    return heapq.nsmallest(k, ranked, key=lambda x: (-x[1], x[0]))
@@ -0,0 +1,234 @@
+import cProfile
+import io
+import json
+import pstats
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict, deque
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+# upper bounds of the latency buckets in seconds, doubling from 50us to ~6.5s
+BUCKETS = tuple(5e-5 * 2 ** k for k in range(18))
+
+# label of the searches by a field without an index, fields are sent by
+# clients and would otherwise grow the metrics without bound
+UNINDEXED = "(unindexed)"
+
+
+class Histogram:
+    """
+    Latency histogram with fixed, exponentially growing buckets
+
+    counts[n] is the number of observations <= BUCKETS[n] and above the
+    previous bound, the last count holds the ones above every bound.
+    """
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, q: float) -> float:
+        """
+        Upper bound of the bucket holding the q-th quantile, capped by the max
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "mean_ms": self.total / self.count * 1000 if self.count else 0.0,
+            "p50_ms": self.percentile(0.5) * 1000,
+            "p95_ms": self.percentile(0.95) * 1000,
+            "p99_ms": self.percentile(0.99) * 1000,
+            "max_ms": self.max * 1000,
+            "buckets": {
+                f"{bound * 1000:g}": count
+                for bound, count in zip(BUCKETS, self.counts)
+                if count
+            },
+            "overflow": self.counts[-1],
+        }
+
+
+class Timer:
+    """
+    Time spent answering one query, accumulated over every `with` block so
+    that a streamed result is timed only while it is being produced
+    """
+
+    def __init__(self, metrics: "Metrics", entity: str, field: str):
+        self.metrics = metrics
+        self.entity = entity
+        self.field = field
+        self.elapsed = 0.0
+        self.profiler = cProfile.Profile() if metrics.profile_threshold is not None else None
+        self._start = 0.0
+
+    def __enter__(self) -> "Timer":
+        if self.profiler is not None:
+            self.profiler.enable()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.elapsed += time.perf_counter() - self._start
+        if self.profiler is not None:
+            self.profiler.disable()
+
+    def finish(self, rows: int) -> None:
+        self.metrics.observe(self, rows)
+
+
+class Metrics:
+    """
+    Counters of the query hot path, see stats for what is collected
+
+    :param profile_threshold: profile every query with cProfile and keep the
+        statistics of the ones slower than that many seconds, None disables it
+    :param profile_top: functions kept per profile, by cumulative time
+    :param profile_keep: slow query profiles kept, the oldest are dropped
+    """
+
+    def __init__(
+        self,
+        profile_threshold: Optional[float] = None,
+        profile_top: int = 20,
+        profile_keep: int = 10,
+    ):
+        self.profile_threshold = profile_threshold
+        self.profile_top = profile_top
+        self.latency: Dict[Tuple[str, str], Histogram] = defaultdict(Histogram)
+        # (entity, field) -> [index hits, index misses, rows scanned, rows returned]
+        self.counters: Dict[Tuple[str, str], List[int]] = defaultdict(lambda: [0, 0, 0, 0])
+        # (entity, foreign table) -> [records, foreign rows, max foreign rows of a record]
+        self.joins: Dict[Tuple[str, str], List[int]] = defaultdict(lambda: [0, 0, 0])
+        # table -> {"load_s": ..., "index_s": ...}
+        self.tables: Dict[str, Dict[str, float]] = defaultdict(dict)
+        self.profiles: Deque[Dict[str, Any]] = deque(maxlen=profile_keep)
+        self._lock = threading.Lock()
+
+    def timer(self, entity: str, field: str) -> Timer:
+        return Timer(self, entity, field)
+
+    def timed(self, timer: Timer, res: Iterator[Any]) -> Iterator[Any]:
+        """
+        Pass results through, timing the production of every one of them.
+        The query is recorded once the caller is done with the results.
+        """
+        rows = 0
+        try:
+            while True:
+                with timer:
+                    try:
+                        record = next(res)
+                    except StopIteration:
+                        return
+                rows += 1
+                yield record
+        finally:
+            timer.finish(rows)
+
+    def observe(self, timer: Timer, rows: int) -> None:
+        key = (timer.entity, timer.field)
+        with self._lock:
+            self.latency[key].observe(timer.elapsed)
+            self.counters[key][3] += rows
+            if timer.profiler is not None and timer.elapsed >= self.profile_threshold:
+                out = io.StringIO()
+                stats = pstats.Stats(timer.profiler, stream=out)
+                stats.sort_stats("cumulative").print_stats(self.profile_top)
+                self.profiles.append(
+                    {
+                        "query": f"{timer.entity}.{timer.field}",
+                        "ms": timer.elapsed * 1000,
+                        "profile": out.getvalue(),
+                    }
+                )
+
+    def scanned(self, entity: str, field: str, rows: int, index: bool) -> None:
+        """
+        Count an access to a table through an index or a full scan, and the
+        rows it read
+        """
+        with self._lock:
+            counters = self.counters[(entity, field)]
+            counters[0 if index else 1] += 1
+            counters[2] += rows
+
+    def joined(self, entity: str, foreign: str, records: int, rows: int, most: int) -> None:
+        """
+        Count the foreign rows attached to a batch of joined records
+        """
+        with self._lock:
+            counters = self.joins[(entity, foreign)]
+            counters[0] += records
+            counters[1] += rows
+            counters[2] = max(counters[2], most)
+
+    def loaded(self, table: str, seconds: float, index_seconds: Optional[float] = None) -> None:
+        with self._lock:
+            self.tables[table]["load_s"] = seconds
+            if index_seconds is not None:
+                self.tables[table]["index_s"] = index_seconds
+
+    def reset(self) -> None:
+        with self._lock:
+            self.latency.clear()
+            self.counters.clear()
+            self.joins.clear()
+            self.profiles.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Everything collected, as plain JSON types
+        """
+        with self._lock:
+            queries = {}
+            for key in sorted(set(self.latency) | set(self.counters)):
+                hits, misses, scanned, returned = self.counters.get(key, [0, 0, 0, 0])
+                latency = self.latency[key].stats() if key in self.latency else None
+                queries[".".join(key)] = {
+                    "latency": latency,
+                    "index_hits": hits,
+                    "index_misses": misses,
+                    "rows_scanned": scanned,
+                    "rows_returned": returned,
+                }
+            joins = {
+                f"{entity}->{foreign}": {
+                    "records": records,
+                    "foreign_rows": rows,
+                    "fanout": rows / records if records else 0.0,
+                    "max_fanout": most,
+                }
+                for (entity, foreign), (records, rows, most) in sorted(self.joins.items())
+            }
+            return {
+                "queries": queries,
+                "joins": joins,
+                "tables": {k: dict(v) for k, v in sorted(self.tables.items())},
+                "profiles": list(self.profiles),
+            }
+
+    def to_json(self, indent: Optional[int] = 2) -> str:
+        return json.dumps(self.stats(), indent=indent)
@@ -1,5 +1,9 @@
 from typing import List
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+
+# low-cardinality fields, typed records hold a single shared copy of every
+# distinct value (or list element) of them
+INTERNED = {"interned": True}
 
 
 @dataclass
@@ -10,9 +14,9 @@ class Organizations:
     name: str
     domain_names: List[str]
     created_at: str
-    details: str
-    shared_tickes: str
-    tags: List[str]
+    details: str = field(metadata=INTERNED)
+    shared_tickets: bool
+    tags: List[str] = field(metadata=INTERNED)
 
 
 @dataclass
@@ -21,18 +25,18 @@ class Tickets:
     url: str
     external_id: str
     created_at: str
-    type: str
+    type: str = field(metadata=INTERNED)
     subject: str
     description: str
-    priority: str
-    status: str
-    submitter_id: str
+    priority: str = field(metadata=INTERNED)
+    status: str = field(metadata=INTERNED)
+    submitter_id: int
     assignee_id: int
-    organization_id: str
-    tags: List[str]
-    has_incidents: str
+    organization_id: int
+    tags: List[str] = field(metadata=INTERNED)
+    has_incidents: bool
     due_at: str
-    via: str
+    via: str = field(metadata=INTERNED)
 
 
 @dataclass
@@ -40,18 +44,19 @@ class Users:
     _id: int
     url: str
     external_id: str
+    name: str
     alias: str
     created_at: str
     active: bool
     verified: bool
     shared: bool
-    locale: str
-    timezone: str
+    locale: str = field(metadata=INTERNED)
+    timezone: str = field(metadata=INTERNED)
     last_login_at: str
     email: str
     phone: str
-    signature: str
-    organization_id: str
-    tags: List[str]
+    signature: str = field(metadata=INTERNED)
+    organization_id: int
+    tags: List[str] = field(metadata=INTERNED)
     suspended: bool
-    role: bool
+    role: str = field(metadata=INTERNED)
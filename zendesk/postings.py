@@ -0,0 +1,174 @@
+from array import array
+from bisect import bisect_left, insort
+from collections import defaultdict
+from typing import Dict, Iterator, List, Mapping, Optional, Sequence, Set
+
+# changes kept next to the arrays before they are laid out again, at least
+MIN_CHANGES = 1024
+
+
+class PostingMap(Mapping):
+    """
+    Array backed replacement of an index's dict of posting lists.
+
+    Keys are kept sorted and the postings of every key are laid out back to
+    back in a single array (CSR layout), so a posting costs 4 bytes instead of
+    a pointer plus an int object, and a key costs no list of its own.
+
+    Rows added or removed afterwards are kept in a small delta merged on
+    lookup, and the arrays are laid out again once the delta grows past a
+    sixteenth of the postings.
+
+    Example
+    references: {"52": [1, 2], "71": [0]}
+    keys: ["52", "71"]  offsets: [0, 2, 3]  postings: [1, 2, 0]
+    """
+
+    def __init__(self, references: Mapping[str, Sequence[int]]):
+        self.keys_ = sorted(references)
+        self.offsets = array("Q", [0])
+        self.postings = array("I")
+        for key in self.keys_:
+            self.postings.extend(references[key])
+            self.offsets.append(len(self.postings))
+        # key -> rows added, or rows of the arrays removed, since the layout
+        self.added: Dict[str, List[int]] = {}
+        self.removed: Dict[str, Set[int]] = {}
+        self.changes = 0
+
+    def _find(self, key: str) -> int:
+        i = bisect_left(self.keys_, key)
+        if i < len(self.keys_) and self.keys_[i] == key:
+            return i
+        return -1
+
+    def _frozen(self, key: str) -> Optional[array]:
+        i = self._find(key)
+        if i < 0:
+            return None
+        return self.postings[self.offsets[i] : self.offsets[i + 1]]
+
+    def __getitem__(self, key: str) -> array:
+        rows = self.get(key)
+        if rows is None:
+            raise KeyError(key)
+        return rows
+
+    def get(self, key: str, default: Optional[array] = None) -> Optional[array]:
+        rows = self._frozen(key)
+        if self.changes and (key in self.added or key in self.removed):
+            removed = self.removed.get(key, ())
+            rows = array("I", [row for row in rows or () if row not in removed])
+            for row in self.added.get(key, ()):
+                # added rows are usually new rows, past every frozen one
+                if rows and row < rows[-1]:
+                    rows.insert(bisect_left(rows, row), row)
+                else:
+                    rows.append(row)
+            if not rows:
+                return default
+        return default if rows is None else rows
+
+    def __contains__(self, key) -> bool:
+        return self.get(key) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        if not self.changes:
+            return iter(self.keys_)
+        return (key for key in sorted(set(self.keys_) | set(self.added)) if key in self)
+
+    def __len__(self) -> int:
+        if not self.changes:
+            return len(self.keys_)
+        return sum(1 for _ in self)
+
+    def add(self, key: str, row: int) -> None:
+        removed = self.removed.get(key)
+        if removed is not None and row in removed:
+            removed.discard(row)
+            if not removed:
+                del self.removed[key]
+        else:
+            insort(self.added.setdefault(key, []), row)
+        self._changed()
+
+    def remove(self, key: str, row: int) -> None:
+        added = self.added.get(key)
+        if added is not None and row in added:
+            added.remove(row)
+            if not added:
+                del self.added[key]
+        elif (rows := self._frozen(key)) is not None and row in rows:
+            self.removed.setdefault(key, set()).add(row)
+        else:
+            return
+        self._changed()
+
+    def _changed(self) -> None:
+        self.changes += 1
+        if self.changes > max(MIN_CHANGES, len(self.postings) // 16):
+            self.compact()
+
+    def compact(self) -> None:
+        """
+        Lay the arrays out again with the delta merged in
+        """
+        if self.changes:
+            self.__init__({key: self[key] for key in self})
+
+    def thaw(self) -> Dict[str, List[int]]:
+        """
+        Convert back to a mutable dict of posting lists
+        """
+        references: Dict[str, List[int]] = defaultdict(list)
+        for key in self:
+            references[key] = self[key].tolist()
+        return references
+
+
+def intersect(a: Sequence[int], b: Sequence[int]) -> List[int]:
+    """
+    Intersect two sorted posting lists. The shorter list drives the merge and
+    the longer one is searched by galloping, so the cost is
+    O(len(short) * log(len(long)))
+    """
+    if len(a) > len(b):
+        a, b = b, a
+    res = []
+    lo = 0
+    for x in a:
+        # gallop to find a window of b which may hold x, then bisect in it
+        step = 1
+        hi = lo
+        while hi < len(b) and b[hi] < x:
+            lo = hi
+            hi += step
+            step *= 2
+        lo = bisect_left(b, x, lo, min(hi + 1, len(b)))
+        if lo == len(b):
+            break
+        if b[lo] == x:
+            res.append(x)
+    return res
+
+
+def union(a: Sequence[int], b: Sequence[int]) -> List[int]:
+    """
+    Merge two sorted posting lists without duplicates
+    """
+    res = []
+    i = j = 0
+    while i < len(a) and j < len(b):
+        if a[i] < b[j]:
+            res.append(a[i])
+            i += 1
+        elif a[i] > b[j]:
+            res.append(b[j])
+            j += 1
+        else:
+            res.append(a[i])
+            i += 1
+            j += 1
+    res.extend(a[i:])
+    res.extend(b[j:])
+    return res
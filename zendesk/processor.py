@@ -1,10 +1,15 @@
 import os
-from typing import Dict, List
+import shlex
+from itertools import islice
+from typing import Dict, Iterable, Mapping
 
 import click
 
-from .utilties import get_logger, read_yaml
-from .db import Database
+from .utilties import configure_logging, get_logger, read_yaml
+from .changelog import follow
+from .reload import watch
+from .db import ColumnNotExistsException, Database, TableNotExistsException
+from .query import QuerySyntaxException, is_compound
 from .model import Organizations, Tickets, Users
 
 logger = get_logger(__name__)
@@ -15,6 +20,9 @@ DATAMODELS = {"organization": Organizations, "ticket": Tickets, "users": Users}
 
 YAML = os.path.join(os.path.dirname(os.path.dirname(__file__)), "config.yaml")
 
+# records printed before asking whether to show more
+PAGE_SIZE = 10
+
 
 class Processor:
     """
@@ -23,6 +31,8 @@ class Processor:
 
     def __init__(self):
         self._name = "processor"
+        self.tailer = None
+        self.watcher = None
 
     def ask(self) -> None:
         """
@@ -38,17 +48,16 @@ class Processor:
         click.echo(f"Searching {field} match {value} from {entity}")
 
         try:
-            res = database.search(entity, field, value)
-            self.present(res)
+            self.present(database.iter_search(entity, field, value))
         except NameError:
             if click.confirm(
                 "Database is not connected yet, could you like to connect?"
             ):
                 self.load_db()
 
-    def present(self, results: List[Dict]) -> None:
+    def present(self, results: Iterable[Dict], page_size: int = PAGE_SIZE) -> None:
         """
-        beautify json objects
+        beautify json objects, a page at a time
         """
         print("Results:\n")
 
@@ -59,7 +68,7 @@ class Processor:
                         try:
                             if isinstance(v[0], str):
                                 print("{:<20}|{:>50}".format(k, ", ".join(v)))
-                            elif isinstance(v[0], dict):
+                            elif isinstance(v[0], Mapping):
                                 for ele in v:
                                     _present(ele)
                         except IndexError:
@@ -69,30 +78,81 @@ class Processor:
                 except TypeError:
                     pass
 
-        for result in results:
-            _present(result)
-            print()
+        it = iter(results)
+        shown = 0
+        while page := list(islice(it, page_size)):
+            for result in page:
+                _present(result)
+                print()
+            shown += len(page)
+            if len(page) < page_size or not click.confirm(
+                f"Shown {shown} results, show more?", default=True
+            ):
+                break
+        if not shown:
+            print("No matching records")
 
     def load_db(self, yaml_fpath: str = YAML):
         schema = read_yaml(yaml_fpath)
+        configure_logging(schema.get("logging"))
 
         global database
+        self.stop_background()
         database = Database()
         database.load(schema)
+        self.tailer = follow(database, schema)
+        self.watcher = watch(database, schema)
+
+    def reload_db(self, yaml_fpath: str = YAML):
+        """
+        Reload every table while the loaded ones keep answering queries
+        """
+        global database
+        try:
+            database.reload(read_yaml(yaml_fpath))
+        except NameError:
+            self.load_db(yaml_fpath)
+
+    def stop_background(self):
+        """
+        Stop tailing the changelog and watching the resource files of the
+        loaded database
+        """
+        if self.tailer is not None:
+            self.tailer.stop()
+            self.tailer = None
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
 
     def drop_db(self):
         global database
+        self.stop_background()
+        database.drop()
         del database
         click.echo("Dropped all tables!")
 
     def handle(self, query: str):
         global database
+        if is_compound(query):
+            try:
+                self.present(database.iter_query(query))
+            except QuerySyntaxException as e:
+                click.echo(f"Invalid query: {e}")
+            except TableNotExistsException:
+                click.echo("Table not found in database")
+            except NameError:
+                if click.confirm(
+                    "Database is not connected yet, could you like to connect?"
+                ):
+                    self.load_db()
+            return
+
         parsed, is_match = self.parse_query(query)
         if is_match:
             entity, field, value = parsed
             try:
-                if res := database.search(entity, field, value):
-                    self.present(res)
+                self.present(database.iter_search(entity, field, value))
             # except TableNotExistsException:
             #     click.echo(f"{entity} not found in database")
             except NameError:
@@ -101,6 +161,121 @@ class Processor:
                 ):
                     self.load_db()
 
+    def find(self, query: str) -> None:
+        """
+        Full-text search e.g. find tickets "north korea" catastrophe
+        """
+        global database
+        words = query.split(maxsplit=2)
+        if len(words) < 3:
+            click.echo("Use: find <entity> <words>")
+            return
+        _, entity, text = words
+        try:
+            self.present(database.find(entity, text))
+        except ColumnNotExistsException as e:
+            click.echo(str(e))
+        except TableNotExistsException:
+            click.echo("Table not found in database")
+        except NameError:
+            if click.confirm(
+                "Database is not connected yet, could you like to connect?"
+            ):
+                self.load_db()
+
+    def explain(self, query: str) -> None:
+        """
+        Print the plan of a search query
+        """
+        global database
+        query = query[len("explain"):].strip()
+        if not is_compound(query):
+            parsed, is_match = self.parse_query(query)
+            if not is_match:
+                return
+            query = "search {} {}={}".format(parsed[0], parsed[1], shlex.quote(parsed[2]))
+        try:
+            print(database.explain(query))
+        except QuerySyntaxException as e:
+            click.echo(f"Invalid query: {e}")
+        except TableNotExistsException:
+            click.echo("Table not found in database")
+        except NameError:
+            if click.confirm(
+                "Database is not connected yet, could you like to connect?"
+            ):
+                self.load_db()
+
+    def stats(self, query: str) -> None:
+        """
+        Print the query metrics, reset them, or export them as json e.g.
+        stats json metrics.json
+        """
+        global database
+        try:
+            metrics = database.metrics
+        except NameError:
+            if click.confirm(
+                "Database is not connected yet, could you like to connect?"
+            ):
+                self.load_db()
+            return
+
+        args = query.split()[1:]
+        if args[:1] == ["json"]:
+            if len(args) > 1:
+                with open(args[1], "w") as f:
+                    f.write(metrics.to_json())
+                click.echo(f"Metrics written to {args[1]}")
+            else:
+                print(metrics.to_json())
+            return
+        if args[:1] == ["reset"]:
+            metrics.reset()
+            click.echo("Metrics reset")
+            return
+
+        stats = metrics.stats()
+        row = "{:<24}|{:>8}|{:>10}|{:>10}|{:>8}|{:>8}|{:>10}|{:>10}"
+        print("Queries")
+        print(
+            row.format(
+                "query", "count", "p50 ms", "p95 ms", "index", "scans", "scanned", "returned"
+            )
+        )
+        for name, q in stats["queries"].items():
+            latency = q["latency"] or {"count": 0, "p50_ms": 0.0, "p95_ms": 0.0}
+            print(
+                row.format(
+                    name,
+                    latency["count"],
+                    f"{latency['p50_ms']:.2f}",
+                    f"{latency['p95_ms']:.2f}",
+                    q["index_hits"],
+                    q["index_misses"],
+                    q["rows_scanned"],
+                    q["rows_returned"],
+                )
+            )
+        if stats["joins"]:
+            print()
+            print("Joins")
+            for name, j in stats["joins"].items():
+                print(
+                    "{:<24}|{:>10} records|{:>8.2f} fan-out|{:>6} max".format(
+                        name, j["records"], j["fanout"], j["max_fanout"]
+                    )
+                )
+        print()
+        print("Tables")
+        for name, t in stats["tables"].items():
+            index = f"{t['index_s']:.2f}s" if "index_s" in t else "-"
+            print("{:<24}|{:>10} load|{:>10} index".format(name, f"{t['load_s']:.2f}s", index))
+        for profile in stats["profiles"]:
+            print()
+            print(f"Slow query {profile['query']} ({profile['ms']:.1f} ms)")
+            print(profile["profile"])
+
     def parse_query(self, query: str):
 
         import re
@@ -113,7 +288,7 @@ class Processor:
                 entity = match.groups()[1]
                 field = match.groups()[2]
                 value = match.groups()[3]
-                logger.info(f"Search {entity} {field} {value}")
+                logger.info("Search %s %s %s", entity, field, value)
                 return (entity, field, value), True
         else:
             click.echo(
@@ -122,6 +297,8 @@ class Processor:
     Use:  
         search (interactive model)
         search <entity> <field> <value>
+        search <entity> <field>=<value> [and|or <field>=<value>]...
+               [order by <field> [asc|desc]] [limit N] [offset N]
 """
             )
             return "", False
@@ -148,6 +325,12 @@ class Processor:
             global database
             for table in database.collections.keys():
                 print(table)
+            if database.cache is not None:
+                print()
+                print("Query cache")
+                print("=" * 20)
+                for k, v in database.cache.stats().items():
+                    print("{:<20}|{:>20}".format(k, str(v)))
         except NameError:
             if click.confirm(
                 "Database is not connected yet, could you like to connect?"
@@ -0,0 +1,385 @@
+from __future__ import annotations
+import re
+import shlex
+from dataclasses import dataclass, field
+from array import array
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple, Union
+
+from .db import match
+from .postings import intersect, union
+from .ranges import parse_timestamp
+
+if TYPE_CHECKING:
+    from .db import Table
+
+
+class QuerySyntaxException(Exception):
+    pass
+
+
+PREDICATE = re.compile(r"^(\w+)(>=|<=|\^=|=|>|<)(.*)$", re.S)
+RANGE_OPS = (">", ">=", "<", "<=")
+
+
+@dataclass
+class Predicate:
+    """
+    <field><op><value>, op is one of
+        =   match as in a simple search
+        ^=  the value starts with the given text, ignoring case as = does
+        > >= < <=  compare numbers and timestamps, see parse_timestamp
+    """
+
+    field: str
+    op: str
+    value: str
+
+    def __str__(self) -> str:
+        return f"{self.field} {self.op} {self.value}"
+
+    def test(self, record) -> bool:
+        value = record.get(self.field)
+        if self.op == "=":
+            return match(value, self.value)
+        if value is None or isinstance(value, (list, dict)):
+            return False
+        if self.op == "^=":
+            return str(value).lower().startswith(self.value.lower())
+
+        key, bound = parse_timestamp(value), parse_timestamp(self.value)
+        if key is None or bound is None:
+            return False
+        if self.op == ">":
+            return key > bound
+        if self.op == ">=":
+            return key >= bound
+        if self.op == "<":
+            return key < bound
+        return key <= bound
+
+
+@dataclass
+class Range:
+    """
+    Range predicates of one AND group on the same field, merged into a single
+    scan of its sorted index
+    """
+
+    field: str
+    lo: Optional[str] = None
+    hi: Optional[str] = None
+    lo_inclusive: bool = True
+    hi_inclusive: bool = True
+    # a bound is neither a number nor a timestamp, nothing can match
+    empty: bool = False
+
+    def __str__(self) -> str:
+        bounds = []
+        if self.lo is not None:
+            bounds.append(f"{self.field} {'>=' if self.lo_inclusive else '>'} {self.lo}")
+        if self.hi is not None:
+            bounds.append(f"{self.field} {'<=' if self.hi_inclusive else '<'} {self.hi}")
+        return " and ".join(bounds)
+
+    def narrow(self, predicate: Predicate) -> None:
+        """
+        Keep the tighter of the current bound and the predicate's
+        """
+        key = parse_timestamp(predicate.value)
+        if key is None:
+            self.empty = True
+        elif predicate.op in (">", ">="):
+            current = parse_timestamp(self.lo)
+            if current is None or key > current or (key == current and predicate.op == ">"):
+                self.lo, self.lo_inclusive = predicate.value, predicate.op == ">="
+        else:
+            current = parse_timestamp(self.hi)
+            if current is None or key < current or (key == current and predicate.op == "<"):
+                self.hi, self.hi_inclusive = predicate.value, predicate.op == "<="
+
+
+@dataclass
+class Query:
+    """
+    Predicates in disjunctive normal form: OR of AND groups
+
+    Example
+    search tickets status=pending and priority=high or organization_id=116
+    groups: [[status=pending, priority=high], [organization_id=116]]
+    """
+
+    entity: str
+    groups: List[List[Predicate]]
+    order_by: Optional[str] = None
+    descending: bool = False
+    limit: Optional[int] = None
+    offset: int = 0
+
+
+def is_compound(text: str) -> bool:
+    """
+    Whether a search query uses predicates, i.e. its first term after the
+    entity has an operator as in `search tickets status=pending`
+    """
+    words = text.split(maxsplit=4)
+    if words and words[0] == "explain":
+        words = words[1:]
+    return (
+        len(words) >= 3
+        and words[0] == "search"
+        and PREDICATE.match(words[2]) is not None
+    )
+
+
+def _parse_clauses(query: Query, words: List[str]) -> None:
+    """
+    Parse the trailing `[order by <field> [asc|desc]] [limit N] [offset N]`
+    """
+    i = 0
+    while i < len(words):
+        word = words[i].lower()
+        if word == "order" and [w.lower() for w in words[i + 1 : i + 2]] == ["by"]:
+            if i + 2 >= len(words):
+                raise QuerySyntaxException("Expecting a field after order by")
+            query.order_by = words[i + 2]
+            i += 3
+            if i < len(words) and words[i].lower() in ("asc", "desc"):
+                query.descending = words[i].lower() == "desc"
+                i += 1
+        elif word in ("limit", "offset"):
+            if i + 1 >= len(words) or not words[i + 1].isdigit():
+                raise QuerySyntaxException(f"Expecting a number after {word}")
+            setattr(query, word, int(words[i + 1]))
+            i += 2
+        else:
+            raise QuerySyntaxException(
+                f"Expecting order by, limit or offset, got {words[i]!r}"
+            )
+
+
+def parse(text: str) -> Query:
+    """
+    Parse `search <entity> <field><op><value> [and|or <field><op><value>]...
+    [order by <field> [asc|desc]] [limit N] [offset N]`
+
+    AND binds tighter than OR, values with spaces are quoted.
+    """
+    try:
+        words = shlex.split(text)
+    except ValueError as e:
+        raise QuerySyntaxException(str(e))
+
+    if words and words[0] == "explain":
+        words = words[1:]
+    if len(words) < 3 or words[0] != "search":
+        raise QuerySyntaxException("Expecting: search <entity> <field>=<value> ...")
+
+    entity, terms = words[1], words[2:]
+    groups: List[List[Predicate]] = [[]]
+    expect_predicate = True
+    clauses: List[str] = []
+    for n, term in enumerate(terms):
+        if expect_predicate:
+            if not (m := PREDICATE.match(term)):
+                raise QuerySyntaxException(f"Expecting <field><op><value>, got {term!r}")
+            groups[-1].append(Predicate(*m.groups()))
+        elif term.lower() == "or":
+            groups.append([])
+        elif term.lower() in ("order", "limit", "offset"):
+            clauses = terms[n:]
+            break
+        elif term.lower() != "and":
+            raise QuerySyntaxException(f"Expecting and/or, got {term!r}")
+        expect_predicate = not expect_predicate
+
+    if expect_predicate:
+        raise QuerySyntaxException("Query ends with a dangling and/or")
+    query = Query(entity, groups)
+    _parse_clauses(query, clauses)
+    return query
+
+
+@dataclass
+class GroupPlan:
+    """
+    Plan of one AND group
+
+    lookups: indexed predicates, or merged ranges, with their sorted postings,
+             most selective first
+    filters: residual predicates tested on candidate records
+    columnar: lookups answered by a scan of an encoded column
+    """
+
+    lookups: List[Tuple[Union[Predicate, Range], Sequence[int]]] = field(
+        default_factory=list
+    )
+    filters: List[Predicate] = field(default_factory=list)
+    columnar: List[Predicate] = field(default_factory=list)
+
+    def execute(self, table: Table) -> List[int]:
+        if self.lookups:
+            rows = self.lookups[0][1]
+            for _, postings in self.lookups[1:]:
+                rows = intersect(rows, postings)
+            # rows deleted since their postings were read are skipped
+            candidates = (
+                (i, record) for i in rows if (record := table.records[i]) is not None
+            )
+            scanned = len(rows)
+        else:
+            candidates = table.live()
+            scanned = len(table.records)
+        if table.metrics:
+            table.metrics.scanned(table.name, "query", scanned, index=bool(self.lookups))
+
+        return [
+            i
+            for i, record in candidates
+            if all(predicate.test(record) for predicate in self.filters)
+        ]
+
+    def explain(self) -> List[str]:
+        lines = []
+        for n, (predicate, postings) in enumerate(self.lookups):
+            if n:
+                step = "intersect"
+            elif isinstance(predicate, Range):
+                step = "range scan"
+            elif predicate.op == "^=":
+                step = "prefix scan"
+            elif predicate in self.columnar:
+                step = "column scan"
+            else:
+                step = "index lookup"
+            lines.append(f"{step:<14}{predicate}  ({len(postings)} rows)")
+        if not self.lookups:
+            lines.append(f"{'full scan':<14}")
+        for predicate in self.filters:
+            lines.append(f"{'filter':<14}{predicate}")
+        return lines
+
+
+@dataclass
+class Plan:
+    entity: str
+    groups: List[GroupPlan]
+    order_by: Optional[str] = None
+    descending: bool = False
+    limit: Optional[int] = None
+    offset: int = 0
+
+    def execute(self, table: Table) -> List[int]:
+        """
+        Matching row ids, in row order unless the query is ordered, paginated
+        by limit and offset
+        """
+        rows: Optional[List[int]] = None
+        for group in self.groups:
+            found = group.execute(table)
+            rows = found if rows is None else union(rows, found)
+        rows = rows or []
+
+        end = None if self.limit is None else self.offset + self.limit
+        if self.order_by is not None:
+            rows = self.order(table, rows, end)
+        return rows[self.offset : end]
+
+    def order(self, table: Table, rows: List[int], end: Optional[int]) -> List[int]:
+        """
+        Order rows by the numeric or timestamp value of order_by, rows without
+        one come last. A sorted index is walked in order and stops once end
+        rows are found, other fields are sorted in Python.
+        """
+        idx = table.range_indexes.get(self.order_by)
+        if idx is not None:
+            wanted = set(rows)
+            res = []
+            for i in idx.ordered(self.descending):
+                if end is not None and len(res) >= end:
+                    return res
+                if i in wanted:
+                    res.append(i)
+                    wanted.discard(i)
+            return res + [i for i in rows if i in wanted]
+
+        keyed, missing = [], []
+        for i in rows:
+            record = table.records[i]
+            key = None if record is None else parse_timestamp(record.get(self.order_by))
+            (missing if key is None else keyed).append((key, i))
+        keyed.sort(reverse=self.descending)
+        return [i for _, i in keyed] + [i for _, i in missing]
+
+    def explain(self) -> str:
+        lines = [f"Plan for {self.entity}"]
+        for n, group in enumerate(self.groups):
+            if len(self.groups) > 1:
+                lines.append(f"  branch {n + 1}" + (" (union)" if n else ""))
+            lines += ["    " + line for line in group.explain()]
+        if self.order_by is not None:
+            direction = "desc" if self.descending else "asc"
+            lines.append(f"  {'order by':<16}{self.order_by} {direction}")
+        if self.limit is not None or self.offset:
+            lines.append(f"  {'limit':<16}{self.limit} offset {self.offset}")
+        return "\n".join(lines)
+
+
+def plan(table: Table, query: Query) -> Plan:
+    """
+    Pick the most selective indexed predicate of every AND group to drive
+    the lookup, intersect the postings of the other indexed predicates and
+    test the remaining ones on the candidate records only. Predicates on an
+    encoded column drive the lookup by a column scan when nothing is indexed.
+    """
+    groups = []
+    for predicates in query.groups:
+        group = GroupPlan()
+        ranges: Dict[str, Range] = {}
+        scannable: List[Predicate] = []
+        for predicate in predicates:
+            idx = table.range_indexes.get(predicate.field)
+            if predicate.op in RANGE_OPS and idx is not None:
+                ranges.setdefault(predicate.field, Range(predicate.field)).narrow(predicate)
+                continue
+            if predicate.op == "^=" and idx is not None:
+                group.lookups.append((predicate, sorted(idx.prefix(predicate.value))))
+                continue
+
+            postings = None
+            if predicate.op == "=":
+                postings = table._index_search(predicate.field, predicate.value)
+                if postings is None and predicate.field in table.columns:
+                    scannable.append(predicate)
+                    continue
+            if postings is None:
+                group.filters.append(predicate)
+            else:
+                group.lookups.append((predicate, postings))
+
+        for bounds in ranges.values():
+            postings: Sequence[int] = array("I")
+            if not bounds.empty:
+                postings = sorted(
+                    table.range_indexes[bounds.field].range(
+                        bounds.lo, bounds.hi, bounds.lo_inclusive, bounds.hi_inclusive
+                    )
+                )
+            group.lookups.append((bounds, postings))
+        if group.lookups:
+            # testing the few candidates beats scanning a whole column
+            group.filters += scannable
+        else:
+            for predicate in scannable:
+                column = table.columns[predicate.field]
+                group.lookups.append((predicate, column.rows(predicate.value, table.records)))
+                group.columnar.append(predicate)
+        group.lookups.sort(key=lambda lookup: len(lookup[1]))
+        groups.append(group)
+    return Plan(
+        query.entity,
+        groups,
+        order_by=query.order_by,
+        descending=query.descending,
+        limit=query.limit,
+        offset=query.offset,
+    )
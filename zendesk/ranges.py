@@ -0,0 +1,188 @@
+from __future__ import annotations
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# pending additions merged by insertion rather than by sorting again
+INSERT_BATCH = 64
+
+TIMESTAMP_FORMATS = (
+    "%Y-%m-%dT%H:%M:%S %z",
+    "%Y-%m-%dT%H:%M:%S%z",
+    "%Y-%m-%dT%H:%M:%S",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%d",
+    "%Y-%m",
+    "%Y",
+)
+
+
+def parse_timestamp(value: Any) -> Optional[float]:
+    """
+    Sort key of a value: numbers as is, timestamp strings such as
+    "2016-04-28T11:19:34 -10:00" as seconds since the epoch. Timestamps
+    without an offset are taken as UTC. None when the value is neither.
+    """
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value).strip()
+    for fmt in TIMESTAMP_FORMATS:
+        try:
+            parsed = datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp()
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+@dataclass
+class SortedIndex:
+    """
+    Sorted secondary index answering range and prefix queries by binary search
+
+    Values are parsed once with parse_timestamp into sorted keys, the raw
+    strings are kept lowercased and sorted too for prefix queries. Additions are buffered
+    and merged on the next query.
+
+    Example
+    data: [{"due_at": "2016-07-31T02:37:50 -10:00"}, {"due_at": "2016-04-01T00:00:00 -10:00"}]
+    keys: [1459504800.0, 1469968670.0]  rows: [1, 0]
+    """
+
+    name: str
+    keys: array = field(default_factory=lambda: array("d"))
+    rows: array = field(default_factory=lambda: array("I"))
+    texts: List[str] = field(default_factory=list)
+    text_rows: array = field(default_factory=lambda: array("I"))
+    pending: List[Tuple[Optional[float], str, int]] = field(default_factory=list)
+
+    def __post_init__(self):
+        self._lock = threading.Lock()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        self._merge()
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def add(self, value: Any, i: int) -> None:
+        if value is None or isinstance(value, (list, dict)):
+            return
+        self.pending.append((parse_timestamp(value), str(value).lower(), i))
+
+    def remove(self, value: Any, i: int) -> None:
+        """
+        Drop row i, which must have been added with that value
+        """
+        if value is None or isinstance(value, (list, dict)):
+            return
+        self._merge()
+        with self._lock:
+            key = parse_timestamp(value)
+            if key is not None:
+                n = bisect_left(self.keys, key)
+                while n < len(self.keys) and self.keys[n] == key:
+                    if self.rows[n] == i:
+                        del self.keys[n]
+                        del self.rows[n]
+                        break
+                    n += 1
+            text = str(value).lower()
+            n = bisect_left(self.texts, text)
+            while n < len(self.texts) and self.texts[n] == text:
+                if self.text_rows[n] == i:
+                    del self.texts[n]
+                    del self.text_rows[n]
+                    break
+                n += 1
+
+    def merge(self, other: SortedIndex) -> None:
+        other._merge()
+        self._merge()
+        self.pending.extend(zip(other.keys, [""] * len(other.keys), other.rows))
+        self.pending.extend((None, t, i) for t, i in zip(other.texts, other.text_rows))
+        self._merge()
+
+    def _merge(self) -> None:
+        if not self.pending:
+            return
+        with self._lock:
+            pending, self.pending = self.pending, []
+            if len(pending) <= INSERT_BATCH:
+                # a few live additions, cheaper to insert in place than to re-sort
+                for key, text, i in pending:
+                    if key is not None:
+                        n = bisect_right(self.keys, key)
+                        while n and self.keys[n - 1] == key and self.rows[n - 1] > i:
+                            n -= 1
+                        self.keys.insert(n, key)
+                        self.rows.insert(n, i)
+                    if text:
+                        n = bisect_right(self.texts, text)
+                        while n and self.texts[n - 1] == text and self.text_rows[n - 1] > i:
+                            n -= 1
+                        self.texts.insert(n, text)
+                        self.text_rows.insert(n, i)
+                return
+            keyed = sorted(
+                list(zip(self.keys, self.rows)) + [(k, i) for k, _, i in pending if k is not None]
+            )
+            texts = sorted(
+                list(zip(self.texts, self.text_rows)) + [(t, i) for _, t, i in pending if t]
+            )
+            self.keys = array("d", (k for k, _ in keyed))
+            self.rows = array("I", (i for _, i in keyed))
+            self.texts = [t for t, _ in texts]
+            self.text_rows = array("I", (i for _, i in texts))
+
+    def range(
+        self,
+        lo: Any = None,
+        hi: Any = None,
+        lo_inclusive: bool = True,
+        hi_inclusive: bool = True,
+    ) -> Sequence[int]:
+        """
+        Rows with lo <= value <= hi ordered by value, bounds are optional and
+        parsed like the indexed values
+        """
+        self._merge()
+        start, end = 0, len(self.keys)
+        if lo is not None:
+            key = parse_timestamp(lo)
+            start = (bisect_left if lo_inclusive else bisect_right)(self.keys, key)
+        if hi is not None:
+            key = parse_timestamp(hi)
+            end = (bisect_right if hi_inclusive else bisect_left)(self.keys, key)
+        return self.rows[start:end] if start < end else array("I")
+
+    def prefix(self, text: str) -> Sequence[int]:
+        """
+        Rows whose raw value starts with text ignoring case, ordered by value
+        """
+        self._merge()
+        text = text.lower()
+        start = bisect_left(self.texts, text)
+        end = bisect_left(self.texts, text + "\U0010ffff")
+        return self.text_rows[start:end]
+
+    def ordered(self, descending: bool = False) -> Iterator[int]:
+        """
+        Every row with a sortable value, in value order
+        """
+        self._merge()
+        return reversed(self.rows) if descending else iter(self.rows)
@@ -0,0 +1,90 @@
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from .db import Database
+from .utilties import get_logger
+
+logger = get_logger(__name__)
+
+
+class ResourceWatcher:
+    """
+    Reload the tables of a database whose resource file changed
+
+    Resource files are polled every `interval` seconds for a new mtime or
+    size, and the changed tables are reloaded with Database.reload while the
+    old ones keep serving. A file which cannot be loaded, e.g. because it is
+    still being written, is tried again on the next poll.
+    """
+
+    def __init__(self, database: Database, schemadef: Dict[str, Any], interval: float = 2.0):
+        self.database = database
+        self.schemadef = schemadef
+        self.interval = interval
+        self.timings: Dict[str, float] = {}
+        self.seen = {name: self._stat(name) for name in self._tables()}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _tables(self) -> List[str]:
+        return list(self.schemadef.get("tables", {}))
+
+    def _stat(self, table_name: str) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(os.path.join(self.database.resource_dir, table_name + ".json"))
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def poll(self) -> Dict[str, float]:
+        """
+        Reload the tables changed since the last poll
+        :return: seconds taken to reload each table
+        """
+        current = {name: self._stat(name) for name in self._tables()}
+        changed = [
+            name
+            for name, stat in current.items()
+            if stat is not None and stat != self.seen.get(name)
+        ]
+        if not changed:
+            return {}
+
+        logger.info(f"Resource files changed: {changed}")
+        timings = self.database.reload(self.schemadef, changed)
+        for name in timings:
+            self.seen[name] = current[name]
+        self.timings.update(timings)
+        return timings
+
+    def run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception:
+                logger.exception("Reload failed")
+
+    def start(self) -> "ResourceWatcher":
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+def watch(database: Database, schemadef: Dict[str, Any]) -> Optional[ResourceWatcher]:
+    """
+    Start watching the resource files if enabled in the schema e.g.
+    watch:
+      interval: 2.0
+    """
+    options = schemadef.get("watch")
+    if not options:
+        return None
+    interval = options.get("interval", 2.0) if isinstance(options, dict) else 2.0
+    return ResourceWatcher(database, schemadef, interval).start()
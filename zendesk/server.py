@@ -0,0 +1,271 @@
+import asyncio
+import gc
+import json
+import os
+import signal
+import socket
+from concurrent.futures import Executor, ThreadPoolExecutor
+from http import HTTPStatus
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from .changelog import follow
+from .db import Database, TableNotExistsException
+from .reload import watch
+from .utilties import configure_logging, get_logger, read_yaml
+
+logger = get_logger(__name__)
+
+
+def _default(obj: Any) -> Any:
+    if hasattr(obj, "keys"):
+        return dict(obj)
+    if hasattr(obj, "__iter__"):
+        return list(obj)
+    return str(obj)
+
+
+def _encode(body: Any) -> bytes:
+    return json.dumps(body, default=_default).encode("utf-8")
+
+
+class QueryServer:
+    """
+    Minimal asyncio HTTP/1.1 service answering queries against a Database
+
+    Searches run and their results are serialized in an executor so that a
+    slow scan never blocks the event loop. Routes:
+        GET /search?entity=<entity>&field=<field>&value=<value>
+            [&limit=<n>][&offset=<n>][&fields=<field>,<field>...]
+        GET /tables
+        GET /health
+    """
+
+    def __init__(self, database: Database, executor: Optional[Executor] = None):
+        self.database = database
+        self.executor = executor or ThreadPoolExecutor()
+
+    async def start(
+        self, host: Optional[str] = "127.0.0.1", port: Optional[int] = 8000, **kwargs
+    ) -> asyncio.AbstractServer:
+        return await asyncio.start_server(self.handle, host, port, **kwargs)
+
+    async def handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            try:
+                status, body = await self.respond(reader)
+            except ConnectionError:
+                return
+            except Exception:
+                logger.exception("Failed to answer a request")
+                status, body = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "internal error"}
+
+            payload = body if isinstance(body, bytes) else _encode(body)
+            writer.write(
+                f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                f"Content-Type: application/json\r\n"
+                f"Content-Length: {len(payload)}\r\n"
+                f"Connection: close\r\n\r\n".encode("latin-1")
+                + payload
+            )
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, reader: asyncio.StreamReader) -> Tuple[HTTPStatus, Any]:
+        """
+        Read a request and route it
+        :return: status and body of the response, the body either a JSON
+            serializable object or the JSON encoded bytes
+        """
+        try:
+            request = await reader.readline()
+            while await reader.readline() not in (b"\r\n", b"\n", b""):
+                pass
+        except (ValueError, asyncio.LimitOverrunError):
+            # a line longer than the limit of the stream
+            return HTTPStatus.BAD_REQUEST, {"error": "request line or header too long"}
+
+        try:
+            method, target, _ = request.decode("latin-1").split(" ", 2)
+        except ValueError:
+            return HTTPStatus.BAD_REQUEST, {"error": "malformed request"}
+        return await self.route(method, target)
+
+    async def route(self, method: str, target: str) -> Tuple[HTTPStatus, Any]:
+        if method != "GET":
+            return HTTPStatus.METHOD_NOT_ALLOWED, {"error": f"{method} not allowed"}
+
+        url = urlsplit(target)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+
+        if url.path == "/health":
+            return HTTPStatus.OK, {"status": "ok", "pid": os.getpid()}
+        elif url.path == "/tables":
+            return HTTPStatus.OK, list(self.database.collections.keys())
+        elif url.path == "/stats":
+            return HTTPStatus.OK, self.database.metrics.stats()
+        elif url.path == "/search":
+            return await self.search(params)
+        return HTTPStatus.NOT_FOUND, {"error": f"{url.path} not found"}
+
+    async def search(self, params: Dict[str, str]) -> Tuple[HTTPStatus, Any]:
+        try:
+            entity, field, value = params["entity"], params["field"], params["value"]
+        except KeyError as e:
+            return HTTPStatus.BAD_REQUEST, {"error": f"missing parameter {e}"}
+        try:
+            limit = int(params["limit"]) if "limit" in params else None
+            offset = int(params.get("offset", 0))
+            if (limit is not None and limit < 0) or offset < 0:
+                raise ValueError
+        except ValueError:
+            return HTTPStatus.BAD_REQUEST, {"error": "limit and offset must be non-negative integers"}
+        fields = params["fields"].split(",") if "fields" in params else None
+
+        logger.info("Serving search %s %s %s", entity, field, value)
+        loop = asyncio.get_running_loop()
+
+        def run() -> bytes:
+            # serialized in the executor as well, a large result would
+            # otherwise stall every other connection
+            if limit is None and not offset:
+                res = self.database.search(entity, field, value, fields)
+            else:
+                res = list(
+                    self.database.iter_search(entity, field, value, limit, offset, fields)
+                )
+            return _encode(res)
+
+        try:
+            res = await loop.run_in_executor(self.executor, run)
+        except TableNotExistsException:
+            return HTTPStatus.NOT_FOUND, {"error": f"{entity} not found in database"}
+        return HTTPStatus.OK, res
+
+
+class PreforkServer:
+    """
+    Serve a database loaded once by the parent from forked worker processes
+
+    Workers share the parent's tables and indexes copy-on-write. Objects
+    alive at fork time are moved to the permanent generation with
+    gc.freeze(), so garbage collections in the workers never write to their
+    pages, until the workers have exited. Pair it with storage: mmap to share
+    the records themselves through the page cache.
+    """
+
+    def __init__(
+        self,
+        database: Database,
+        workers: int = 2,
+        schemadef: Optional[Dict[str, Any]] = None,
+    ):
+        """
+        :param schemadef: schema the database was loaded with, every worker
+            follows its changelog and watches its resource files if configured
+        """
+        self.database = database
+        self.workers = workers
+        self.schemadef = schemadef or {}
+        self.pids: List[int] = []
+
+    def start(self, host: str = "127.0.0.1", port: int = 8000) -> int:
+        """
+        Bind the listening socket and fork the workers
+        :return: the bound port
+        """
+        sock = socket.create_server((host, port), backlog=1024)
+        port = sock.getsockname()[1]
+
+        gc.collect()
+        gc.freeze()
+        for _ in range(self.workers):
+            pid = os.fork()
+            if pid == 0:
+                code = 0
+                try:
+                    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                    asyncio.run(self._serve(sock))
+                except KeyboardInterrupt:
+                    pass
+                except BaseException:
+                    logger.exception("Worker failed")
+                    code = 1
+                finally:
+                    os._exit(code)
+            self.pids.append(pid)
+
+        # the parent stays frozen as well, a collection in the parent would
+        # otherwise copy the shared pages and leave them private to each worker
+        sock.close()
+        logger.info(f"Forked workers {self.pids}")
+        return port
+
+    async def _serve(self, sock: socket.socket) -> None:
+        follow(self.database, self.schemadef)
+        watch(self.database, self.schemadef)
+        srv = await QueryServer(self.database).start(None, None, sock=sock)
+        async with srv:
+            await srv.serve_forever()
+
+    def wait(self) -> None:
+        """
+        Wait for the workers to exit, then unfreeze the objects frozen for them
+        """
+        for pid in self.pids:
+            os.waitpid(pid, 0)
+        if self.pids:
+            gc.unfreeze()
+        self.pids = []
+
+    def stop(self) -> None:
+        for pid in self.pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        self.wait()
+
+
+def serve(
+    yaml_fpath: str, host: str = "127.0.0.1", port: int = 8000, workers: int = 1
+) -> None:
+    """
+    Load the database once and serve queries until interrupted, from that
+    many forked worker processes when workers > 1
+    """
+    schemadef = read_yaml(yaml_fpath)
+    configure_logging(schemadef.get("logging"))
+    database = Database()
+    database.load(schemadef)
+
+    if workers > 1:
+        prefork = PreforkServer(database, workers, schemadef)
+        prefork.start(host, port)
+        print(f"Serving on http://{host}:{port} with {workers} workers")
+        try:
+            prefork.wait()
+        except KeyboardInterrupt:
+            prefork.stop()
+            print("Bye")
+        return
+
+    server = QueryServer(database)
+    follow(database, schemadef)
+    watch(database, schemadef)
+
+    async def main():
+        srv = await server.start(host, port)
+        print(f"Serving on http://{host}:{port}")
+        async with srv:
+            await srv.serve_forever()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("Bye")
@@ -0,0 +1,76 @@
+import hashlib
+import json
+import os
+import pickle
+from typing import Any, Dict, Optional
+
+from .utilties import get_logger
+
+logger = get_logger(__name__)
+
+# bump whenever the layout of the pickled index classes changes
+SNAPSHOT_VERSION = 6
+
+
+def fingerprint(filename: str, checksum: bool = False) -> Dict[str, Any]:
+    """
+    Identify a version of the source file by mtime and size, plus a sha1
+    digest of its content when checksum is enabled
+    """
+    stat = os.stat(filename)
+    res: Dict[str, Any] = {"mtime": stat.st_mtime_ns, "size": stat.st_size}
+    if checksum:
+        digest = hashlib.sha1()
+        with open(filename, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        res["sha1"] = digest.hexdigest()
+    return res
+
+
+def schema_digest(schema: Dict[str, Any]) -> str:
+    return hashlib.sha1(json.dumps(schema, sort_keys=True).encode()).hexdigest()
+
+
+def save_snapshot(
+    path: str,
+    state: Dict[str, Any],
+    source: str,
+    schema: Dict[str, Any],
+    checksum: bool = False,
+) -> None:
+    header = {
+        "version": SNAPSHOT_VERSION,
+        "source": fingerprint(source, checksum),
+        "schema": schema_digest(schema),
+    }
+    with open(path + ".tmp", "wb") as f:
+        pickle.dump(header, f, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(path + ".tmp", path)
+
+
+def load_snapshot(
+    path: str, source: str, schema: Dict[str, Any], checksum: bool = False
+) -> Optional[Dict[str, Any]]:
+    """
+    Return the snapshotted index state, or None when the snapshot is missing or
+    stale against the source file, the schema or the snapshot version
+    """
+    try:
+        with open(path, "rb") as f:
+            header = pickle.load(f)
+            expected = {
+                "version": SNAPSHOT_VERSION,
+                "source": fingerprint(source, checksum),
+                "schema": schema_digest(schema),
+            }
+            if header != expected:
+                logger.info(f"Snapshot {path} is stale")
+                return None
+            return pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except (pickle.UnpicklingError, EOFError, AttributeError) as e:
+        logger.warning(f"Snapshot {path} is corrupted: {e}")
+        return None
@@ -0,0 +1,301 @@
+from __future__ import annotations
+import codecs
+import json
+import mmap
+import os
+import threading
+from array import array
+from typing import (
+    Any,
+    BinaryIO,
+    Dict,
+    Iterator,
+    List,
+    MutableSequence,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+CHUNK_SIZE = 1 << 20
+
+_decoder = json.JSONDecoder()
+_whitespace = " \t\n\r"
+
+
+def _skip(buf: str, idx: int) -> int:
+    while idx < len(buf) and buf[idx] in _whitespace:
+        idx += 1
+    return idx
+
+
+def iter_records(
+    f: BinaryIO, chunk_size: int = CHUNK_SIZE
+) -> Iterator[Tuple[int, int, Dict[str, Any]]]:
+    """
+    Incrementally decode a file holding a top-level JSON array.
+
+    Only one chunk plus the record being decoded is held in memory at a time.
+    :param f: file opened in binary mode
+    :return: iterator of (byte offset, byte length, record)
+    """
+    reader = codecs.getincrementaldecoder("utf-8")()
+    buf = ""
+    mark = 0  # characters of buf before mark are counted in pos
+    pos = 0  # byte offset of buf[mark] in the file
+    idx = 0
+    eof = False
+    started = False
+
+    def size(text: str) -> int:
+        return len(text) if text.isascii() else len(text.encode("utf-8"))
+
+    def fill() -> bool:
+        nonlocal buf, mark, pos, idx, eof
+        if eof:
+            return False
+        pos += size(buf[mark:idx])
+        chunk = f.read(chunk_size)
+        eof = not chunk
+        buf = buf[idx:] + reader.decode(chunk, final=eof)
+        mark = idx = 0
+        return True
+
+    while True:
+        idx = _skip(buf, idx)
+        if idx == len(buf):
+            if fill():
+                continue
+            raise ValueError("Unexpected end of file, expecting a JSON array")
+
+        char = buf[idx]
+        if not started:
+            if char != "[":
+                raise ValueError(f"Expecting a JSON array, got {char!r}")
+            started = True
+            idx += 1
+        elif char == "]":
+            return
+        elif char == ",":
+            idx += 1
+        else:
+            try:
+                record, end = _decoder.raw_decode(buf, idx)
+            except json.JSONDecodeError:
+                # the record is most likely truncated by the chunk boundary
+                if fill():
+                    continue
+                raise
+            if end == len(buf) and not eof:
+                # a number at the end of the buffer may continue in the next chunk
+                fill()
+                continue
+            offset = pos + size(buf[mark:idx])
+            length = size(buf[idx:end])
+            pos = offset + length
+            mark = idx = end
+            yield offset, length, record
+
+
+class FileRecords(Sequence):
+    """
+    Records kept on disk and addressed by byte offsets into the source file.
+
+    A record is only decoded when it is accessed, so memory is bounded by the
+    offset table instead of the data size.
+    """
+
+    def __init__(self, filename: str, decoder: Optional[Any] = None):
+        """
+        :param decoder: codec.Decoder of the records, json.loads when None
+        """
+        self.filename = filename
+        self.decoder = decoder
+        self.offsets = array("Q")
+        self.lengths = array("I")
+        self._file = None
+        self._lock = threading.Lock()
+
+    def track(self, offset: int, length: int) -> None:
+        self.offsets.append(offset)
+        self.lengths.append(length)
+
+    def _read(self, i: int) -> bytes:
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.filename, "rb")
+            self._file.seek(self.offsets[i])
+            return self._file.read(self.lengths[i])
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        data = self._read(i)
+        return self.decoder.decode(data) if self.decoder else json.loads(data)
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = self.__dict__.copy()
+        state["_file"] = None
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+
+class StoreWriter:
+    """
+    Write records once into the on-disk store read by MmapRecords.
+
+    The store is a JSON Lines data file and a fixed offsets file holding
+    len(records) + 1 unsigned 64 bit offsets into it.
+    """
+
+    def __init__(self, data_path: str, offsets_path: str):
+        self.data_path = data_path
+        self.offsets_path = offsets_path
+        self.offsets = array("Q", [0])
+        self._file = open(data_path + ".tmp", "wb")
+
+    def append(self, record: Dict[str, Any]) -> None:
+        line = json.dumps(record, separators=(",", ":")).encode("utf-8") + b"\n"
+        self._file.write(line)
+        self.offsets.append(self.offsets[-1] + len(line))
+
+    def close(self) -> None:
+        self._file.close()
+        with open(self.offsets_path + ".tmp", "wb") as f:
+            self.offsets.tofile(f)
+        os.replace(self.data_path + ".tmp", self.data_path)
+        os.replace(self.offsets_path + ".tmp", self.offsets_path)
+
+
+def is_fresh(source: str, *paths: str) -> bool:
+    """
+    Whether every derived file exists and is newer than the source
+    """
+    try:
+        mtime = os.path.getmtime(source)
+        return all(os.path.getmtime(p) >= mtime for p in paths)
+    except FileNotFoundError:
+        return False
+
+
+def _map(path: str):
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class MmapRecords(Sequence):
+    """
+    Records memory mapped from a store written by StoreWriter.
+
+    Pages are shared through the OS page cache across processes and a record
+    is only decoded when it is accessed.
+    """
+
+    def __init__(self, data_path: str, offsets_path: str, decoder: Optional[Any] = None):
+        """
+        :param decoder: codec.Decoder of the records, json.loads when None
+        """
+        self.data_path = data_path
+        self.offsets_path = offsets_path
+        self.decoder = decoder
+        self._data = _map(data_path)
+        self._offsets_map = _map(offsets_path)
+        self.offsets = memoryview(self._offsets_map).cast("Q")
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # the maps are reopened from their paths on unpickling
+        return {
+            "data_path": self.data_path,
+            "offsets_path": self.offsets_path,
+            "decoder": self.decoder,
+        }
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__init__(state["data_path"], state["offsets_path"], state.get("decoder"))
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("record index out of range")
+        data = self._data[self.offsets[i] : self.offsets[i + 1]]
+        return self.decoder.decode(data) if self.decoder else json.loads(data)
+
+    def __len__(self) -> int:
+        return max(len(self.offsets) - 1, 0)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for i in range(len(self)):
+            yield self[i]
+
+
+class OverlayRecords(MutableSequence):
+    """
+    Writable overlay over read-only records e.g. FileRecords or MmapRecords
+
+    Replaced records are kept in memory by position and new records are
+    appended after the base ones, the base records are never written to.
+    """
+
+    def __init__(self, base: Sequence[Any]):
+        self.base = base
+        self.changed: Dict[int, Any] = {}
+        self.appended: List[Any] = []
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if i >= len(self.base):
+            return self.appended[i - len(self.base)]
+        if i in self.changed:
+            return self.changed[i]
+        return self.base[i]
+
+    def __setitem__(self, i: int, record: Any) -> None:
+        if i < 0:
+            i += len(self)
+        if i >= len(self.base):
+            self.appended[i - len(self.base)] = record
+        elif i >= 0:
+            self.changed[i] = record
+        else:
+            raise IndexError("record index out of range")
+
+    def __delitem__(self, i):
+        raise TypeError("records are never deleted, replace them with None")
+
+    def insert(self, i: int, record: Any) -> None:
+        if i < len(self):
+            raise TypeError("records can only be appended")
+        self.appended.append(record)
+
+    def __len__(self) -> int:
+        return len(self.base) + len(self.appended)
+
+    def __iter__(self) -> Iterator[Any]:
+        changed = self.changed
+        for i, record in enumerate(self.base):
+            yield changed.get(i, record)
+        yield from self.appended
@@ -1,8 +1,11 @@
+import atexit
 import logging
+import queue
 from logging import Logger
+from logging.handlers import QueueHandler, QueueListener
 import os
 from os.path import dirname, realpath, join, exists
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
 import yaml
 
@@ -13,26 +16,129 @@ fpath = join(dirname(dirname(realpath(__file__))), "logs")
 if not exists(fpath):
     os.mkdir(fpath)
 
+_formatter = logging.Formatter(
+    "[%(asctime)s]{%(filename)s:%(lineno)d}-10s: %(levelname)s - %(message)s"
+)
+
+
+class _LazyQueueHandler(QueueHandler):
+    """
+    Enqueue records as they are, the message is formatted by the listener
+    thread instead of the thread logging it. Records never leave the process,
+    so they do not need to be made picklable.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class _FileRouter(logging.Handler):
+    """
+    Write every record to logs/<logger name>.log, one file handler per logger
+    """
+
+    def emit(self, record: logging.LogRecord) -> None:
+        _file_handler(record.name).emit(record)
+
+
+# logger name -> the single file handler writing its log file
+_file_handlers: Dict[str, logging.FileHandler] = {}
+# shared by every logger, so that each gets the same handler exactly once
+_queue_handler = _LazyQueueHandler(queue.SimpleQueue())
+_listener: Optional[QueueListener] = None
+_use_queue = True
+_level: Any = LOGGER_LEVEL
+_loggers: Dict[str, Logger] = {}
+
+
+def _file_handler(name: str) -> logging.FileHandler:
+    handler = _file_handlers.get(name)
+    if handler is None:
+        handler = logging.FileHandler(filename=os.path.join(fpath, name + ".log"))
+        handler.setFormatter(_formatter)
+        handler = _file_handlers.setdefault(name, handler)
+    return handler
 
-def get_logger(name: str) -> Logger:
-    logger = logging.getLogger(name)
-    logger.setLevel(LOGGER_LEVEL)
 
-    logger_formatter = logging.Formatter(
-        "[%(asctime)s]{%(filename)s:%(lineno)d}-10s: %(levelname)s - %(message)s"
-    )
+def _start_listener() -> None:
+    global _listener
+    if _listener is None:
+        _listener = QueueListener(_queue_handler.queue, _FileRouter(), respect_handler_level=True)
+        _listener.start()
 
-    # stream_handler = logging.StreamHandler()
-    # stream_handler.setFormatter(logger_formatter)
 
-    file_handler = logging.FileHandler(filename=os.path.join(fpath, name + ".log"))
-    file_handler.setFormatter(logger_formatter)
+def _stop_listener() -> None:
+    """
+    Write out the queued records and stop the listener thread
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
 
-    # logger.addHandler(stream_handler)
-    logger.addHandler(file_handler)
+
+def _after_fork() -> None:
+    # the listener thread does not survive a fork, and its queue may have
+    # been locked by it at that time
+    global _listener
+    _listener = None
+    _queue_handler.queue = queue.SimpleQueue()
+    if _use_queue and _loggers:
+        _start_listener()
+
+
+atexit.register(_stop_listener)
+os.register_at_fork(after_in_child=_after_fork)
+
+
+def _attach(logger: Logger) -> None:
+    for handler in list(logger.handlers):
+        if handler is _queue_handler or handler in _file_handlers.values():
+            logger.removeHandler(handler)
+    if _use_queue:
+        _start_listener()
+        logger.addHandler(_queue_handler)
+    else:
+        logger.addHandler(_file_handler(logger.name))
+
+
+def get_logger(name: str) -> Logger:
+    """
+    Logger writing to logs/<name>.log. Calling it again for the same name
+    returns the same logger without adding handlers.
+    """
+    logger = logging.getLogger(name)
+    if name not in _loggers:
+        logger.setLevel(_level)
+        _loggers[name] = logger
+        _attach(logger)
     return logger
 
 
+def configure_logging(options: Optional[Dict[str, Any]] = None) -> None:
+    """
+    Configure the loggers of get_logger from the logging section of the
+    schema e.g.
+    logging:
+      level: INFO
+      queue: true
+    With queue (default), records are handed to a background thread which
+    formats and writes them, so logging never blocks on disk. Otherwise they
+    are written synchronously by the thread logging them.
+    """
+    global _use_queue, _level
+    options = options or {}
+    _level = options.get("level", LOGGER_LEVEL)
+    use_queue = options.get("queue", True)
+
+    if _use_queue and not use_queue:
+        _stop_listener()
+    _use_queue = use_queue
+    for logger in _loggers.values():
+        logger.setLevel(_level)
+        _attach(logger)
+
+
 def read_yaml(file: str) -> Dict[str, Any]:
     with open(file, "r") as f:
         dic = yaml.load(f, Loader=yaml.FullLoader)
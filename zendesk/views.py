@@ -0,0 +1,54 @@
+from typing import Any, Dict, Iterator, Mapping, Optional
+
+
+class RecordView(Mapping):
+    """
+    Read-only view over a stored record, returned by searches and joins in
+    place of a copy
+
+    columns: output name -> field of the record, None keeps every field
+    extra: fields layered on top of the record, e.g. joined foreign records
+
+    Fields are read from the record only when accessed, and the record itself
+    is never modified.
+
+    Example
+    record: {"_id": 1, "name": "Enthaze", "details": "MegaCorp"}
+    RecordView(record, {"organization_name": "name"})  -> {"organization_name": "Enthaze"}
+    RecordView(record, extra={"tickets": []})  -> {"_id": 1, ..., "tickets": []}
+    """
+
+    __slots__ = ("record", "columns", "extra")
+
+    def __init__(
+        self,
+        record: Mapping[str, Any],
+        columns: Optional[Dict[str, str]] = None,
+        extra: Optional[Dict[str, Any]] = None,
+    ):
+        self.record = record
+        self.columns = columns
+        self.extra = extra
+
+    def __getitem__(self, key: str) -> Any:
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        if self.columns is None:
+            return self.record[key]
+        return self.record[self.columns[key]]
+
+    def __iter__(self) -> Iterator[str]:
+        if self.columns is None:
+            keys = list(self.record)
+        else:
+            keys = [k for k, field in self.columns.items() if field in self.record]
+        if self.extra:
+            seen = set(keys)
+            keys += [k for k in self.extra if k not in seen]
+        return iter(keys)
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
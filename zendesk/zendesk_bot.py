@@ -1,7 +1,7 @@
 import pyfiglet
 import click
 
-from .processor import Processor
+from .processor import Processor, YAML
 
 
 @click.group()
@@ -16,8 +16,16 @@ def help():
         help                                show help information
         
         load                                load data 
+        reload                              load changed data without downtime
         search                              interactive query mode
         search <entity> <field> <value>         
+        search <entity> <field>=<value> [and|or <field>=<value>]...
+               [order by <field> [asc|desc]] [limit N] [offset N]
+        find <entity> <words>               full-text search, "quoted words" match a phrase
+        explain <search query>              show the plan of a search
+        stats                               show query latency, index hits and scans
+        stats json [file]                   export the metrics as json
+        stats reset                         clear the metrics
         show db                             list all tables
         show table                          list all fields
         
@@ -27,8 +35,17 @@ def help():
 
 
 @click.command()
-@click.option("--command", default="help", help="Choose command")
-def main(command):
+@click.option("--command", default="help", help="Choose command, serve starts the http service")
+@click.option("--host", default="127.0.0.1", help="Host the http service binds to")
+@click.option("--port", default=8000, help="Port the http service listens on")
+@click.option("--workers", default=1, help="Worker processes forked by the http service")
+def main(command, host, port, workers):
+
+    if command == "serve":
+        from .server import serve
+
+        serve(YAML, host, port, workers)
+        return
 
     header = pyfiglet.figlet_format("Zendesk bot", font="slant")
     print(header)
@@ -49,10 +66,18 @@ def main(command):
             process.show_db()
         elif choice == "load":
             process.load_db()
+        elif choice == "reload":
+            process.reload_db()
         elif choice == "search":
             process.ask()
         elif choice.startswith("search"):
             process.handle(choice)
+        elif choice.startswith("find"):
+            process.find(choice)
+        elif choice.startswith("explain"):
+            process.explain(choice)
+        elif choice.startswith("stats"):
+            process.stats(choice)
         elif choice == "clear":
             click.clear()
         else: